@@ -0,0 +1,238 @@
+# analyse.py = analyse a file of positions
+
+"""
+Analyse every position in a FEN or EPD file, using a pool of
+processes, and write the results as JSON lines, in the same order as
+the positions.
+
+Usage:
+
+    python analyse.py positions.epd -d 6 -o results.jsonl
+    python analyse.py positions.fen -n 100000 -w 8 > results.jsonl
+
+Each line of the input is a FEN (6 fields), or an EPD position (4
+fields, then operations such as 'bm e4; id "pos 1";'). Blank lines and
+lines starting with # are skipped. Each position gets one line of
+output:
+
+    {"line": 12, "id": "pos 1", "fen": "...", "bestMove": "e2e4",
+     "san": "e4", "score": 35, "pv": ["e2e4", "e7e5"], "depth": 6,
+     "nodes": 12345, "time": 0.81}
+
+(score) is in centipawns for the side to move, as Search.think()
+returns it. (id) is only there for EPD positions with an id. A line
+that can't be read gets {"line": n, "error": "..."} instead.
+
+The lines are read and sent to the workers in chunks, and at most
+(window) chunks are in progress at once, so however big the file is,
+only a few chunks are in memory. Results are written as soon as every
+chunk before them has been written.
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import List, Tuple, Dict, Optional, Iterator, Iterable, Any, \
+    Callable, TextIO
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from search import Search, Limits, MAX_DEPTH
+from san import moveToSan
+
+#---------------------------------------------------------------------
+
+CHUNK_LINES = 64 # positions sent to a worker at a time
+WINDOW_PER_WORKER = 2 # chunks in progress for each worker
+DEFAULT_DEPTH = 4
+PROGRESS_SECONDS = 10.0 # how often to show progress
+
+# (line number, line) pairs
+Chunk = List[Tuple[int,str]]
+
+#---------------------------------------------------------------------
+# reading positions
+
+def parsePosition(line: str) -> Optional[Tuple[str, Dict[str,str]]]:
+    """ parse a FEN or EPD line into (FEN, EPD operations), or None if
+    it's blank or a comment. Raise ValueError if it's bad.
+    """
+    tokens = line.split(None, 4)
+    if not tokens or tokens[0].startswith("#"):
+        return None
+    if len(tokens) < 4:
+        raise ValueError(form("not a FEN or EPD position: {!r}",
+                              line.strip()))
+    fen = " ".join(tokens[:4])
+    rest = tokens[4] if len(tokens) > 4 else ""
+    counters = rest.split()[:2]
+    if len(counters) == 2 and all(c.isdigit() for c in counters):
+        return fen + " " + " ".join(counters), {}
+    return fen + " 0 1", parseOperations(rest)
+
+def parseOperations(s: str) -> Dict[str,str]:
+    """ EPD operations, e.g. 'bm e4; id "pos 1";' is
+    {'bm': 'e4', 'id': 'pos 1'}
+    """
+    ops: Dict[str,str] = {}
+    for op in s.split(";"):
+        op = op.strip()
+        if not op: continue
+        parts = op.split(None, 1)
+        ops[parts[0]] = parts[1].strip().strip('"') if len(parts) > 1 else ""
+    #//for op
+    return ops
+
+def readChunks(f: Iterable[str], chunkLines: int = CHUNK_LINES
+               ) -> Iterator[Chunk]:
+    """ the numbered lines of (f) that aren't blank or comments,
+    (chunkLines) at a time
+    """
+    chunk: Chunk = []
+    for n, line in enumerate(f, 1):
+        s = line.strip()
+        if not s or s.startswith("#"): continue
+        chunk.append((n, s))
+        if len(chunk) >= chunkLines:
+            yield chunk
+            chunk = []
+    #//for
+    if chunk:
+        yield chunk
+
+#---------------------------------------------------------------------
+# running in the worker processes
+
+_workerSearch: Optional[Search] = None
+_workerLimits: Optional[Limits] = None
+
+def _initWorker(limits: Limits):
+    global _workerSearch, _workerLimits
+    _workerSearch = Search()
+    _workerLimits = limits
+
+def analysePosition(s: Search, limits: Limits, lineNum: int, line: str
+                    ) -> Dict[str,Any]:
+    """ the result for one position, as a dict """
+    try:
+        fen, ops = parsePosition(line)
+        b = Board.fromFEN(fen)
+    except (ValueError, KeyError, IndexError) as e:
+        return {'line': lineNum, 'error': str(e)}
+    s.tt.clear()
+    mv, score = s.think(b, limits)
+    r: Dict[str,Any] = {'line': lineNum}
+    if 'id' in ops:
+        r['id'] = ops['id']
+    r['fen'] = fen
+    r['bestMove'] = toAlmov(mv) if mv is not None else None
+    r['san'] = moveToSan(b, mv) if mv is not None else None
+    r['score'] = score
+    r['pv'] = [toAlmov(m) for m in s.principalVariation(b, mv)]
+    r['depth'] = s.depthReached
+    r['nodes'] = s.stats['nodes']
+    r['time'] = round(s.elapsed, 4)
+    return r
+
+def analyseChunk(chunk: Chunk) -> List[str]:
+    """ the results for a chunk, as JSON lines (in a worker process) """
+    return [json.dumps(analysePosition(_workerSearch, _workerLimits, n, line))
+            for n, line in chunk]
+
+#---------------------------------------------------------------------
+
+def orderedMap(pool: Any, func: Callable, items: Iterable[Any],
+               window: int) -> Iterator[Any]:
+    """ func(item) for each of (items), done in (pool), in order.
+    Unlike Pool.imap(), which reads all the items at once, only
+    (window) items are in progress at any time.
+    """
+    pending: collections.deque = collections.deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    #//for
+    while pending:
+        yield pending.popleft().get()
+
+def analyseFile(f: Iterable[str], out: TextIO, limits: Limits,
+                numWorkers: Optional[int] = None,
+                chunkLines: int = CHUNK_LINES,
+                progress: bool = False) -> int:
+    """ analyse the positions in (f) with (numWorkers) processes
+    (default: one per CPU; 0 means don't use a pool), writing JSON
+    lines to (out). Return the number of positions.
+    """
+    chunks = readChunks(f, chunkLines)
+    n = 0
+    t0 = lastShown = time.time()
+    if numWorkers == 0:
+        _initWorker(limits)
+        results: Iterator[List[str]] = map(analyseChunk, chunks)
+        pool = None
+    else:
+        numWorkers = numWorkers or os.cpu_count() or 1
+        pool = Pool(numWorkers, initializer=_initWorker, initargs=(limits,))
+        results = orderedMap(pool, analyseChunk, chunks,
+                             numWorkers * WINDOW_PER_WORKER)
+    try:
+        for lines in results:
+            for line in lines:
+                out.write(line + "\n")
+            n += len(lines)
+            if progress and time.time() - lastShown >= PROGRESS_SECONDS:
+                lastShown = time.time()
+                print(form("{} positions, {:.1f}/s", n,
+                           n/max(lastShown - t0, 1e-9)), file=sys.stderr)
+        #//for
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return n
+
+#---------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="analyse a file of positions")
+    ap.add_argument("positions", help="FEN or EPD file")
+    ap.add_argument("-o", "--out", default=None,
+                    help="JSON lines file to write (default: stdout)")
+    ap.add_argument("-d", "--depth", type=int, default=None,
+                    help=form("search depth (default: {} if there's no "
+                              "other limit)", DEFAULT_DEPTH))
+    ap.add_argument("-n", "--nodes", type=int, default=None,
+                    help="nodes per position")
+    ap.add_argument("-t", "--seconds", type=float, default=None,
+                    help="seconds per position")
+    ap.add_argument("-w", "--workers", type=int, default=None,
+                    help="worker processes (default: one per CPU)")
+    ap.add_argument("-c", "--chunk", type=int, default=CHUNK_LINES,
+                    help="positions sent to a worker at a time")
+    ap.add_argument("-q", "--quiet", action="store_true",
+                    help="don't show progress")
+    args = ap.parse_args()
+    depth = args.depth
+    if depth is None:
+        noLimit = args.nodes is None and args.seconds is None
+        depth = DEFAULT_DEPTH if noLimit else MAX_DEPTH
+    limits = Limits(depth=depth, nodes=args.nodes, seconds=args.seconds)
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        with open(args.positions) as f:
+            analyseFile(f, out, limits, args.workers, args.chunk,
+                        progress=not args.quiet)
+    finally:
+        if args.out:
+            out.close()
+
+if __name__=='__main__':
+    main()
+
+#end
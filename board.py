@@ -13,7 +13,11 @@ Doesn't deal with castling, en passant or check.
 Pawn promotion is always to Q
 """
 
-from typing import List, Literal, Tuple, Union, cast, Optional
+import operator
+import random
+import struct
+from typing import List, Literal, Tuple, Union, cast, Optional, Dict, Any, \
+    Iterable
 
 from ulib.butil import form, pr, prn, dpr, printargs
 from ulib.termcolours import TermColours
@@ -249,6 +253,69 @@ def mirrorMoves(mvs: List[Move]) -> List[Move]:
     return [mirrorMove(mv) for mv in mvs]
 
 #---------------------------------------------------------------------
+# Zobrist hashing
+
+""" 
+A position's key is a 64-bit number, the XOR of a random number for
+each (piece, square), one for black to move, and one for the castling
+rights. Moves update the key incrementally.
+
+The random numbers come from a fixed seed, so keys are the same in
+every process and every run (they can be stored in files).
+"""
+
+ZOBRIST_SEED = 20200612
+_zrand = random.Random(ZOBRIST_SEED)
+
+# zobristSq[sv][sqix] = the number for piece (sv) on square (sqix)
+zobristSq: Dict[Sqv, List[int]] = {}
+for _pv in "PNBRQKpnbrqk":
+    zobristSq[_pv] = [_zrand.getrandbits(64) for _ in range(121)]
+zobristBlack = _zrand.getrandbits(64)
+# zobristCastle[castleMask] = the number for the castling rights
+zobristCastle = [0] + [_zrand.getrandbits(64) for _ in range(15)]
+
+#---------------------------------------------------------------------
+# material signatures
+
+"""
+A position's material key says how many of each piece there are, 4
+bits per piece type, so positions with the same material (wherever
+the pieces are) have the same key. Moves update it incrementally.
+"""
+
+# materialShift[sv] = where piece (sv)'s count is in a material key
+materialShift: Dict[Sqv,int] = {pv: 4*i
+                                for i, pv in enumerate("PNBRQKpnbrqk")}
+
+def materialKeyOf(counts: Dict[Sqv,int]) -> int:
+    """ the material key for (counts), which maps pieces to how
+    many of them there are
+    """
+    k = 0
+    for pv, n in counts.items():
+        k += n << materialShift[pv]
+    return k
+
+#---------------------------------------------------------------------
+# draws
+
+FIFTY_MOVE_PLIES = 100 # a draw after this many moves without a pawn
+                       # move or capture
+
+# the material where neither side can mate
+DEAD_MATERIAL = frozenset(materialKeyOf(counts) for counts in [
+    {WK: 1, BK: 1},
+    {WK: 1, BK: 1, WN: 1}, {WK: 1, BK: 1, BN: 1},
+    {WK: 1, BK: 1, WB: 1}, {WK: 1, BK: 1, BB: 1}])
+
+# a bishop each, which is dead if they're on the same colour
+BISHOP_EACH = materialKeyOf({WK: 1, BK: 1, WB: 1, BB: 1})
+
+#---------------------------------------------------------------------
+
+# the squares of an empty board
+_emptySq = [EMPTY if sx in sqixs else OFFBOARD for sx in range(121)]
 
 class Board:
     #----- game position:
@@ -263,23 +330,42 @@ class Board:
     
     #----- history:
     movesMade: List[Move] = []
+    # the keys of the positions since the last pawn move or capture,
+    # oldest first (not including this one):
+    keyHistory: List[int] = []
     
     #----- useful stuff for move generation, evaluation, etc
+    key: Optional[int] = None # Zobrist key, None if not calculated
+    pawnKey: Optional[int] = None # Zobrist key of just the pawns
+    pieceCounts: Optional[Dict[Sqv,int]] = None # how many of each piece
+    materialKey: Optional[int] = None # see materialKeyOf()
+    accumulator: Any = None # network evaluation state (see nnue.py)
+    fenPieces: Optional[str] = None # see toFen()
     mirror: Optional['Board'] = None
     wMovs: Optional[List[Move]] = None
     bMovs: Optional[List[Move]] = None
     
     def __init__(self):
         """ create an empty board """
-        self.sq = [OFFBOARD]*121
-        for sqix in sqixs:
-            self.sq[sqix] = EMPTY
+        self.sq = _emptySq[:]
             
     def copy(self) -> 'Board':
         b2 = Board()
         b2.sq = self.sq[:]
         b2.mover = self.mover
+        b2.castleWK = self.castleWK
+        b2.castleWQ = self.castleWQ
+        b2.castleBK = self.castleBK
+        b2.castleBQ = self.castleBQ
+        b2.mspmc = self.mspmc
+        b2.ply = self.ply
         b2.movesMade = self.movesMade[:]
+        b2.keyHistory = self.keyHistory
+        b2.key = self.key
+        b2.pawnKey = self.pawnKey
+        b2.pieceCounts = self.pieceCounts
+        b2.materialKey = self.materialKey
+        b2.accumulator = self.accumulator
         return b2
         
     @staticmethod    
@@ -299,14 +385,24 @@ class Board:
         fen2 = fen.split()
         if len(fen2)!=6:
             raise ValueError(form("Bad FEN of %r", fen))
-        fb = fen2[0]
-        fbRanks = fb.split("/")
+        fbRanks = fen2[0].split("/")
         if len(fbRanks)!=8:
             raise ValueError(form("Bad fen=%r, wrong number of files",
                 fen))
-        for rk in ranks:
-            b.setRank(rk, fbRanks[8-rk])
-            
+        pieces = "".join(map(expandRank, fbRanks))
+        bad = set(pieces) - FEN_PIECES
+        if bad:
+            raise ValueError(form("Bad fen={!r}, bad pieces {}", fen,
+                "".join(sorted(bad))))
+        for sx, sv in zip(FEN_SQIXS, pieces):
+            b.sq[sx] = sv
+        #//for
+        if fen2[1] not in ("w", "b"):
+            raise ValueError(form("Bad fen={!r}, bad side to move {!r}",
+                fen, fen2[1]))
+        if fen2[2] != "-" and not set(fen2[2]) <= set("KQkq"):
+            raise ValueError(form("Bad fen={!r}, bad castling {!r}",
+                fen, fen2[2]))
         b.mover = "W" if fen2[1]=="w" else "B"
         b.castleWK = "K" in fen2[2]
         b.castleWQ = "Q" in fen2[2]
@@ -319,35 +415,26 @@ class Board:
         return b
     
     def toFen(self) -> str:
-        """ output position in FEN notation """
-        s = ""
-        for rk in ranks[::-1]:
-            s += self._toFenRank(rk) + "/"
-        #//for rk
-        s = s[:-1] + " " + self.mover.lower()
-        s += form(" {} ", self._toFenCastling()) # TODO: castling
-        s += "- " # TODO: en passant
-        s += form("{} ", self.mspmc)
-        s += form("{}", int(self.ply/2) + 1)
-        return s
+        """ output position in FEN notation. The piece placement is
+        kept in (self.fenPieces) until the pieces are altered.
+        """
+        if self.fenPieces is None:
+            self.fenPieces = self._toFenPieces()
+        return form("{} {} {} - {} {}",
+            self.fenPieces,
+            self.mover.lower(),
+            self._toFenCastling(),
+            self.mspmc,
+            self.ply//2 + 1)
     
-    def _toFenRank(self, rk) -> str:
-        """ return FEN-string for rank (rk) """
-        s = ""
-        numSpaces = 0
-        for f in files:
-            sv = self.sq[toSqix((f,rk))]
-            if sv==" ": 
-                numSpaces += 1
-            else:
-                if numSpaces >= 1:
-                    s += form("{}", numSpaces)
-                    numSpaces = 0
-                s += sv
-        #//for f       
-        if numSpaces >= 1:
-            s += form("{}", numSpaces)
-        return s   
+    def _toFenPieces(self) -> str:
+        """ return the piece placement field of the FEN """
+        s = "".join(_getFenSquares(self.sq)).replace(OFFBOARD, "/")
+        for spaces, digit in FEN_RUNS:
+            if spaces in s:
+                s = s.replace(spaces, digit)
+        #//for
+        return s
     
     def _toFenCastling(self) -> str:
         s = ""
@@ -355,17 +442,124 @@ class Board:
         if self.castleWQ: s+= "Q"
         if self.castleBK: s+= "k"
         if self.castleBQ: s+= "q"
-        if not s: s = ""
+        if not s: s = "-"
         return s
     
+    def castleMask(self) -> int:
+        """ the castling rights as a 4-bit number """
+        return (int(self.castleWK) | int(self.castleWQ)<<1
+                | int(self.castleBK)<<2 | int(self.castleBQ)<<3)
+
+    def pack(self) -> bytes:
+        """ the position as PACKED_SIZE bytes (see packing below) """
+        nibbles = ("".join(_getPackSquares(self.sq))
+                   .translate(PACK_CODES).encode("latin-1"))
+        squares = bytes([hi<<4 | lo
+                         for hi, lo in zip(nibbles[::2], nibbles[1::2])])
+        return PACK_STRUCT.pack(squares,
+            int(self.mover == 'B') | self.castleMask()<<1,
+            0, min(self.mspmc, 0xFFFF), min(self.ply, 0xFFFF))
+
+    @staticmethod
+    def unpack(data: bytes, offset: int = 0) -> 'Board':
+        """ the Board packed by pack() into (data) at (offset). The
+        moves made to get there aren't kept.
+        """
+        squares, flags, _, mspmc, ply = PACK_STRUCT.unpack_from(data, offset)
+        pieces = "".join(map(PACK_PAIRS.__getitem__, squares))
+        if OFFBOARD in pieces:
+            raise ValueError(form("bad packed position at offset {}",
+                                  offset))
+        b = Board()
+        for sx, sv in zip(PACK_SQIXS, pieces):
+            b.sq[sx] = sv
+        b.mover = 'B' if flags & 1 else 'W'
+        b.castleWK = bool(flags & 2)
+        b.castleWQ = bool(flags & 4)
+        b.castleBK = bool(flags & 8)
+        b.castleBQ = bool(flags & 16)
+        b.mspmc = mspmc
+        b.ply = ply
+        return b
+
+    def getKey(self) -> int:
+        """ return the Zobrist key for this position """
+        if self.key is None:
+            self.key = self.calcKey()
+        return self.key
+
+    def calcKey(self) -> int:
+        """ calculate the Zobrist key from scratch """
+        k = zobristCastle[self.castleMask()]
+        if self.mover == 'B':
+            k ^= zobristBlack
+        for sx in sqixs:
+            sv = self.sq[sx]
+            if sv != EMPTY:
+                k ^= zobristSq[sv][sx]
+        return k
+
+    def getPawnKey(self) -> int:
+        """ return the Zobrist key of the pawns only, so positions
+        with the same pawns have the same pawn key
+        """
+        if self.pawnKey is None:
+            self.pawnKey = self.calcPawnKey()
+        return self.pawnKey
+
+    def calcPawnKey(self) -> int:
+        """ calculate the pawn key from scratch """
+        k = 0
+        for sx in sqixs:
+            sv = self.sq[sx]
+            if sv in pawnSet:
+                k ^= zobristSq[sv][sx]
+        return k
+
+    def getPieceCounts(self) -> Dict[Sqv,int]:
+        """ return how many of each piece are on the board. The
+        dict is shared with other boards, so don't alter it.
+        """
+        if self.pieceCounts is None:
+            self.pieceCounts = self.calcPieceCounts()
+        return self.pieceCounts
+
+    def calcPieceCounts(self) -> Dict[Sqv,int]:
+        """ count the pieces from scratch """
+        pc = {pv: 0 for pv in "PNBRQKpnbrqk"}
+        for sx in sqixs:
+            sv = self.sq[sx]
+            if sv != EMPTY:
+                pc[sv] += 1
+        return pc
+
+    def getMaterialKey(self) -> int:
+        """ return the material key (see materialKeyOf()) """
+        if self.materialKey is None:
+            self.materialKey = materialKeyOf(self.getPieceCounts())
+        return self.materialKey
+
+    def _invalidate(self):
+        """ the pieces have been altered directly, so the keys and
+        counts must be calculated again
+        """
+        self.key = None
+        self.pawnKey = None
+        self.pieceCounts = None
+        self.materialKey = None
+        self.accumulator = None
+        self.fenPieces = None
+
     def getSq(self, ad:SqLocation) -> Sqv:
         return self.sq[toSqix(ad)]
         
     def setSq(self, ad:SqLocation , sv: Sqv):  
         self.sq[toSqix(ad)] = sv
+        self._invalidate()
                
     def setRank(self, r: Rank, pieces: str):
         """ set all the pieces on a rank """
+        self._invalidate()
         pieces2 = expandRank(pieces)
         for f in files:
             pc = pieces2[f-1]
@@ -492,6 +686,10 @@ class Board:
             b2.mspmc = 0
         else:
             b2.mspmc = self.mspmc + 1
+        if b2.mspmc == 0:
+            b2.keyHistory = []
+        else:
+            b2.keyHistory = self.keyHistory + [self.getKey()]
             
         #>>>> do the move 
         b2.sq[sqTo] = b2.sq[sqFrom]
@@ -508,9 +706,103 @@ class Board:
             # B promotes on 1st rank
             if rankTo==1 and b2.sq[sqTo]==BP:
                 b2.sq[sqTo] = BQ       
-        
+
+        #>>>>> update the Zobrist key
+        if self.key is not None:
+            k = self.key ^ zobristBlack
+            k ^= zobristSq[self.sq[sqFrom]][sqFrom]
+            k ^= zobristSq[b2.sq[sqTo]][sqTo]
+            if self.sq[sqTo] != EMPTY:
+                k ^= zobristSq[self.sq[sqTo]][sqTo]
+            b2.key = (k ^ zobristCastle[self.castleMask()]
+                        ^ zobristCastle[b2.castleMask()])
+
+        #>>>>> update the pawn key, piece counts and material key
+        moved = self.sq[sqFrom]
+        captured = self.sq[sqTo]
+        if self.pawnKey is not None:
+            k = self.pawnKey
+            if moved in pawnSet:
+                k ^= zobristSq[moved][sqFrom]
+            if b2.sq[sqTo] in pawnSet:
+                k ^= zobristSq[b2.sq[sqTo]][sqTo]
+            if captured in pawnSet:
+                k ^= zobristSq[captured][sqTo]
+            b2.pawnKey = k
+        if self.pieceCounts is not None and (captured != EMPTY
+                                             or b2.sq[sqTo] != moved):
+            pc = dict(self.pieceCounts)
+            if captured != EMPTY:
+                pc[captured] -= 1
+            if b2.sq[sqTo] != moved:
+                # promotion
+                pc[moved] -= 1
+                pc[b2.sq[sqTo]] += 1
+            b2.pieceCounts = pc
+        if self.materialKey is not None and (captured != EMPTY
+                                             or b2.sq[sqTo] != moved):
+            k = self.materialKey
+            if captured != EMPTY:
+                k -= 1 << materialShift[captured]
+            if b2.sq[sqTo] != moved:
+                k += ((1 << materialShift[b2.sq[sqTo]])
+                      - (1 << materialShift[moved]))
+            b2.materialKey = k
+
+        #>>>>> update the network accumulator
+        if self.accumulator is not None:
+            b2.accumulator = self.accumulator.afterMove(self, b2, mv)
         return b2
-    
+
+    def makeNullMove(self) -> 'Board':
+        """ return the position after the mover passes, i.e. the
+        same pieces but with the opponent to move. Not a legal move
+        in chess, but the search uses it for null-move pruning.
+        """
+        b2 = self.copy()
+        b2.mover = opponent(self.mover)
+        b2.ply = self.ply + 1
+        b2.mspmc = self.mspmc + 1
+        b2.keyHistory = [] # nothing before a pass can repeat
+        if self.key is not None:
+            b2.key = self.key ^ zobristBlack
+        return b2
+
+    #========== draws
+
+    def repetitions(self) -> int:
+        """ how many times this position has happened before (since
+        the last pawn move or capture, as nothing before that can be
+        the same). Only every other position can be, as the same
+        side must be to move.
+        """
+        return self.keyHistory[-2::-2].count(self.getKey())
+
+    def isDeadMaterial(self) -> bool:
+        """ is there too little material for either side to mate? """
+        mk = self.getMaterialKey()
+        if mk in DEAD_MATERIAL: return True
+        if mk != BISHOP_EACH: return False
+        colours = set(sum(sqixFR(sx)) % 2 for sx in sqixs
+                      if self.sq[sx] in (WB, BB))
+        return len(colours) == 1
+
+    def drawReason(self, repeats: int = 2) -> Optional[str]:
+        """ why the position is a draw, or None if it isn't. It's
+        a draw if it has happened (repeats) times before (2 is the
+        threefold repetition rule; the search uses 1).
+        """
+        if self.mspmc >= FIFTY_MOVE_PLIES:
+            return "fifty-move rule"
+        if self.mspmc >= 4 and self.repetitions() >= repeats:
+            return "repetition"
+        if self.isDeadMaterial():
+            return "insufficient material"
+        return None
+
+    def isDraw(self, repeats: int = 2) -> bool:
+        return self.drawReason(repeats) is not None
+
     def _checkCanCastle(self):
         """ if W or B can no longer castle, change the relevant
         castling flag. 
@@ -526,20 +818,77 @@ class Board:
             self.castleBK = False
             self.castleBQ = False
 
+#---------------------------------------------------------------------
+# FEN tables
+
+# the squares in the order FEN lists them, a8 to h8 then down to a1
+FEN_SQIXS = [frix(f, rk) for rk in reverseRanks for f in files]
+
+# the same, with the index of an off-board square between the ranks,
+# so one lookup gives the whole piece placement with OFFBOARD for "/"
+_getFenSquares = operator.itemgetter(*[sx
+    for rk in reverseRanks
+    for sx in [0] + [frix(f, rk) for f in files]][1:])
+
+# runs of empty squares and their digits, longest first
+FEN_RUNS = [(EMPTY*n, str(n)) for n in range(8, 0, -1)]
+FEN_EXPAND = {str(n): EMPTY*n for n in range(10)}
+
+# what a FEN's piece placement can have, once expanded
+FEN_PIECES = whiteSet | blackSet | {EMPTY}
+
 def expandRank(p: str) -> str:
     """ (p) is a rank in FEN format. Returns the same rank but 
     with digits expanded to that number of spaces. 
     """
-    r = ""
-    for ch in p:
-        if ch.isdigit():
-            r += " " * int(ch)
-        else:
-            r += ch
-    #//for ch
-    r += " "*8
-    r = r[:8]
-    return r
+    return ("".join([FEN_EXPAND.get(ch, ch) for ch in p]) + EMPTY*8)[:8]
+
+#---------------------------------------------------------------------
+# packing positions
+#
+# A packed position is PACKED_SIZE (38) bytes, which is much smaller
+# and quicker than pickling a Board, so it's what to use to send
+# positions to other processes or write them to files:
+#
+#    0  32 bytes  the squares, 4 bits each (high bits first) in the
+#                 order of sqixs (a1, a2, ... h8); see PACK_PIECES
+#   32  1 byte    bit 0 set if black to move, bits 1-4 castleMask()
+#   33  1 byte    en passant file (always 0 = none, as Board doesn't
+#                 keep track of it)
+#   34  2 bytes   mspmc
+#   36  2 bytes   ply
+#
+# (numbers are little-endian)
+
+PACK_STRUCT = struct.Struct("<32sBBHH")
+PACKED_SIZE = PACK_STRUCT.size
+
+# the piece for each 4-bit code; bit 3 is set for black pieces
+PACK_PIECES = [EMPTY, WP, WN, WB, WR, WQ, WK, OFFBOARD,
+               OFFBOARD, BP, BN, BB, BR, BQ, BK, OFFBOARD]
+PACK_CODES = str.maketrans({sv: chr(code)
+                            for code, sv in enumerate(PACK_PIECES)
+                            if sv != OFFBOARD})
+
+# the 2 squares for each byte
+PACK_PAIRS = [PACK_PIECES[byte>>4] + PACK_PIECES[byte & 15]
+              for byte in range(256)]
+
+PACK_SQIXS = sqixs
+_getPackSquares = operator.itemgetter(*PACK_SQIXS)
+
+def packBoards(boards: Iterable[Board]) -> bytes:
+    """ pack (boards) one after another """
+    return b"".join([b.pack() for b in boards])
+
+def unpackBoards(data: Union[bytes, bytearray, memoryview]
+                 ) -> List[Board]:
+    """ unpack all the positions in (data), as made by packBoards() """
+    if len(data) % PACKED_SIZE:
+        raise ValueError(form("{} bytes isn't a whole number of packed "
+                              "positions", len(data)))
+    return [Board.unpack(data, offset)
+            for offset in range(0, len(data), PACKED_SIZE)]
  
  
 #---------------------------------------------------------------------
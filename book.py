@@ -0,0 +1,359 @@
+# book.py = opening book
+
+"""
+An opening book: for positions from the start of a collection of
+games, which moves were played in them and how often. The search
+plays a move from the book, if there is one, instead of searching.
+
+Usage:
+
+    python book.py -o book.bin games1.txt games2.txt ...
+
+Games
+-----
+Files ending in ".pgn" are read as PGN (see pgn.py), and the workers
+work out what the SAN moves are. Other game files have one game per
+line, as moves in Almov form ("e2e4 e7e5 g1f3 ..."). Move numbers
+("1.") and results ("1-0") are skipped, as are blank lines and lines
+starting with "#". A game is only used up to
+its first move that isn't a possible move, and only its first
+(maxPly) moves are put in the book.
+
+Building
+--------
+The games are dealt out in chunks to a pool of processes. Each
+process replays its games, and sends back (key, move, weight) records
+for the positions, with the same (key, move) added together. The
+chunks' records are then merged and sorted by key.
+
+Files
+-----
+A book file is a HEADER_SIZE byte header (magic, number of records,
+maxPly) followed by the records, sorted by key then move:
+
+    key     uint64  the position's Zobrist key (see Board.getKey())
+    move    uint16  (from sqix << 8) | to sqix
+    weight  uint32  the number of games the move was played in
+
+Probing maps the file into memory and does a binary search on it, so
+only the pages that are needed are read.
+"""
+
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import time
+from multiprocessing import Pool
+from typing import List, Tuple, Dict, Optional, Iterator, Iterable
+
+import numpy as np
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import pmovs, isCastling, isEnPassant, playMove
+import pgn
+from san import sanToMove
+
+#---------------------------------------------------------------------
+
+BOOK_MAGIC = b"CALIBK01"
+HEADER_SIZE = 32
+HEADER_FORMAT = "<8sQQ" # magic, number of records, maxPly
+
+RECORD_SIZE = 16
+RECORD_DTYPE = np.dtype({'names': ['key', 'move', 'weight'],
+                         'formats': ['<u8', '<u2', '<u4'],
+                         'offsets': [0, 8, 12],
+                         'itemsize': RECORD_SIZE})
+RECORD_FORMAT = "<QH2xI"
+
+BOOK_PLIES = 20 # default number of moves from each game in the book
+CHUNK_GAMES = 500 # games sent to a worker at a time
+
+RESULTS = frozenset(["1-0", "0-1", "1/2-1/2", "*"])
+_moveNumberRe = re.compile(r"^\d+\.+")
+_almovRe = re.compile(r"^[a-h][1-8][a-h][1-8]$")
+
+#---------------------------------------------------------------------
+# reading games
+
+def encodeMove(mv: Move) -> int:
+    return (mv[0] << 8) | mv[1]
+
+def decodeMove(code: int) -> Move:
+    return (code >> 8, code & 0xFF)
+
+def parseMoveList(line: str) -> List[Almov]:
+    """ the moves in a line of a game file """
+    moves = []
+    for tok in line.split():
+        tok = _moveNumberRe.sub("", tok)
+        if tok and tok not in RESULTS:
+            moves.append(tok)
+    #//for tok
+    return moves
+
+def readGames(filename: str) -> Iterator[List[str]]:
+    """ the games in file (filename), as lists of moves (in Almov
+    form, or SAN for PGN files). PGN games that don't start from the
+    start position are skipped.
+    """
+    if filename.endswith(".pgn"):
+        with open(filename, encoding="utf-8", errors="replace") as f:
+            for game in pgn.readGames(f):
+                if "FEN" not in game.headers and game.sans:
+                    yield game.sans
+        return
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            moves = parseMoveList(line)
+            if moves:
+                yield moves
+    #//with
+
+def findMove(b: Board, tok: str) -> Tuple[Move, Optional[Sqv]]:
+    """ the move (tok), in Almov or SAN form, in position (b), and
+    what a pawn promotes to. Raise ValueError if it isn't possible.
+    """
+    if _almovRe.match(tok):
+        mv = almovMov(tok)
+        if (mv in pmovs(b, b.mover) or isCastling(b, mv)
+            or isEnPassant(b, mv)):
+            return mv, None
+        raise ValueError(form("{}: not possible", tok))
+    return sanToMove(b, tok)
+
+def gameRecords(moves: List[str], maxPly: int = BOOK_PLIES
+                ) -> List[Tuple[int,int]]:
+    """ (key, move) for the first (maxPly) moves of a game """
+    r = []
+    b = Board.startPosition()
+    for tok in moves[:maxPly]:
+        try:
+            mv, promo = findMove(b, tok)
+        except ValueError:
+            break
+        r.append((b.getKey(), encodeMove(mv)))
+        b = playMove(b, mv, promo)
+    #//for tok
+    return r
+
+#---------------------------------------------------------------------
+# building
+
+def aggregate(keys: np.ndarray, moves: np.ndarray, weights: np.ndarray
+              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ sort records by (key, move), adding together the weights of
+    ones with the same (key, move)
+    """
+    order = np.lexsort((moves, keys))
+    keys, moves, weights = keys[order], moves[order], weights[order]
+    if len(keys) == 0:
+        return keys, moves, weights
+    start = np.ones(len(keys), dtype=bool)
+    start[1:] = (keys[1:] != keys[:-1]) | (moves[1:] != moves[:-1])
+    firsts = np.flatnonzero(start)
+    return keys[firsts], moves[firsts], np.add.reduceat(weights, firsts)
+
+def _chunkRecords(args: Tuple[List[List[str]], int]
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ the records for a chunk of games, in a worker process """
+    games, maxPly = args
+    recs = [rec for moves in games for rec in gameRecords(moves, maxPly)]
+    keys = np.array([k for k, _ in recs], dtype=np.uint64)
+    moves = np.array([m for _, m in recs], dtype=np.uint16)
+    return aggregate(keys, moves, np.ones(len(recs), dtype=np.uint32))
+
+def _chunks(games: Iterable[List[str]], maxPly: int, size: int
+            ) -> Iterator[Tuple[List[List[str]], int]]:
+    chunk: List[List[str]] = []
+    for moves in games:
+        chunk.append(moves)
+        if len(chunk) >= size:
+            yield chunk, maxPly
+            chunk = []
+    #//for moves
+    if chunk:
+        yield chunk, maxPly
+
+def allGames(filenames: List[str]) -> Iterator[List[str]]:
+    for fn in filenames:
+        yield from readGames(fn)
+
+def buildBook(filenames: List[str], outFile: str,
+              maxPly: int = BOOK_PLIES,
+              minWeight: int = 1,
+              numWorkers: Optional[int] = None,
+              chunkGames: int = CHUNK_GAMES) -> int:
+    """ make book file (outFile) from the games in (filenames), using
+    a pool of (numWorkers) processes (default: one per CPU; 0 means
+    don't use a pool). Moves played in fewer than (minWeight) games
+    are left out. Return the number of records.
+    """
+    chunks = _chunks(allGames(filenames), maxPly, chunkGames)
+    if numWorkers == 0:
+        parts = [_chunkRecords(c) for c in chunks]
+    else:
+        with Pool(numWorkers or os.cpu_count() or 1) as pool:
+            parts = list(pool.imap_unordered(_chunkRecords, chunks))
+    keys, moves, weights = aggregate(
+        np.concatenate([p[0] for p in parts] + [np.zeros(0, np.uint64)]),
+        np.concatenate([p[1] for p in parts] + [np.zeros(0, np.uint16)]),
+        np.concatenate([p[2] for p in parts] + [np.zeros(0, np.uint32)]))
+    keep = weights >= minWeight
+    recs = np.zeros(int(keep.sum()), dtype=RECORD_DTYPE)
+    recs['key'] = keys[keep]
+    recs['move'] = moves[keep]
+    recs['weight'] = weights[keep]
+    writeBook(outFile, recs, maxPly)
+    return len(recs)
+
+def writeBook(filename: str, recs: np.ndarray, maxPly: int):
+    """ write records (recs), sorted, to (filename) """
+    d = os.path.dirname(filename)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    header = struct.pack(HEADER_FORMAT, BOOK_MAGIC, len(recs), maxPly)
+    with open(filename, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(recs.tobytes())
+
+#---------------------------------------------------------------------
+# probing
+
+class OpeningBook:
+    """ a book file, mapped into memory """
+
+    filename: str = ""
+    numRecords: int = 0
+    maxPly: int = 0
+    mm: Optional[mmap.mmap] = None
+    rnd: random.Random
+
+    def __init__(self, filename: str, seed: Optional[int] = None):
+        """ (seed) is for choosing between moves """
+        self.filename = filename
+        self.rnd = random.Random(seed)
+        with open(filename, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(form("{}: not a book", filename))
+            magic, n, maxPly = struct.unpack_from(HEADER_FORMAT, header)
+            if magic != BOOK_MAGIC:
+                raise ValueError(form("{}: not a book", filename))
+            self.numRecords = n
+            self.maxPly = maxPly
+            if os.fstat(f.fileno()).st_size != HEADER_SIZE + n*RECORD_SIZE:
+                raise ValueError(form("{}: wrong length", filename))
+            if n > 0:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __repr__(self) -> str:
+        return form("<OpeningBook {} ({} records)>",
+                    self.filename, self.numRecords)
+
+    def __len__(self) -> int:
+        return self.numRecords
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def __enter__(self) -> 'OpeningBook':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, i: int) -> Tuple[int,int,int]:
+        """ record (i), as (key, move, weight) """
+        return struct.unpack_from(RECORD_FORMAT, self.mm,
+                                  HEADER_SIZE + i*RECORD_SIZE)
+
+    def _firstIndex(self, key: int) -> int:
+        """ the index of the first record with key >= (key) """
+        lo, hi = 0, self.numRecords
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k = struct.unpack_from("<Q", self.mm,
+                                   HEADER_SIZE + mid*RECORD_SIZE)[0]
+            if k < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        #//while
+        return lo
+
+    def lookup(self, key: int) -> List[Tuple[Move,int]]:
+        """ (move, weight) for every record with key (key) """
+        r = []
+        if self.mm is None: return r
+        i = self._firstIndex(key)
+        while i < self.numRecords:
+            k, mc, w = self.record(i)
+            if k != key: break
+            r.append((decodeMove(mc), w))
+            i += 1
+        #//while
+        return r
+
+    def probe(self, b: Board) -> List[Tuple[Move,int]]:
+        """ the book moves in position (b), with their weights. Moves
+        that aren't possible here (because another position has the
+        same key) are left out.
+        """
+        entries = self.lookup(b.getKey())
+        if not entries: return entries
+        mvs = pmovs(b, b.mover)
+        return [(mv, w) for mv, w in entries if mv in mvs]
+
+    def choose(self, b: Board, rootMoves: Optional[List[Move]] = None,
+               best: bool = False) -> Optional[Move]:
+        """ a book move in position (b), chosen at random in
+        proportion to the weights (or if (best), the one with the
+        highest weight), or None if there isn't one. If (rootMoves)
+        is given, only those moves are considered.
+        """
+        entries = self.probe(b)
+        if rootMoves is not None:
+            entries = [(mv, w) for mv, w in entries if mv in rootMoves]
+        if not entries: return None
+        if best:
+            return max(entries, key=lambda e: e[1])[0]
+        mvs = [mv for mv, _ in entries]
+        return self.rnd.choices(mvs, weights=[w for _, w in entries])[0]
+
+#---------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="make an opening book")
+    ap.add_argument("games", nargs="+", help="game files")
+    ap.add_argument("-o", "--out", default="book.bin",
+                    help="book file to write")
+    ap.add_argument("-p", "--plies", type=int, default=BOOK_PLIES,
+                    help="moves from each game to put in the book")
+    ap.add_argument("-m", "--min-weight", type=int, default=1,
+                    help="leave out moves played in fewer games")
+    ap.add_argument("-w", "--workers", type=int, default=None,
+                    help="worker processes (default: one per CPU)")
+    args = ap.parse_args()
+    t0 = time.time()
+    n = buildBook(args.games, args.out, maxPly=args.plies,
+                  minWeight=args.min_weight, numWorkers=args.workers)
+    prn("{}: {} records in {:.2f}s", args.out, n, time.time() - t0)
+    with OpeningBook(args.out) as book:
+        b = Board.startPosition()
+        for mv, w in sorted(book.probe(b), key=lambda e: -e[1]):
+            prn("  {} {}", toAlmov(mv), w)
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -0,0 +1,275 @@
+# endgame.py = evaluation of particular endgames
+
+"""
+Specialised evaluation for some endgames with few pieces, chosen by
+the position's material key (see board.materialKeyOf()). evalpos's
+staticEval() looks the key up in ENDGAMES -- one dict lookup -- and if
+it's there, uses the Endgame it finds instead of (or as well as) the
+general evaluation.
+
+An Endgame either has an evaluate() function, which replaces the
+general evaluation, or a scale() function, which scales it by
+scale/SCALE_NORMAL (so a drawish ending counts for less).
+
+These endgames are recognised (with either side being the strong
+side):
+
+    KQK, KRK     drive the lone king to the edge (a known win)
+    KBNK         drive the lone king to a corner of the bishop's colour
+    KPK          rules for when the pawn wins and when it's a draw
+    KB+P v KB+P  opposite-coloured bishops are scaled towards a draw
+    KK, KNK, KBK, KNNK, KBKB
+                 insufficient material: a draw
+
+The evaluators only look at where a few pieces are, so they are much
+cheaper than the general evaluation, which generates every move.
+Scores are +ve for white, and include the material (from the piece
+values of the EvalParams they are given, which is all they use of
+it).
+"""
+
+from typing import List, Tuple, Dict, Optional, Callable, Any
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+# evalpos imports this module, so only the module is imported here,
+# and its functions are used once both are loaded
+import evalpos
+
+#---------------------------------------------------------------------
+
+KNOWN_WIN = 2000 # bonus for a won ending, on top of the material
+
+PUSH_TO_EDGE = 20 # per square the lone king is from the centre
+PUSH_CLOSE = 10 # per square the kings are closer than 7
+PUSH_TO_CORNER = 30 # per square the lone king is nearer the corner
+PAWN_ADVANCE = 10 # per rank the pawn has advanced, in KPK
+
+SCALE_NORMAL = 64 # scale() values are out of this
+OPPOSITE_BISHOPS_SCALE = 32
+
+#---------------------------------------------------------------------
+# geometry
+
+def centreDist(sx: Sqix) -> int:
+    """ how far (sx) is from the centre, 0 (d4, e4, d5, e5) to 3
+    (the edge)
+    """
+    f, rk = sqixFR(sx)
+    return max(abs(2*f-9), abs(2*rk-9)) // 2
+
+def isDark(sx: Sqix) -> bool:
+    f, rk = sqixFR(sx)
+    return (f + rk) % 2 == 0
+
+DARK_CORNERS = [toSqix("a1"), toSqix("h8")]
+LIGHT_CORNERS = [toSqix("a8"), toSqix("h1")]
+
+def findPieces(b: Board) -> Dict[Sqv,List[Sqix]]:
+    """ where each piece on (b) is """
+    r: Dict[Sqv,List[Sqix]] = {}
+    for sx in sqixs:
+        sv = b.sq[sx]
+        if sv != EMPTY:
+            r.setdefault(sv, []).append(sx)
+    #//for sx
+    return r
+
+def relative(sx: Sqix, strong: Player) -> Tuple[File,Rank]:
+    """ (file, rank) of (sx), from the strong side's point of view,
+    i.e. with the ranks reversed if it's black
+    """
+    f, rk = sqixFR(sx)
+    return (f, rk) if strong == 'W' else (f, 9-rk)
+
+def material(b: Board, ep: Any) -> int:
+    """ the material, with (ep)'s piece values """
+    v = 0
+    for pv, n in b.getPieceCounts().items():
+        v += ep.pieceValues[pv]*n
+    return v
+
+def signed(v: int, strong: Player) -> int:
+    """ (v), good for the strong side, as +ve for white """
+    return v if strong == 'W' else -v
+
+#---------------------------------------------------------------------
+# the evaluators
+
+def evalDraw(b: Board, ep: Any, strong: Player) -> int:
+    """ neither side can win """
+    return 0
+
+def evalKXK(b: Board, ep: Any, strong: Player) -> int:
+    """ king and a major piece against a lone king: push the lone
+    king to the edge, and bring the kings together
+    """
+    pieces = findPieces(b)
+    sk = pieces[WK if strong == 'W' else BK][0]
+    wk = pieces[BK if strong == 'W' else WK][0]
+    bonus = (KNOWN_WIN + PUSH_TO_EDGE*centreDist(wk)
+             + PUSH_CLOSE*(7 - evalpos.dist(sk, wk)))
+    return material(b, ep) + signed(bonus, strong)
+
+def evalKBNK(b: Board, ep: Any, strong: Player) -> int:
+    """ king, bishop and knight against a lone king: it can only be
+    mated in a corner the bishop can reach
+    """
+    pieces = findPieces(b)
+    sk = pieces[WK if strong == 'W' else BK][0]
+    wk = pieces[BK if strong == 'W' else WK][0]
+    bishop = pieces[WB if strong == 'W' else BB][0]
+    corners = DARK_CORNERS if isDark(bishop) else LIGHT_CORNERS
+    cornerDist = min(evalpos.dist(wk, c) for c in corners)
+    bonus = (KNOWN_WIN + PUSH_TO_CORNER*(7 - cornerDist)
+             + PUSH_CLOSE*(7 - evalpos.dist(sk, wk)))
+    return material(b, ep) + signed(bonus, strong)
+
+def kpkResult(sk: Tuple[File,Rank], wk: Tuple[File,Rank],
+              pawn: Tuple[File,Rank], strongToMove: bool) -> Optional[bool]:
+    """ whether king and pawn against king wins (True), draws (False),
+    or isn't clear (None). Squares are (file, rank) with the pawn
+    moving up the board.
+    """
+    pf, pr = pawn
+    def d(a, b):
+        return max(abs(a[0]-b[0]), abs(a[1]-b[1]))
+
+    # the lone king takes the undefended pawn
+    if not strongToMove and d(wk, pawn) == 1 and d(sk, pawn) > 1:
+        return False
+
+    # the lone king is stalemated
+    if not strongToMove:
+        escapes = [(f, rk)
+                   for f in range(wk[0]-1, wk[0]+2)
+                   for rk in range(wk[1]-1, wk[1]+2)
+                   if 1 <= f <= 8 and 1 <= rk <= 8 and (f, rk) != wk
+                   and d((f, rk), sk) > 1
+                   and not (rk == pr+1 and abs(f-pf) == 1)]
+        if not escapes:
+            return False
+
+    # rule of the square. Not for a pawn on the 7th with the lone king
+    # near, as promoting can stalemate it
+    steps = 8 - pr - (1 if pr == 2 else 0)
+    inFront = sk[0] == pf and sk[1] > pr
+    nearPromotion = pr == 7 and d(wk, (pf, 8)) <= 2
+    if (not inFront and not nearPromotion
+        and d(wk, (pf, 8)) - (0 if strongToMove else 1) > steps):
+        return True
+
+    # rook pawns are drawn if the lone king gets to the corner
+    if pf in (1, 8) and d(wk, (pf, 8)) <= 1:
+        return False
+
+    # the lone king just in front of a pawn that's no further than the
+    # 5th rank, with the other king not in front of the pawn
+    if wk[0] == pf and pr < wk[1] <= pr+2 and pr <= 5 and sk[1] <= pr:
+        return False
+
+    # the strong king on a key square
+    if pf not in (1, 8):
+        if pr <= 4:
+            keyRanks = [pr+2]
+        elif pr <= 6:
+            keyRanks = [pr+1, pr+2]
+        else:
+            keyRanks = [pr, pr+1]
+        if (abs(sk[0]-pf) <= 1 and sk[1] in keyRanks
+            and sk != pawn and d(sk, wk) > 1):
+            return True
+    return None
+
+def evalKPK(b: Board, ep: Any, strong: Player) -> int:
+    """ king and pawn against king """
+    pieces = findPieces(b)
+    sk = relative(pieces[WK if strong == 'W' else BK][0], strong)
+    wk = relative(pieces[BK if strong == 'W' else WK][0], strong)
+    pawnSq = pieces[WP if strong == 'W' else BP][0]
+    pawn = relative(pawnSq, strong)
+    result = kpkResult(sk, wk, pawn, b.mover == strong)
+    if result is False:
+        return 0
+    bonus = PAWN_ADVANCE*pawn[1]
+    if result:
+        bonus += KNOWN_WIN
+    return material(b, ep) + signed(bonus, strong)
+
+def scaleOppositeBishops(b: Board, strong: Player) -> int:
+    """ bishops of opposite colours are drawish, however many pawns
+    there are
+    """
+    pieces = findPieces(b)
+    if isDark(pieces[WB][0]) != isDark(pieces[BB][0]):
+        return OPPOSITE_BISHOPS_SCALE
+    return SCALE_NORMAL
+
+#---------------------------------------------------------------------
+# the dispatch table
+
+class Endgame:
+    """ how to evaluate an endgame """
+
+    name: str = ""
+    strong: Player = 'W' # the side that may win
+    evaluate: Optional[Callable[[Board, Any, Player], int]] = None
+    scale: Optional[Callable[[Board, Player], int]] = None
+
+    def __init__(self, name: str, strong: Player,
+                 evaluate: Optional[Callable] = None,
+                 scale: Optional[Callable] = None):
+        self.name = name
+        self.strong = strong
+        self.evaluate = evaluate
+        self.scale = scale
+
+    def __repr__(self) -> str:
+        return form("<Endgame {} strong={}>", self.name, self.strong)
+
+def signatureKey(sig: str, strong: Player = 'W') -> int:
+    """ the material key of signature (sig), e.g. "KRK" is king and
+    rook (for the (strong) side) against king
+    """
+    i = sig.index("K", 1)
+    strongPieces, weakPieces = sig[:i], sig[i:]
+    if strong == 'B':
+        strongPieces = strongPieces.lower()
+    else:
+        weakPieces = weakPieces.lower()
+    counts: Dict[Sqv,int] = {}
+    for pv in strongPieces + weakPieces:
+        counts[pv] = counts.get(pv, 0) + 1
+    return materialKeyOf(counts)
+
+# ENDGAMES[material key] = Endgame
+ENDGAMES: Dict[int, Endgame] = {}
+
+def addEndgame(sig: str, evaluate: Optional[Callable] = None,
+               scale: Optional[Callable] = None):
+    """ add signature (sig) to ENDGAMES, for either side being the
+    strong side
+    """
+    for strong in ('W', 'B'):
+        ENDGAMES[signatureKey(sig, strong)] = Endgame(sig, strong,
+                                                      evaluate, scale)
+
+for _sig in ["KK", "KNK", "KBK", "KNNK", "KBKB"]:
+    addEndgame(_sig, evaluate=evalDraw)
+addEndgame("KQK", evaluate=evalKXK)
+addEndgame("KRK", evaluate=evalKXK)
+addEndgame("KBNK", evaluate=evalKBNK)
+addEndgame("KPK", evaluate=evalKPK)
+for _wp in range(0, 8+1):
+    for _bp in range(0, 8+1):
+        if _wp + _bp > 0:
+            addEndgame("KB" + "P"*_wp + "KB" + "P"*_bp,
+                       scale=scaleOppositeBishops)
+#//for
+
+def findEndgame(b: Board) -> Optional[Endgame]:
+    """ the Endgame for position (b), if there is one """
+    return ENDGAMES.get(b.getMaterialKey())
+
+#end
@@ -0,0 +1,317 @@
+# evalbatch.py = static evaluation of many positions at once
+
+"""
+Evaluate many positions at once, using NumPy array operations instead
+of a Python loop per square. The results are identical to calling
+evalpos.staticEval() on each position.
+
+Positions are encoded as an (N, 64) int8 array, one row per position
+(see movegenbatch.py). Moves for mobility come from
+movegenbatch.pmovsBatch().
+
+Every function that evaluates takes an optional (params), an
+evalpos.EvalParams; by default evalpos.defaultParams is used. The
+tables derived from a set of parameters are made when it's first used
+(see batchTables()).
+"""
+
+from typing import List, Sequence, Dict, Tuple, Optional
+
+from ulib.butil import form
+
+import numpy as np
+
+from board import *
+import evalpos
+import endgame
+from movegenbatch import (PIECE_CODES, P_CODE, K_CODE, sqixIdx,
+    encodeBoards, decodeBoard, mirrorArr, mirrorIdx, pmovsBatch)
+
+#---------------------------------------------------------------------
+# tables for a set of parameters
+
+class BatchTables:
+    """ the arrays derived from an evalpos.EvalParams """
+
+    materialTable: np.ndarray # [code+K_CODE] = value of piece (code)
+    pawnWeights: np.ndarray # weights for pawnFeaturesWBatch()'s columns
+    baseImportance: np.ndarray # see calcSqImportanceTables()
+    ekImportance: np.ndarray
+
+    def __init__(self, ep: evalpos.EvalParams):
+        self.materialTable = np.zeros(2*K_CODE+1, dtype=np.int64)
+        for pv, code in PIECE_CODES.items():
+            self.materialTable[code+K_CODE] = ep.pieceValues.get(pv, 0)
+        self.pawnWeights = np.array([ep.DOUBLED, ep.ISOLATED, ep.PASSED,
+                                     ep.PROTECTED_PASSED]
+                                    + ep.PASSED_ADVANCE[2:8], dtype=np.int64)
+        self.baseImportance, self.ekImportance = calcSqImportanceTables(ep)
+
+MAX_BATCH_TABLES = 8
+
+# id(params) -> (params, its tables). The params are kept so their id
+# can't be reused while they're in here.
+_batchTables: Dict[int, Tuple[evalpos.EvalParams, BatchTables]] = {}
+
+def batchTables(params: Optional[evalpos.EvalParams] = None
+                ) -> BatchTables:
+    """ the tables for (params), made the first time they're asked
+    for
+    """
+    ep = params or evalpos.defaultParams
+    entry = _batchTables.get(id(ep))
+    if entry is None:
+        if len(_batchTables) >= MAX_BATCH_TABLES:
+            _batchTables.clear()
+        entry = (ep, BatchTables(ep))
+        _batchTables[id(ep)] = entry
+    return entry[1]
+
+#---------------------------------------------------------------------
+# material
+
+def materialBatch(arr: np.ndarray,
+                  params: Optional[evalpos.EvalParams] = None) -> np.ndarray:
+    """ evalpos.material() for each encoded position """
+    table = batchTables(params).materialTable
+    return table[arr.astype(np.int64) + K_CODE].sum(axis=1)
+
+def materialKeysArr(arr: np.ndarray) -> np.ndarray:
+    """ Board.getMaterialKey() for each encoded position """
+    keys = np.zeros(len(arr), dtype=np.int64)
+    for sv, code in PIECE_CODES.items():
+        if code == 0: continue
+        keys += (arr == code).sum(axis=1).astype(np.int64) << materialShift[sv]
+    #//for
+    return keys
+
+#---------------------------------------------------------------------
+# pawn structure
+
+RANK_NUMS = np.arange(1, 9) # rank numbers, by rank index
+RANKS_2_TO_7 = (RANK_NUMS >= 2) & (RANK_NUMS <= 7)
+
+def neighbourSum(a: np.ndarray) -> np.ndarray:
+    """ for an (N, 8) array by file, the sum of the neighbouring files """
+    r = np.zeros_like(a)
+    r[:, 1:] += a[:, :-1]
+    r[:, :-1] += a[:, 1:]
+    return r
+
+def neighbourMax(a: np.ndarray) -> np.ndarray:
+    """ for an (N, 8) array by file, the max of the file and its
+    neighbours
+    """
+    r = a.copy()
+    r[:, 1:] = np.maximum(r[:, 1:], a[:, :-1])
+    r[:, :-1] = np.maximum(r[:, :-1], a[:, 1:])
+    return r
+
+def pawnFeaturesWBatch(arr: np.ndarray) -> np.ndarray:
+    """ for each encoded position, an (N, 10) array of how many times
+    each of white's pawn structure terms applies: (doubled, isolated,
+    passed, protected passed, passed on ranks 2..7)
+    """
+    n = arr.shape[0]
+    a = arr.reshape(n, 8, 8)
+    wp = (a == P_CODE) & RANKS_2_TO_7 # only ranks 2..7 count
+    bp = (a == -P_CODE) & (RANK_NUMS <= 7)
+
+    wpFile = wp.sum(axis=2)
+    wpNeigh = neighbourSum(wpFile)
+    doubled = np.maximum(wpFile-1, 0).sum(axis=1)
+    isolated = (wpFile * (wpNeigh == 0)).sum(axis=1)
+
+    # rank of most advanced WP on each file (0 if none), and of the
+    # most advanced BP on the file or its neighbours:
+    mostAdvanced = (wp * RANK_NUMS).max(axis=2)
+    bpBlockRank = neighbourMax((bp * RANK_NUMS).max(axis=2))
+    passed = (mostAdvanced > 0) & (bpBlockRank <= mostAdvanced)
+    cols = [doubled, isolated, passed.sum(axis=1),
+            (passed & (wpNeigh > 0)).sum(axis=1)]
+    for rk in range(2, 7+1):
+        cols.append((passed & (mostAdvanced == rk)).sum(axis=1))
+    return np.stack(cols, axis=1)
+
+def pawnWeightVector(params: Optional[evalpos.EvalParams] = None
+                     ) -> np.ndarray:
+    """ the weights for pawnFeaturesWBatch()'s columns """
+    return batchTables(params).pawnWeights
+
+def pawnStructureWBatch(arr: np.ndarray,
+                        params: Optional[evalpos.EvalParams] = None
+                        ) -> np.ndarray:
+    """ evalpos.pawnStructureW() for each encoded position """
+    return pawnFeaturesWBatch(arr) @ pawnWeightVector(params)
+
+def pawnStructureBatch(arr: np.ndarray,
+                       params: Optional[evalpos.EvalParams] = None
+                       ) -> np.ndarray:
+    """ evalpos.pawnStructure() for each encoded position """
+    return (pawnStructureWBatch(arr, params)
+            - pawnStructureWBatch(mirrorArr(arr), params))
+
+#---------------------------------------------------------------------
+# square importance and mobility
+
+def calcSqImportanceTables(ep: evalpos.EvalParams
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+    """ return (baseImportance, ekImportance) for parameters (ep),
+    where:
+    baseImportance[i] = importance of square i, ignoring the enemy K
+    ekImportance[k][i] = extra importance of square i when the enemy
+        K is on square k. Row 64 is for no enemy K, and is all 0.
+    """
+    base = ep.sqImportance[0]
+    baseImportance = np.array([base[sx] for sx in sqixs], dtype=np.int64)
+    ekImportance = np.zeros((65, 64), dtype=np.int64)
+    for k, ksx in enumerate(sqixs):
+        si = ep.sqImportance[ksx]
+        ekImportance[k] = [si[sx] for sx in sqixs]
+        ekImportance[k] -= baseImportance
+    #//for
+    return baseImportance, ekImportance
+
+def bkIndexes(arr: np.ndarray) -> np.ndarray:
+    """ the column of the black king in each encoded position, 64 if
+    none
+    """
+    isBk = (arr == -K_CODE)
+    return np.where(isBk.any(axis=1), isBk.argmax(axis=1), 64)
+
+def calcSqImportanceBatch(arr: np.ndarray,
+                          params: Optional[evalpos.EvalParams] = None
+                          ) -> np.ndarray:
+    """ evalpos.calcSqImportance() for each encoded position, as an
+    (N, 64) array
+    """
+    t = batchTables(params)
+    return t.baseImportance + t.ekImportance[bkIndexes(arr)]
+
+def destCounts(arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ return (wCounts, bCounts), (N, 64) arrays of how many of
+    white's and black's pseudo-moves go to each square
+    """
+    return pmovsBatch(arr, 'W').attacks, pmovsBatch(arr, 'B').attacks
+
+def mobilityBatch(arr: np.ndarray, wCounts: np.ndarray,
+                  bCounts: np.ndarray,
+                  params: Optional[evalpos.EvalParams] = None
+                  ) -> np.ndarray:
+    """ evalpos.mobility() for each encoded position, given how many
+    moves each side has to each square
+    """
+    wMob = (wCounts * calcSqImportanceBatch(arr, params)).sum(axis=1)
+    mirCounts = bCounts[:, mirrorIdx]
+    bMob = (mirCounts
+            * calcSqImportanceBatch(mirrorArr(arr), params)).sum(axis=1)
+    fm = evalpos.FINAL_MULTIPLIER
+    return (np.trunc(wMob*fm) - np.trunc(bMob*fm)).astype(np.int64)
+
+#---------------------------------------------------------------------
+# features
+
+""" 
+staticEval() is linear in the weights (as long as FINAL_MULTIPLIER
+is a whole number), so a position can be described by a feature
+vector: how many times each weight applies, white's minus black's.
+Its evaluation is then the dot product of its features with
+weightVector(). Once a set of positions' features have been
+calculated, they can be evaluated with any weights quickly; the
+tuning tool (tune.py) uses this. The endgames that endgame.py
+evaluates aren't linear, so their features don't give their
+evaluation.
+"""
+FEATURE_NAMES = (
+    ['P_VALUE', 'N_VALUE', 'B_VALUE', 'R_VALUE', 'Q_VALUE', 'K_VALUE',
+     'DOUBLED', 'ISOLATED', 'PASSED', 'PROTECTED_PASSED']
+    + [form("PASSED_ADVANCE[{}]", rk) for rk in range(2, 7+1)]
+    + ['BASE', 'CENTER', 'OUTER_CENTER', 'EK', 'EK1', 'EK2'])
+
+def colMask(sxs: Sequence[Sqix]) -> np.ndarray:
+    """ a (64,) array, 1 for the columns of squares (sxs) """
+    m = np.zeros(64, dtype=np.int64)
+    for sx in sxs:
+        m[sqixIdx[sx]] = 1
+    return m
+
+CENTER_COLS = colMask(evalpos.CENTER_SQS)
+OUTER_CENTER_COLS = colMask(evalpos.OUTER_CENTER_SQS)
+
+# ekDistCols[k][d] = 1 for columns distance (d) from an enemy K on
+# column (k). Row 64 is for no enemy K, and is all 0.
+ekDistCols = np.zeros((65, 3, 64), dtype=np.int64)
+for _k, _ksx in enumerate(sqixs):
+    for _i, _sx in enumerate(sqixs):
+        _d = evalpos.dist(_sx, _ksx)
+        if _d <= 2:
+            ekDistCols[_k, _d, _i] = 1
+
+def mobilityFeaturesWBatch(arr: np.ndarray,
+                           counts: np.ndarray) -> np.ndarray:
+    """ an (N, 6) array of white's mobility features (BASE, CENTER,
+    OUTER_CENTER, EK, EK1, EK2), given how many moves white has to
+    each square
+    """
+    ek = np.einsum('ni,ndi->nd', counts, ekDistCols[bkIndexes(arr)])
+    return np.column_stack([counts.sum(axis=1), counts @ CENTER_COLS,
+                            counts @ OUTER_CENTER_COLS, ek])
+
+def featuresArr(arr: np.ndarray) -> np.ndarray:
+    """ the (N, len(FEATURE_NAMES)) features of encoded positions """
+    a = arr.astype(np.int64)
+    mat = np.stack([(a == code).sum(axis=1) - (a == -code).sum(axis=1)
+                    for code in range(P_CODE, K_CODE+1)], axis=1)
+    mir = mirrorArr(arr)
+    pawns = pawnFeaturesWBatch(arr) - pawnFeaturesWBatch(mir)
+    wCounts, bCounts = destCounts(arr)
+    mob = (mobilityFeaturesWBatch(arr, wCounts)
+           - mobilityFeaturesWBatch(mir, bCounts[:, mirrorIdx]))
+    return np.concatenate([mat, pawns, mob], axis=1)
+
+def featuresBatch(boards: Sequence[Board]) -> np.ndarray:
+    """ the features of (boards) """
+    return featuresArr(encodeBoards(boards))
+
+def weightVector(params: Optional[evalpos.EvalParams] = None
+                 ) -> np.ndarray:
+    """ the weights of (params), by default evalpos's, in the order
+    of FEATURE_NAMES
+    """
+    w = (params or evalpos.defaultParams).toDict()
+    fm = evalpos.FINAL_MULTIPLIER
+    return np.array([w[name] for name in FEATURE_NAMES[:6]]
+                    + pawnWeightVector(params).tolist()
+                    + [w[name]*fm for name in FEATURE_NAMES[-6:]],
+                    dtype=np.int64)
+
+#---------------------------------------------------------------------
+
+def staticEvalBatch(boards: Sequence[Board],
+                    params: Optional[evalpos.EvalParams] = None
+                    ) -> np.ndarray:
+    """ evalpos.staticEval() for each of (boards), as an array """
+    return staticEvalArr(encodeBoards(boards), params, boards)
+
+def staticEvalArr(arr: np.ndarray,
+                  params: Optional[evalpos.EvalParams] = None,
+                  boards: Optional[Sequence[Board]] = None
+                  ) -> np.ndarray:
+    """ evalpos.staticEval() for each encoded position. Positions in
+    the endgames that endgame.py knows about are evaluated by it, one
+    at a time, using (boards) if given, or else the position decoded
+    with white to move.
+    """
+    wCounts, bCounts = destCounts(arr)
+    r = (materialBatch(arr, params) + pawnStructureBatch(arr, params)
+         + mobilityBatch(arr, wCounts, bCounts, params))
+    keys = materialKeysArr(arr)
+    egRows = np.nonzero(np.isin(keys, list(endgame.ENDGAMES)))[0]
+    for i in egRows.tolist():
+        b = boards[i] if boards is not None else decodeBoard(arr[i])
+        r[i] = evalpos.endgameEval(b, endgame.ENDGAMES[int(keys[i])],
+                                   params)
+    #//for
+    return r
+
+#end
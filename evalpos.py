@@ -12,19 +12,160 @@ Evaluates boards in accordance with:
 
 """
 
-from typing import Optional, Dict, List
+import json
+import os
+from typing import Optional, Dict, List, Tuple, Any
 
 import board
 from board import *
+import endgame
 
 #---------------------------------------------------------------------
 
-def staticEval(b: Board) -> int:
-    """ statically evlauate a position """
-    v = material(b) + pawnStructure(b) + mobility(b)
-    #v += swapOff(b)
-    
-    return v
+def staticEval(b: Board, alpha: Optional[int] = None,
+               beta: Optional[int] = None,
+               params: Optional['EvalParams'] = None) -> int:
+    """ statically evlauate a position.
+
+    If a window (alpha, beta) is given (from white's point of view),
+    the result only has to be right when it's inside the window: if
+    it's outside, any value on the same side of the window will do.
+    This lets lazyEval() skip the expensive mobility term.
+
+    The weights come from (params), by default defaultParams. (This
+    goes for all the evaluation functions.)
+
+    Endgames that endgame.py knows about are evaluated by it.
+    """
+    eg = endgame.ENDGAMES.get(b.getMaterialKey())
+    if eg is not None:
+        return endgameEval(b, eg, params)
+    if alpha is None:
+        v = material(b, params) + pawnStructure(b, params) \
+            + mobility(b, params)
+        #v += swapOff(b)
+        return v
+    return lazyEval(b, alpha, beta, params)[0]
+
+def endgameEval(b: Board, eg: 'endgame.Endgame',
+                params: Optional['EvalParams'] = None) -> int:
+    """ evaluate (b) as endgame (eg) """
+    ep = params or defaultParams
+    if eg.evaluate is not None:
+        return eg.evaluate(b, ep, eg.strong)
+    v = material(b, ep) + pawnStructure(b, ep) + mobility(b, ep)
+    return int(v * eg.scale(b, eg.strong) / endgame.SCALE_NORMAL)
+
+#---------------------------------------------------------------------
+# lazy evaluation
+
+""" 
+Material and pawn structure are cheap (material comes from the
+board's piece counts, and pawn structure from the pawn cache), but
+mobility means generating every move for both sides. If the cheap
+terms are more than LAZY_MARGIN outside the window, mobility can't
+bring the score back inside it, so it isn't calculated.
+
+LAZY_MARGIN should be more than mobility ever is; on random
+positions it's rarely above 90.
+"""
+LAZY_MARGIN = 200
+
+# counts of lazy evaluations, and of those that skipped mobility:
+lazyStats: Dict[str,int] = {'lazyEvals': 0, 'lazySkips': 0}
+
+def resetLazyStats():
+    for name in lazyStats:
+        lazyStats[name] = 0
+
+def lazyEval(b: Board, alpha: int, beta: int,
+             params: Optional['EvalParams'] = None) -> Tuple[int,bool]:
+    """ evaluate (b) within the window (alpha, beta), from white's
+    point of view. Return (score, exact) where (exact) is False if
+    mobility was skipped, in which case (score) is only known to be
+    outside the window.
+    """
+    eg = endgame.ENDGAMES.get(b.getMaterialKey())
+    if eg is not None:
+        return endgameEval(b, eg, params), True
+    lazyStats['lazyEvals'] += 1
+    v = material(b, params) + pawnStructure(b, params)
+    if v + LAZY_MARGIN <= alpha or v - LAZY_MARGIN >= beta:
+        lazyStats['lazySkips'] += 1
+        return v, False
+    return v + mobility(b, params), True
+
+#---------------------------------------------------------------------
+# evaluation cache
+
+EVAL_CACHE_ENTRIES = 1<<16 # default size of an EvalCache
+
+class EvalCache:
+    """ a cache of staticEval() results, keyed by the position's
+    Zobrist key. It has a fixed number of entries; each key maps to
+    one entry (the low bits of the key), and new results replace old.
+
+    Positions are evaluated with the cache's (params).
+    """
+
+    numEntries: int = 0 # always a power of 2
+    mask: int = 0 # numEntries-1, to get an index from a key
+    keys: List[int] = []
+    values: List[int] = []
+    hits: int = 0
+    misses: int = 0
+    params: Optional['EvalParams'] = None # None means defaultParams
+
+    def __init__(self, numEntries: int = EVAL_CACHE_ENTRIES,
+                 params: Optional['EvalParams'] = None):
+        if numEntries < 1 or numEntries & (numEntries-1):
+            raise ValueError(form("numEntries={} not a power of 2",
+                                  numEntries))
+        self.params = params
+        self.numEntries = numEntries
+        self.mask = numEntries - 1
+        self.keys = [-1]*numEntries # no Zobrist key is -1
+        self.values = [0]*numEntries
+
+    def staticEval(self, b: Board) -> int:
+        """ staticEval(b), from the cache if possible """
+        key = b.getKey()
+        i = key & self.mask
+        if self.keys[i] == key:
+            self.hits += 1
+            return self.values[i]
+        self.misses += 1
+        v = staticEval(b, params=self.params)
+        self.keys[i] = key
+        self.values[i] = v
+        return v
+
+    def lazyEval(self, b: Board, alpha: int, beta: int) -> Tuple[int,bool]:
+        """ lazyEval(b, alpha, beta), from the cache if possible. Only
+        exact scores are cached.
+        """
+        key = b.getKey()
+        i = key & self.mask
+        if self.keys[i] == key:
+            self.hits += 1
+            return self.values[i], True
+        self.misses += 1
+        v, exact = lazyEval(b, alpha, beta, self.params)
+        if exact:
+            self.keys[i] = key
+            self.values[i] = v
+        return v, exact
+
+    def prepare(self, b: Board):
+        """ called with the root position before a search. (Other
+        evaluators, e.g. nnue.NnueEval, use this.)
+        """
+        pass
+
+    def hitRate(self) -> float:
+        """ proportion of lookups found in the cache """
+        lookups = self.hits + self.misses
+        return self.hits/lookups if lookups else 0.0
 
 #---------------------------------------------------------------------
 # material
@@ -36,26 +177,25 @@ R_VALUE =  490
 Q_VALUE =  900
 K_VALUE = 9000
 
-pieceValues = {
-    WP: P_VALUE,
-    WN: N_VALUE,
-    WB: B_VALUE,
-    WR: R_VALUE,
-    WQ: Q_VALUE,
-    WK: K_VALUE,
-    BP: -P_VALUE,
-    BN: -N_VALUE,
-    BB: -B_VALUE,
-    BR: -R_VALUE,
-    BQ: -Q_VALUE,
-    BK: -K_VALUE,
-}    
-
-def material(b: Board) -> int:
+def material(b: Board, params: Optional['EvalParams'] = None) -> int:
     """ material evaluation of a position """
+    pieceValues = (params or defaultParams).pieceValues
+    v = 0
+    for pv, n in b.getPieceCounts().items():
+        v += pieceValues[pv]*n
+    return v
+
+def nonPawnMaterial(b: Board, p: Player,
+                    params: Optional['EvalParams'] = None) -> int:
+    """ the value of player (p)'s pieces, not counting pawns or
+    the king. Used by the search to guess when a position might be
+    zugzwang.
+    """
+    pieceValues = (params or defaultParams).pieceValues
     v = 0
-    for sqix in sqixs:
-        v += pieceValues.get(b.sq[sqix], 0)
+    for sv, n in b.getPieceCounts().items():
+        if isPlayer(sv, p) and sv not in pawnSet and sv not in kingSet:
+            v += abs(pieceValues[sv])*n
     return v
 
 #---------------------------------------------------------------------
@@ -73,86 +213,158 @@ PROTECTED_PASSED = 30 # if PP has P on neighbouring ranks
 # bonus for advanced PP, 0th to 8th ranks:
 PASSED_ADVANCE = [None, None, 0, 5, 10, 40, 80, 200, None]
 
-def pawnStructure(b: Board) -> int:
+""" pawn structure only depends on where the pawns are, and changes
+much less often than the rest of the position, so it's cached by the
+pawn key (see Board.getPawnKey()). Each EvalParams has its own cache,
+with a fixed number of entries; each pawn key maps to one of them.
+"""
+PAWN_CACHE_ENTRIES = 1<<14 # must be a power of 2
+
+def pawnStructure(b: Board, params: Optional['EvalParams'] = None) -> int:
     """ pawn structure evaluation of a position """
-    v = pawnStructureW(b) - pawnStructureW(b.getMirror())
+    ep = params or defaultParams
+    key = b.getPawnKey()
+    i = key & (PAWN_CACHE_ENTRIES-1)
+    if ep.pawnCacheKeys[i] == key:
+        return ep.pawnCacheValues[i]
+    v = calcPawnStructure(b, ep)
+    ep.pawnCacheKeys[i] = key
+    ep.pawnCacheValues[i] = v
     return v
 
-def pawnStructureW(b: Board) -> int:
+def calcPawnStructure(b: Board,
+                      params: Optional['EvalParams'] = None) -> int:
+    """ pawn structure evaluation of a position, without the cache """
+    wp, bp = pawnMasks(b)
+    v = (sum(pawnTermsMasks(wp, bp, params))
+         - sum(pawnTermsMasks(mirrorMask(bp), mirrorMask(wp), params)))
+    return v
+
+""" Pawn structure is worked out on bitmasks of where each side's
+pawns are. Square (f,rk) is bit (f-1)*8 + (rk-1), so each file is one
+byte, with rank 1 in the low bit. Counting pawns is then a popcount,
+and whether there are pawns in some set of squares is an AND with a
+precomputed mask.
+"""
+
+def sqBit(f: File, rk: Rank) -> int:
+    """ the bitmask for square (f,rk) """
+    return 1 << ((f-1)*8 + rk-1)
+
+# sqixBit[sqix] = the bit for that square (0 if off the board)
+sqixBit = [0]*121
+for _f in files:
+    for _rk in ranks:
+        sqixBit[frix(_f, _rk)] = sqBit(_f, _rk)
+
+# fileMask[f] = all of file (f), adjacentFilesMask[f] = the files
+# next to it. (Index 0 is unused.)
+fileMask = [0] + [0xFF << (f-1)*8 for f in files]
+adjacentFilesMask = [0] + [(fileMask[f-1] if f>1 else 0)
+                           | (fileMask[f+1] if f<8 else 0)
+                           for f in files]
+
+# ranks 2..7 of every file; pawns on ranks 1 and 8 aren't counted
+RANKS_2_TO_7 = int.from_bytes(bytes([0x7E]*8), "little")
+
+def calcForwardSpan(f: File, rk: Rank) -> int:
+    """ the squares in front of (f,rk), up to the 7th rank, on its
+    file and the files next to it. A white pawn on (f,rk) is passed
+    if there are no black pawns there.
+    """
+    m = 0
+    for cf in [f-1, f, f+1]:
+        if 1 <= cf <= 8:
+            for crk in range(rk+1, 7+1):
+                m |= sqBit(cf, crk)
+    return m
+
+# forwardSpan[f][rk] = calcForwardSpan(f, rk)
+forwardSpan = [[0]*9] + [[0] + [calcForwardSpan(f, rk) for rk in ranks]
+                         for f in files]
+
+# reverseBits[n] = the 8 bits of (n) in reverse order
+reverseBits = bytes(int(format(n, "08b")[::-1], 2) for n in range(256))
+
+def mirrorMask(m: int) -> int:
+    """ the mirror of a bitmask, i.e. with the ranks reversed (see
+    Board.getMirror())
+    """
+    return int.from_bytes(m.to_bytes(8, "little").translate(reverseBits),
+                          "little")
+
+def popcount(m: int) -> int:
+    return m.bit_count()
+
+def pawnMasks(b: Board) -> Tuple[int,int]:
+    """ bitmasks of where the white pawns and black pawns are """
+    wp = 0
+    bp = 0
+    for sx in sqixs:
+        sv = b.sq[sx]
+        if sv == WP:
+            wp |= sqixBit[sx]
+        elif sv == BP:
+            bp |= sqixBit[sx]
+    return wp, bp
+
+def pawnStructureW(b: Board, params: Optional['EvalParams'] = None) -> int:
     """ Evaluation of a position wrt doubled, isolated and passed 
     pawns, for white. (Mirroring is used to evaluate for black.)
-    
-    wpFile[f] = the number of white pawns on file (f)
-    wpNeigh[f] = the number of white pawns on neighbouring files 
-        to (f)
-    mostAdvanced[f] = the rank (2..7) of the most advanced WP
-        on file (f), or 0 if none
     """
-    v = 0
-    
-    # white pawns on each file:
-    wpFile = [0]*9 
-    mostAdvanced = [0]*9
-    for f in files:
-        for rk in [7,6,5,4,3,2]:
-            sv: Sqv = b.getSq((f,rk))
-            if sv==WP:
-                wpFile[f] += 1
-                if mostAdvanced[f]==0:
-                    mostAdvanced[f] = rk
-        #//for
-    #//for   
+    return sum(pawnTermsW(b, params))
+
+def pawnTermsW(b: Board, params: Optional['EvalParams'] = None
+               ) -> Tuple[int,int,int]:
+    """ the terms of pawnStructureW(), as (doubled, isolated, passed) """
+    wp, bp = pawnMasks(b)
+    return pawnTermsMasks(wp, bp, params)
+
+def pawnTermsMasks(wp: int, bp: int, params: Optional['EvalParams'] = None
+                   ) -> Tuple[int,int,int]:
+    """ (doubled, isolated, passed) for white, given bitmasks of the
+    white pawns (wp) and black pawns (bp)
     
-    # W/B pawns on neighbouring files:
-    wpNeigh = [0]*9
+    wpFile = the number of white pawns on a file
+    wpNeigh = the number of white pawns on neighbouring files 
+    mostAdvanced = the rank (2..7) of the most advanced WP on the
+        file, or 0 if none
+    """
+    ep = params or defaultParams
+    doubledV = 0
+    isolatedV = 0
+    passedV = 0
+    wp &= RANKS_2_TO_7
     for f in files:
-        if f==1:
-            wpNeigh[1] = wpFile[2]
-        elif f==8: 
-            wpNeigh[8] = wpFile[7]
-        else:
-            wpNeigh[f] = wpFile[f-1] + wpFile[f+1]
-            
+        onFile = (wp >> (f-1)*8) & 0xFF
+        if not onFile: continue
+        wpFile = popcount(onFile)
+        wpNeigh = wp & adjacentFilesMask[f]
+
         #>>> doubled pawns:
-        if wpFile[f]>=1:
-            v += DOUBLED*(wpFile[f]-1)
-            
+        doubledV += ep.DOUBLED*(wpFile-1)
+
         #>>> isolated pawns:
-        if wpFile[f]>=1 and wpNeigh[f]==0:
-            v += ISOLATED*wpFile[f]
-    #//for
-    
-    passedV = 0
-    #>>>>> claculate passed pawns
-    for f in files:
-        if mostAdvanced[f]>0:
-            if not blackBlocking(b, f, mostAdvanced[f]):
-                # it's a passed pawn
-                passedV += PASSED
-                if wpNeigh[f]:
-                    passedV += PROTECTED_PASSED
-                passedV += PASSED_ADVANCE[mostAdvanced[f]]    
+        if not wpNeigh:
+            isolatedV += ep.ISOLATED*wpFile
+
+        #>>> passed pawns:
+        mostAdvanced = onFile.bit_length()
+        if not bp & forwardSpan[f][mostAdvanced]:
+            passedV += ep.PASSED
+            if wpNeigh:
+                passedV += ep.PROTECTED_PASSED
+            passedV += ep.PASSED_ADVANCE[mostAdvanced]
     #//for f
-    dpr("passedV=%r", passedV)
-    v += passedV
-    return v
+    return doubledV, isolatedV, passedV
 
 def blackBlocking(b: Board, f: File, rk: Rank):
     """ W has a pawn at (f,rk). Is black bloacking it, by
     having a pawn ahead of it on that file or the fiels next 
     to it?
     """
-    uf = [f]
-    if f>1: uf += [f-1]
-    if f<8: uf += [f+1]
-    for cf in uf:
-        for crk in range(rk+1,7+1):
-            if b.getSq((cf,crk)) == BP:
-                return True # blocking, not passed
-        #//for crk    
-    #//for cf
-    return False # not blocking
-    
+    _, bp = pawnMasks(b)
+    return bool(bp & forwardSpan[f][rk])
 
 #---------------------------------------------------------------------
 # mobility and attack
@@ -178,19 +390,27 @@ EK1 = 2
 EK2 = 1
 FINAL_MULTIPLIER = 1
 
+CENTER_SQS = [54,55,
+              64,65]
+OUTER_CENTER_SQS = [43,44,45,46, 
+                    53,      56, 
+                    63,      66, 
+                    73,74,75,76]
+
 
-def mobility(b: Board) -> int:
+def mobility(b: Board, params: Optional['EvalParams'] = None) -> int:
     b.createMoves()
-    wMob = mobilityW(b, b.wMovs)
-    dpr("wMob={}", wMob)
-    bMob = mobilityW(b.getMirror(), mirrorMoves(b.bMovs))
-    dpr("bMob={}", bMob)
+    wMob = mobilityW(b, b.wMovs, params)
+    #dpr("wMob={}", wMob)
+    bMob = mobilityW(b.getMirror(), mirrorMoves(b.bMovs), params)
+    #dpr("bMob={}", bMob)
     v = wMob - bMob
     return v
 
-def mobilityW(b: Board, movs: List[Move]) -> int:
+def mobilityW(b: Board, movs: List[Move],
+              params: Optional['EvalParams'] = None) -> int:
     #attacks = b.getWAttacks()
-    sqWeights = calcSqImportance(b)
+    sqWeights = calcSqImportance(b, params)
     v = 0
     for sourceSq, destSq in movs:
         v += sqWeights[destSq]
@@ -198,31 +418,13 @@ def mobilityW(b: Board, movs: List[Move]) -> int:
     v = int(v * FINAL_MULTIPLIER)
     return v
     
-def calcSqImportance(b: Board) -> List[int]:
-    """ return how important each square is """
-    si: List[int] = [0]*len(b.sq)
-    
+def calcSqImportance(b: Board,
+                     params: Optional['EvalParams'] = None) -> List[int]:
+    """ return how important each square is. (The list comes from
+    the EvalParams' tables, so don't alter it.)
+    """
     bkLocation = getBkSq(b)
-    for sx in sqixs:
-        si[sx] = BASE
-        if sx in [54,55,
-                  64,65]: 
-            si[sx] += CENTER
-        elif sx in [43,44,45,46, 
-                    53,      56, 
-                    63,      66, 
-                    73,74,75,76]: 
-            si[sx] += OUTER_CENTER
-            
-        distBK = dist(sx, bkLocation)    
-        if distBK == 0: 
-            si[sx] += EK
-        elif distBK == 1:
-            si[sx] += EK1 
-        elif distBK == 2:
-            si[sx] += EK2  
-    #//for sx
-    return si
+    return (params or defaultParams).sqImportance[bkLocation or 0]
     
 def getBkSq(b: Board) -> Optional[Sqix]:
     """ return the square with the black king on it, or None """
@@ -287,6 +489,163 @@ def swapOffSq(b: Board,
             
 
 
+#---------------------------------------------------------------------
+# parameter sets
+
+""" 
+The weights above are the defaults. An EvalParams is a set of
+weights, with the tables derived from them (signed piece values, the
+importance of each square for each place the enemy K can be, and a
+pawn structure cache). Evaluation functions, EvalCaches and Searches
+can each be given their own, so engines of different strengths, or
+A/B variants, can play in the same process.
+
+Weights can be loaded from a JSON file (such as the tuning tool,
+tune.py, writes) which maps weight names (WEIGHT_NAMES) to values;
+weights not in it have their default values. PASSED_ADVANCE is a
+list.
+
+defaultParams is used when no EvalParams is given. If the environment
+variable CALICHESS_WEIGHTS names a weights file, defaultParams is
+loaded from it when this module is imported.
+"""
+WEIGHT_NAMES = [
+    'P_VALUE', 'N_VALUE', 'B_VALUE', 'R_VALUE', 'Q_VALUE', 'K_VALUE',
+    'DOUBLED', 'ISOLATED', 'PASSED', 'PROTECTED_PASSED', 'PASSED_ADVANCE',
+    'BASE', 'CENTER', 'OUTER_CENTER', 'EK', 'EK1', 'EK2',
+]
+WEIGHTS_ENV = "CALICHESS_WEIGHTS"
+
+_onBoard = frozenset(sqixs)
+
+class EvalParams:
+    """ a set of evaluation weights, and tables derived from them.
+    The weights are attributes with the same names as the module's
+    defaults (e.g. params.P_VALUE). Don't alter them: the tables
+    wouldn't match. Make a new EvalParams instead.
+    """
+    __slots__ = WEIGHT_NAMES + [
+        'name', # for printing
+        'pieceValues', # pieceValues[sv] = value of piece (sv), -ve for B
+        'sqImportance', # sqImportance[bkSqix] = importance of each
+                        # square, with the enemy K on (bkSqix), or 0
+                        # if there isn't one
+        'pawnCacheKeys', # the pawn structure cache
+        'pawnCacheValues',
+    ]
+
+    def __init__(self, weights: Optional[Dict[str,Any]] = None,
+                 name: str = "default"):
+        """ (weights) are the weights that differ from the module's
+        defaults
+        """
+        w = {name: globals()[name] for name in WEIGHT_NAMES}
+        if weights:
+            for wname in weights:
+                if wname not in WEIGHT_NAMES:
+                    raise ValueError(form("unknown weight {!r}", wname))
+            w.update(weights)
+        if len(w['PASSED_ADVANCE']) != len(PASSED_ADVANCE):
+            raise ValueError(form("PASSED_ADVANCE should have {} values",
+                                  len(PASSED_ADVANCE)))
+        for wname in WEIGHT_NAMES:
+            setattr(self, wname, w[wname])
+        self.PASSED_ADVANCE = list(self.PASSED_ADVANCE)
+        self.name = name
+        self.pieceValues = self.calcPieceValues()
+        self.sqImportance = [self.calcSqImportance(bkSq)
+                             if bkSq == 0 or bkSq in _onBoard else None
+                             for bkSq in range(121)]
+        self.pawnCacheKeys = [-1]*PAWN_CACHE_ENTRIES
+        self.pawnCacheValues = [0]*PAWN_CACHE_ENTRIES
+
+    def __repr__(self) -> str:
+        return form("<EvalParams {}>", self.name)
+
+    def calcPieceValues(self) -> Dict[Sqv,int]:
+        """ the value of each piece; black's are -ve """
+        pv = {
+            WP: self.P_VALUE,
+            WN: self.N_VALUE,
+            WB: self.B_VALUE,
+            WR: self.R_VALUE,
+            WQ: self.Q_VALUE,
+            WK: self.K_VALUE,
+        }
+        for wpv, v in list(pv.items()):
+            pv[opponentPiece(wpv)] = -v
+        return pv
+
+    def calcSqImportance(self, bkLocation: Sqix) -> List[int]:
+        """ how important each square is, with the enemy K on square
+        (bkLocation), or 0 if there isn't one
+        """
+        si: List[int] = [0]*121
+        for sx in sqixs:
+            si[sx] = self.BASE
+            if sx in CENTER_SQS: 
+                si[sx] += self.CENTER
+            elif sx in OUTER_CENTER_SQS: 
+                si[sx] += self.OUTER_CENTER
+                
+            if not bkLocation: continue
+            distBK = dist(sx, bkLocation)    
+            if distBK == 0: 
+                si[sx] += self.EK
+            elif distBK == 1:
+                si[sx] += self.EK1 
+            elif distBK == 2:
+                si[sx] += self.EK2  
+        #//for sx
+        return si
+
+    def toDict(self) -> Dict[str,Any]:
+        """ the weights, by name """
+        return {name: (getattr(self, name)[:] if name == 'PASSED_ADVANCE'
+                       else getattr(self, name))
+                for name in WEIGHT_NAMES}
+
+    @staticmethod
+    def load(filename: str, name: Optional[str] = None) -> 'EvalParams':
+        """ load weights from a JSON file """
+        with open(filename) as f:
+            return EvalParams(json.load(f), name or filename)
+
+    def save(self, filename: str):
+        """ save the weights to a JSON file """
+        with open(filename, "w") as f:
+            json.dump(self.toDict(), f, indent=2)
+            f.write("\n")
+
+#---------------------------------------------------------------------
+# the default parameters
+
+defaultParams = EvalParams()
+if os.environ.get(WEIGHTS_ENV):
+    defaultParams = EvalParams.load(os.environ[WEIGHTS_ENV])
+
+# the default piece values
+pieceValues = defaultParams.pieceValues
+
+def getWeights() -> Dict[str,Any]:
+    """ the default weights, by name """
+    return defaultParams.toDict()
+
+def setWeights(weights: Dict[str,Any]):
+    """ replace some or all of the default weights """
+    global defaultParams, pieceValues
+    defaultParams = EvalParams(dict(getWeights(), **weights))
+    pieceValues = defaultParams.pieceValues
+
+def loadWeights(filename: str):
+    """ load the default weights from a JSON file """
+    with open(filename) as f:
+        setWeights(json.load(f))
+
+def saveWeights(filename: str):
+    """ save the default weights to a JSON file """
+    defaultParams.save(filename)
+
 #---------------------------------------------------------------------
 
 #end
@@ -0,0 +1,226 @@
+# evalprofile.py = instrumented static evaluation
+
+"""
+Break a static evaluation down into its terms, and measure how long
+each term takes.
+
+evalpos.staticEval() just returns a number, and has no instrumentation
+in it, so it costs nothing to have this module available. To profile,
+evaluate through an EvalProfiler instead:
+
+    prof = EvalProfiler()
+    terms = prof.breakdown(b)   # per-term contributions
+    prof.dump("evalprofile.json")
+
+An EvalProfiler can also be given to a Search as its (evalCache), to
+profile every evaluation made during a search. (It doesn't cache.)
+
+Term names are:
+    material
+    pawnStructure
+        pawn.doubledW, pawn.isolatedW, pawn.passedW
+        pawn.doubledB, pawn.isolatedB, pawn.passedB
+    mobility
+        mobilityW, mobilityB
+    endgame
+Black's terms are as they contribute to the score, i.e. -ve is good
+for black.
+
+endgame is how much endgame.py's evaluation changes the sum of the
+other terms by, in the endgames it knows about (0 otherwise).
+
+Times are kept for material, pawnStructure, mobilityW, mobilityB and
+endgame, and for mobility.moves (generating the moves that mobility
+uses).
+"""
+
+import json
+import time
+from typing import Dict, List, Tuple, Optional
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import pmovs
+import evalpos
+import endgame
+from endgame import SCALE_NORMAL
+
+#---------------------------------------------------------------------
+
+TERM_NAMES = [
+    'material',
+    'pawnStructure',
+    'pawn.doubledW', 'pawn.isolatedW', 'pawn.passedW',
+    'pawn.doubledB', 'pawn.isolatedB', 'pawn.passedB',
+    'mobility', 'mobilityW', 'mobilityB',
+    'endgame',
+]
+
+# what is timed
+TIMED_TERMS = ['material', 'pawnStructure', 'mobility.moves',
+               'mobilityW', 'mobilityB', 'endgame']
+
+class EvalProfiler:
+    """ evaluates positions term by term, keeping the cumulative time
+    and number of calls for each timed term
+    """
+
+    calls: Dict[str,int] = {}
+    seconds: Dict[str,float] = {}
+    evals: int = 0 # number of positions evaluated
+    lazySkips: int = 0 # lazy evaluations that skipped mobility
+    params: Optional[evalpos.EvalParams] = None # None means the defaults
+
+    def __init__(self, params: Optional[evalpos.EvalParams] = None):
+        self.params = params
+        self.reset()
+
+    def reset(self):
+        self.calls = {name: 0 for name in TIMED_TERMS}
+        self.seconds = {name: 0.0 for name in TIMED_TERMS}
+        self.evals = 0
+        self.lazySkips = 0
+
+    def _timed(self, name: str, fn, *args):
+        """ call fn(*args), recording the time against term (name) """
+        t = time.perf_counter()
+        r = fn(*args)
+        self.seconds[name] += time.perf_counter() - t
+        self.calls[name] += 1
+        return r
+
+    def _material(self, b: Board) -> int:
+        return self._timed('material', evalpos.material, b, self.params)
+
+    def _pawnTerms(self, b: Board) -> Tuple[Tuple[int,int,int],
+                                           Tuple[int,int,int]]:
+        """ pawn terms for white and for black. These aren't cached
+        (so the time is what evalpos.pawnStructure() takes on a cache
+        miss).
+        """
+        def both():
+            return (evalpos.pawnTermsW(b, self.params),
+                    evalpos.pawnTermsW(b.getMirror(), self.params))
+        return self._timed('pawnStructure', both)
+
+    def breakdown(self, b: Board) -> Dict[str,int]:
+        """ evaluate position (b), returning the contribution of each
+        term (see TERM_NAMES) and the 'total', which is the same as
+        evalpos.staticEval(b).
+        """
+        self.evals += 1
+        r: Dict[str,int] = {}
+        r['material'] = self._material(b)
+
+        pw, pb = self._pawnTerms(b)
+        for i, term in enumerate(['doubled', 'isolated', 'passed']):
+            r['pawn.' + term + 'W'] = pw[i]
+            r['pawn.' + term + 'B'] = -pb[i]
+        r['pawnStructure'] = sum(pw) - sum(pb)
+
+        wMob, bMob = self._mobility(b)
+        r['mobilityW'] = wMob
+        r['mobilityB'] = -bMob
+        r['mobility'] = wMob - bMob
+
+        v = r['material'] + r['pawnStructure'] + r['mobility']
+        eg = endgame.findEndgame(b)
+        if eg is None:
+            total = v
+        elif eg.evaluate is not None:
+            total = self._timed('endgame', eg.evaluate, b,
+                self.params or evalpos.defaultParams, eg.strong)
+        else:
+            scale = self._timed('endgame', eg.scale, b, eg.strong)
+            total = int(v * scale / SCALE_NORMAL)
+        r['endgame'] = total - v
+        r['total'] = total
+        return r
+
+    def _mobility(self, b: Board) -> Tuple[int,int]:
+        """ mobility for white and for black, the same as
+        evalpos.mobility() calculates
+        """
+        wMovs, bMovs = self._timed('mobility.moves',
+            lambda: (pmovs(b, 'W'), pmovs(b, 'B')))
+        wMob = self._timed('mobilityW', evalpos.mobilityW, b, wMovs,
+                           self.params)
+        bMob = self._timed('mobilityB', lambda: evalpos.mobilityW(
+            b.getMirror(), mirrorMoves(bMovs), self.params))
+        return wMob, bMob
+
+    #========== so it can be a Search's evalCache:
+
+    def staticEval(self, b: Board) -> int:
+        """ the same as evalpos.staticEval(b), but profiled """
+        return self.breakdown(b)['total']
+
+    def lazyEval(self, b: Board, alpha: int, beta: int) -> Tuple[int,bool]:
+        """ the same as evalpos.lazyEval(), but profiled """
+        if endgame.findEndgame(b) is not None:
+            return self.staticEval(b), True
+        self.evals += 1
+        v = self._material(b)
+        pw, pb = self._pawnTerms(b)
+        v += sum(pw) - sum(pb)
+        margin = evalpos.LAZY_MARGIN
+        if v + margin <= alpha or v - margin >= beta:
+            self.lazySkips += 1
+            return v, False
+        wMob, bMob = self._mobility(b)
+        return v + wMob - bMob, True
+
+    def prepare(self, b: Board):
+        pass
+
+    def hitRate(self) -> float:
+        return 0.0
+
+    #========== results:
+
+    def report(self) -> Dict:
+        """ the cumulative calls and times, as a dict that can be
+        turned into JSON
+        """
+        totalSeconds = sum(self.seconds.values())
+        terms = {}
+        for name in TIMED_TERMS:
+            n = self.calls[name]
+            terms[name] = {
+                'calls': n,
+                'seconds': self.seconds[name],
+                'usPerCall': self.seconds[name]*1e6/n if n else 0.0,
+                'share': (self.seconds[name]/totalSeconds
+                          if totalSeconds else 0.0),
+            }
+        #//for name
+        return {
+            'evals': self.evals,
+            'lazySkips': self.lazySkips,
+            'seconds': totalSeconds,
+            'terms': terms,
+        }
+
+    def toJson(self) -> str:
+        return json.dumps(self.report(), indent=2)
+
+    def dump(self, filename: str):
+        """ write the report to a JSON file """
+        with open(filename, "w") as f:
+            f.write(self.toJson())
+            f.write("\n")
+
+#---------------------------------------------------------------------
+
+def main():
+    from search import Search, Limits
+    prof = EvalProfiler()
+    s = Search(evalCache=prof)
+    s.think(Board.startPosition(), Limits(depth=3))
+    prn("{}", prof.toJson())
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -1,57 +1,88 @@
 # game.py = play a game of chess
 
+import os
+import re
+
 from ulib.butil import form, pr, prn, dpr, printargs
 
 from board import *
 from movegen import pmovs
 import evalpos
+from search import Search, Limits
+from book import OpeningBook
+from san import MoveIndex, SanError
 
 #---------------------------------------------------------------------
 
-def getBestMove(b: Board) -> Move:
-    """ get the computer's best move in this position """
-    computerIsPlaying = b.mover
-    
-    allMoves = pmovs(b, computerIsPlaying)
-    movesValues:List[Tuple[Move,int]] = []
-    for mv in allMoves:
-        b2 = b.makeMove(mv)
-        value = evalpos.staticEval(b2)
-        movesValues.append((mv,value))
-    ##/for
-    
-    bestMoves = sorted(movesValues, key=lambda mv: mv[1])[::-1]
-    if computerIsPlaying=="B":
-        # we want best for black, so reverse order:
-        bestMoves = bestMoves[::-1]
-        
-    bestMove, bestScore = bestMoves[0]    
+SEARCH_DEPTH = 3 # how many plies the computer looks ahead
+BOOK_FILE = "book.bin" # opening book, used if it exists (see book.py)
+
+def openBook(filename: str = BOOK_FILE) -> Optional[OpeningBook]:
+    """ the opening book in (filename), or None if there isn't one """
+    if not os.path.exists(filename):
+        return None
+    return OpeningBook(filename)
+
+def getBestMove(b: Board, limits: Optional[Limits] = None,
+                searcher: Optional[Search] = None) -> Move:
+    """ get the computer's best move in this position, searching
+    within (limits) (default: to SEARCH_DEPTH plies)
+    """
+    if limits is None:
+        limits = Limits(depth=SEARCH_DEPTH)
+    if searcher is None:
+        searcher = Search()
+    bestMove, bestScore = searcher.think(b, limits)
     prn("Computer's best move is {} scoring {}", 
         toAlmov(bestMove), bestScore)
     return bestMove
     
 
+# an Almov; anything else is read as SAN (which can be 4 characters
+# with a digit second, e.g. "R1a3")
+_almovRe = re.compile(r"^[a-h][1-8][a-h][1-8]$")
+
+def readMove(b: Board, s: str, possibleMoves: List[Move]) -> Optional[Move]:
+    """ the move (s) typed in, in SAN ("Nf3") or Almov ("g1f3")
+    form, if it is one of (possibleMoves), else None
+    """
+    s = s.strip()
+    try:
+        mv = almovMov(s) if _almovRe.match(s) \
+            else MoveIndex(b).toMove(s)[0]
+    except (SanError, KeyError, ValueError):
+        return None
+    return mv if mv in possibleMoves else None
+
 #---------------------------------------------------------------------
 
 def main():
     b = Board.startPosition()
+    searcher = Search(book=openBook())
     while 1:
         prn("Position: {}\n", b.termStr())
         possibleMoves = pmovs(b, "W")
-        possMovesStr = [toAlmov(mv) for mv in possibleMoves]
+        index = MoveIndex(b)
+        possMovesStr = [index.toSan(mv, checks=False) for mv in possibleMoves]
         while 1:
-            yourMove = input("Enter your move: ")
-            if yourMove in possMovesStr:
+            yourMove = readMove(b, input("Enter your move: "), possibleMoves)
+            if yourMove is not None:
                 break
             else:    
                 prn("Error, legal moves are {}", possMovesStr)
         #//while
         b = b.makeMove(yourMove)
+        if b.isDraw():
+            break
         
-        bestMove = getBestMove(b)
-        prn("Computer move is {}", toAlmov(bestMove))
+        bestMove = getBestMove(b, searcher=searcher)
+        prn("Computer move is {}", MoveIndex(b).toSan(bestMove))
         b = b.makeMove(bestMove)
+        if b.isDraw():
+            break
     #//while    
+    prn("Position: {}\n", b.termStr())
+    prn("Draw by {}", b.drawReason())
     
 #---------------------------------------------------------------------
 
@@ -0,0 +1,307 @@
+# mate.py = find forced mates
+
+"""
+A mate finder, separate from the main search (search.py), for solving
+and checking mate-in-N puzzles.
+
+Usage:
+
+    python mate.py "6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1" -m 3
+    python mate.py puzzles.epd -m 5 -n 1000000
+
+For a file of EPD positions, a "dm" operation (direct mate, e.g.
+'dm 3;') is checked against the mate that is found.
+
+Proof-number search
+-------------------
+The search proves or disproves "the attacker (the side to move) can
+mate within N moves". It's a depth-first proof-number search (df-pn):
+each position has a proof number (pn), the least number of positions
+that would have to be proved to prove it, and a disproof number (dn).
+At the attacker's positions (OR nodes) pn is the smallest of the
+children's pns, and dn the sum of their dns; at the defender's (AND
+nodes) it's the other way round. The search always goes down to the
+most-proving position, only coming back up when the numbers go over
+thresholds, and keeps the numbers in a table so nothing is searched
+twice. A proved position has pn 0, a disproved one dn 0.
+
+The attacker's moves are only checks (unless checksOnly is False),
+which keeps the tree small. Mates in 1, 2, ... N are tried in turn, so
+the first one proved is the shortest. Positions are looked up in the
+table by their key and the number of moves left, so there are no
+cycles in the tree.
+
+The moves are the legal moves, as movegen.legalMoves() finds them,
+with castling and promotion to every piece added. En passant isn't,
+as Board doesn't know when it's allowed.
+"""
+
+import argparse
+import os
+import time
+from typing import List, Tuple, Dict, Optional, Iterator
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import pmovs, castlingMoves, playMove, inCheck
+from san import MoveIndex
+from analyse import parsePosition
+
+#---------------------------------------------------------------------
+
+INFINITY = 10**9 # a proof or disproof number for "can't be done"
+
+MAX_MOVES = 5 # default mate length to look for
+MAX_NODES = 2000000 # default node limit
+
+# a move with the piece a pawn promotes to (None for a queen or not
+# a promotion)
+MoveP = Tuple[Move, Optional[Sqv]]
+
+# (move, position after it)
+Child = Tuple[MoveP, Board]
+
+PROMOTIONS: Dict[Player,List[Sqv]] = {'W': [WR, WB, WN],
+                                      'B': [BR, BB, BN]}
+
+class MateAborted(Exception): pass
+
+#---------------------------------------------------------------------
+# moves
+
+def legalChildren(b: Board, checksOnly: bool = False) -> List[Child]:
+    """ the mover's legal moves in (b) with the positions after them,
+    including castling and under-promotions. If (checksOnly), only
+    the moves that give check.
+    """
+    r: List[Child] = []
+    p = b.mover
+    enemy = opponent(p)
+    for mv in pmovs(b, p) + castlingMoves(b):
+        b2 = playMove(b, mv)
+        if inCheck(b2, p): continue
+        promos: List[Optional[Sqv]] = [None]
+        if b.sq[mv[0]] in pawnSet and b2.sq[mv[1]] in queenSet:
+            promos += PROMOTIONS[p]
+        for promo in promos:
+            if promo is not None:
+                b2 = playMove(b, mv, promo)
+            if checksOnly and not inCheck(b2, enemy): continue
+            r.append(((mv, promo), b2))
+        #//for promo
+    #//for mv
+    return r
+
+def moveStr(mp: MoveP) -> str:
+    """ a move as an Almov, with the promotion piece if there is one """
+    mv, promo = mp
+    s = toAlmov(mv)
+    if promo is not None:
+        s += promo.lower()
+    return s
+
+#---------------------------------------------------------------------
+
+class MateSolver:
+    """ finds the shortest forced mate by proof-number search """
+
+    checksOnly: bool = True
+    maxNodes: Optional[int] = None
+    # tt[(key, moves left)] = (pn, dn)
+    tt: Dict[Tuple[int,int],Tuple[int,int]]
+    stats: Dict[str,int]
+    elapsed: float = 0.0 # seconds taken by the last solve()
+
+    def __init__(self, checksOnly: bool = True,
+                       maxNodes: Optional[int] = MAX_NODES):
+        """ if (checksOnly), the attacker only considers checks.
+        solve() gives up after (maxNodes) positions (None for no limit).
+        """
+        self.checksOnly = checksOnly
+        self.maxNodes = maxNodes
+        self.tt = {}
+        self.stats = {'nodes': 0, 'ttHits': 0}
+
+    def solve(self, b: Board, maxMoves: int = MAX_MOVES
+              ) -> Optional[Tuple[int,List[MoveP]]]:
+        """ look for a mate by the mover in (b) in at most (maxMoves)
+        of its moves. Return (n, line): the shortest mate is in (n)
+        moves, and (line) is the moves for both sides, with the
+        defender delaying mate as long as it can. Return None if
+        there isn't a mate (with checks only, if checksOnly), or
+        the node limit was reached.
+        """
+        t0 = time.time()
+        self.tt = {}
+        self.stats = {'nodes': 0, 'ttHits': 0}
+        try:
+            for n in range(1, maxMoves+1):
+                pn, _ = self._mid(b, n, True, INFINITY, INFINITY)
+                if pn == 0:
+                    return n, self.mateLine(b, n)
+            #//for n
+            return None
+        except MateAborted:
+            return None
+        finally:
+            self.elapsed = time.time() - t0
+
+    def _lookup(self, b: Board, movesLeft: int) -> Tuple[int,int]:
+        entry = self.tt.get((b.getKey(), movesLeft))
+        if entry is None: return 1, 1
+        self.stats['ttHits'] += 1
+        return entry
+
+    def _mid(self, b: Board, movesLeft: int, attacker: bool,
+             thPn: int, thDn: int) -> Tuple[int,int]:
+        """ search position (b) until its pn >= (thPn) or its
+        dn >= (thDn), and return (pn, dn). (movesLeft) is how many
+        moves the attacker still has; (attacker) is whether it's the
+        attacker's move.
+        """
+        self.stats['nodes'] += 1
+        if self.maxNodes is not None and self.stats['nodes'] > self.maxNodes:
+            raise MateAborted
+        key = (b.getKey(), movesLeft)
+        children = legalChildren(b, attacker and self.checksOnly)
+
+        #>>>>> positions that are already decided
+        if not children:
+            if attacker or not inCheck(b, b.mover):
+                # no checks, or stalemate
+                result = (INFINITY, 0)
+            else:
+                result = (0, INFINITY) # mate
+            self.tt[key] = result
+            return result
+        if not attacker and movesLeft == 0:
+            self.tt[key] = (INFINITY, 0)
+            return INFINITY, 0
+
+        childMovesLeft = movesLeft - 1 if attacker else movesLeft
+        while True:
+            #>>>>> this position's numbers from its children's
+            nums = [self._lookup(b2, childMovesLeft) for _, b2 in children]
+            if attacker:
+                pn = min(cpn for cpn, _ in nums)
+                dn = min(INFINITY, sum(cdn for _, cdn in nums))
+            else:
+                pn = min(INFINITY, sum(cpn for cpn, _ in nums))
+                dn = min(cdn for _, cdn in nums)
+            if pn >= thPn or dn >= thDn:
+                self.tt[key] = (pn, dn)
+                return pn, dn
+
+            #>>>>> go down to the most-proving child
+            if attacker:
+                # the child with the smallest pn, and the next smallest
+                order = sorted(range(len(nums)), key=lambda i: nums[i][0])
+                best = order[0]
+                second = nums[order[1]][0] if len(order) > 1 else INFINITY
+                cpn, cdn = nums[best]
+                self._mid(children[best][1], childMovesLeft, False,
+                          min(thPn, second + 1),
+                          min(INFINITY, thDn - dn + cdn))
+            else:
+                order = sorted(range(len(nums)), key=lambda i: nums[i][1])
+                best = order[0]
+                second = nums[order[1]][1] if len(order) > 1 else INFINITY
+                cpn, cdn = nums[best]
+                self._mid(children[best][1], childMovesLeft, True,
+                          min(INFINITY, thPn - pn + cpn),
+                          min(thDn, second + 1))
+        #//while
+
+    def _provedIn(self, b: Board, movesLeft: int) -> Optional[int]:
+        """ the fewest moves (up to movesLeft) that the table says
+        (b) is proved in, or None
+        """
+        for m in range(movesLeft+1):
+            entry = self.tt.get((b.getKey(), m))
+            if entry is not None and entry[0] == 0:
+                return m
+        return None
+
+    def mateLine(self, b: Board, n: int) -> List[MoveP]:
+        """ the moves of a proved mate in (n) from (b): the attacker's
+        proved moves, and the defender's longest resistance
+        """
+        line: List[MoveP] = []
+        movesLeft = n
+        attacker = True
+        while True:
+            children = legalChildren(b, attacker and self.checksOnly)
+            if attacker:
+                proved = [(mp, b2) for mp, b2 in children
+                          if self._provedIn(b2, movesLeft-1) is not None]
+                if not proved: break
+                mp, b = proved[0]
+                movesLeft -= 1
+            else:
+                if not children: break # mate
+                mp, b = max(children, key=lambda c:
+                            self._provedIn(c[1], movesLeft) or 0)
+            line.append(mp)
+            attacker = not attacker
+        #//while
+        return line
+
+#---------------------------------------------------------------------
+
+def lineSan(b: Board, line: List[MoveP]) -> List[str]:
+    """ the moves of (line), in SAN """
+    r = []
+    for mv, promo in line:
+        r.append(MoveIndex(b).toSan(mv, promo))
+        b = playMove(b, mv, promo)
+    #//for
+    return r
+
+def readPositions(filename: str) -> Iterator[Tuple[str,Dict[str,str]]]:
+    """ the (FEN, EPD operations) of each position in (filename) """
+    with open(filename) as f:
+        for line in f:
+            p = parsePosition(line)
+            if p is not None:
+                yield p
+        #//for
+
+def main():
+    ap = argparse.ArgumentParser(description="find forced mates")
+    ap.add_argument("position", help="a FEN, or a FEN or EPD file")
+    ap.add_argument("-m", "--moves", type=int, default=MAX_MOVES,
+                    help="longest mate to look for")
+    ap.add_argument("-n", "--nodes", type=int, default=MAX_NODES,
+                    help="node limit per position")
+    ap.add_argument("-a", "--all-moves", action="store_true",
+                    help="try all the attacker's moves, not just checks")
+    args = ap.parse_args()
+    if os.path.isfile(args.position):
+        positions = list(readPositions(args.position))
+    else:
+        positions = [parsePosition(args.position)]
+    solver = MateSolver(checksOnly=not args.all_moves, maxNodes=args.nodes)
+    wrong = 0
+    for fen, ops in positions:
+        b = Board.fromFEN(fen)
+        r = solver.solve(b, args.moves)
+        if r is None:
+            s = "no mate found"
+        else:
+            s = form("mate in {}: {}", r[0], " ".join(lineSan(b, r[1])))
+        if 'dm' in ops:
+            expected = int(ops['dm'])
+            ok = r is not None and r[0] == expected
+            wrong += not ok
+            s += form(" (dm {}: {})", expected, "ok" if ok else "WRONG")
+        prn("{}  {}  [{} nodes, {:.2f}s]", fen, s, solver.stats['nodes'],
+            solver.elapsed)
+    #//for
+    if wrong:
+        prn("{} of {} wrong", wrong, len(positions))
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -1,6 +1,7 @@
 # movegen.py = move generation
 
-from typing import List, Literal, Tuple, Union, cast
+import random
+from typing import List, Literal, Tuple, Union, Optional, Dict, cast
 
 from board import *
 
@@ -130,7 +131,164 @@ def kingMovs(b: Board, p: Player, sqix: Sqix) -> List[Move]:
             r += [(sqix, destSqix)]
     #//for d
     return r
-    
+
+#---------------------------------------------------------------------
+# check
+
+def kingSquare(b: Board, p: Player) -> Optional[Sqix]:
+    """ where (p)'s king is, or None if it has been captured """
+    king = WK if p=='W' else BK
+    for sqix in sqixs:
+        if b.sq[sqix] == king:
+            return sqix
+    return None
+
+def isAttacked(b: Board, sqix: Sqix, p: Player) -> bool:
+    """ could one of (p)'s pieces move to (sqix)? Looks out from
+    (sqix) instead of generating (p)'s moves.
+    """
+    sq = b.sq
+    if p=='W':
+        pawn, knight, bishop, rook, queen, king = WP, WN, WB, WR, WQ, WK
+        pawnCaptures = WP_CAPTURE
+    else:
+        pawn, knight, bishop, rook, queen, king = BP, BN, BB, BR, BQ, BK
+        pawnCaptures = BP_CAPTURE
+    for d in pawnCaptures:
+        if sq[sqix-d] == pawn: return True
+    for d in N_MOV:
+        if sq[sqix+d] == knight: return True
+    for d in Q_DIR:
+        if sq[sqix+d] == king: return True
+    for ds, pieces in ((B_DIR, (bishop, queen)), (R_DIR, (rook, queen))):
+        for d in ds:
+            dest = sqix + d
+            while sq[dest] == EMPTY:
+                dest += d
+            if sq[dest] in pieces: return True
+        #//for d
+    #//for ds
+    return False
+
+def inCheck(b: Board, p: Player) -> bool:
+    """ is (p)'s king attacked? """
+    sqix = kingSquare(b, p)
+    return sqix is not None and isAttacked(b, sqix, opponent(p))
+
+#---------------------------------------------------------------------
+# special moves
+
+"""
+Board.makeMove() doesn't know about castling, en passant or promotion
+to anything but a queen, but real games (e.g. in PGN files) have
+them. playMove() makes those moves: makeMove() moves the king (or
+pawn) and then playMove() moves the rook, removes the pawn taken en
+passant, or changes the queen to the piece promoted to.
+"""
+
+# CASTLING[king's move] = the rook's move
+CASTLING: Dict[Move,Move] = {
+    almovMov("e1g1"): almovMov("h1f1"),
+    almovMov("e1c1"): almovMov("a1d1"),
+    almovMov("e8g8"): almovMov("h8f8"),
+    almovMov("e8c8"): almovMov("a8d8"),
+}
+
+def isCastling(b: Board, mv: Move) -> bool:
+    return mv in CASTLING and b.sq[mv[0]] in kingSet
+
+# CASTLING_RULES[king's move] = (king, castling right, the squares
+# that must be empty, the squares the king starts on and crosses)
+CASTLING_RULES: Dict[Move,Tuple[Sqv,str,List[Sqix],List[Sqix]]] = {
+    almovMov("e1g1"): (WK, "castleWK", [toSqix(a) for a in ("f1", "g1")],
+                       [toSqix(a) for a in ("e1", "f1")]),
+    almovMov("e1c1"): (WK, "castleWQ",
+                       [toSqix(a) for a in ("b1", "c1", "d1")],
+                       [toSqix(a) for a in ("e1", "d1")]),
+    almovMov("e8g8"): (BK, "castleBK", [toSqix(a) for a in ("f8", "g8")],
+                       [toSqix(a) for a in ("e8", "f8")]),
+    almovMov("e8c8"): (BK, "castleBQ",
+                       [toSqix(a) for a in ("b8", "c8", "d8")],
+                       [toSqix(a) for a in ("e8", "d8")]),
+}
+
+def castlingMoves(b: Board) -> List[Move]:
+    """ the castling moves the mover can make: it has the right to,
+    the squares between king and rook are empty, and the king isn't
+    in check and doesn't cross an attacked square. (Whether it ends
+    in check is for legalMoves() to find out.)
+    """
+    r: List[Move] = []
+    enemy = opponent(b.mover)
+    for mv, (king, right, empty, crosses) in CASTLING_RULES.items():
+        if (b.sq[mv[0]] == king and isPlayer(king, b.mover)
+            and getattr(b, right)
+            and b.sq[CASTLING[mv][0]] == (WR if king == WK else BR)
+            and all(b.sq[sx] == EMPTY for sx in empty)
+            and not any(isAttacked(b, sx, enemy) for sx in crosses)):
+            r.append(mv)
+    #//for
+    return r
+
+def isEnPassant(b: Board, mv: Move) -> bool:
+    """ is (mv) a pawn capturing a pawn en passant? """
+    sqFrom, sqTo = mv
+    return (b.sq[sqFrom] in pawnSet and b.sq[sqTo] == EMPTY
+            and abs(sqTo - sqFrom) in (9, 11))
+
+def enPassantVictim(mv: Move) -> Sqix:
+    """ the square of the pawn taken by en passant move (mv) """
+    fTo, _ = sqixFR(mv[1])
+    _, rFrom = sqixFR(mv[0])
+    return frix(fTo, rFrom)
+
+def playMove(b: Board, mv: Move, promo: Optional[Sqv] = None) -> Board:
+    """ the position after move (mv) in (b), which can be castling
+    or en passant. A pawn getting to the last rank promotes to
+    (promo) (default: a queen).
+    """
+    castling = isCastling(b, mv)
+    enPassant = isEnPassant(b, mv)
+    b2 = b.makeMove(mv)
+    if castling:
+        rookFrom, rookTo = CASTLING[mv]
+        rook = b2.sq[rookFrom]
+        b2.setSq(rookFrom, EMPTY)
+        b2.setSq(rookTo, rook)
+    elif enPassant:
+        b2.setSq(enPassantVictim(mv), EMPTY)
+    if promo is not None and b2.sq[mv[1]] in queenSet \
+            and b.sq[mv[0]] in pawnSet:
+        b2.setSq(mv[1], promo)
+    return b2
+
+def leavesKingAttacked(b: Board, mv: Move) -> bool:
+    """ does move (mv) leave the mover's king in check? """
+    return inCheck(playMove(b, mv), b.mover)
+
+def legalMoves(b: Board) -> List[Move]:
+    """ the mover's pseudo-moves that don't leave its king in check """
+    return [mv for mv in pmovs(b, b.mover)
+            if not leavesKingAttacked(b, mv)]
+
+def randomPositions(n: int, seed: int = 1,
+                    maxPly: int = 120) -> List[Board]:
+    """ (n) positions from games of random legal moves, starting a
+    new game when one ends or passes (maxPly). For tests and
+    benchmarks.
+    """
+    rnd = random.Random(seed)
+    r: List[Board] = []
+    b = Board.startPosition()
+    while len(r) < n:
+        mvs = legalMoves(b)
+        if not mvs or b.ply > maxPly:
+            b = Board.startPosition()
+            continue
+        b = b.makeMove(rnd.choice(mvs))
+        r.append(b)
+    #//while
+    return r
 
 
 #---------------------------------------------------------------------
@@ -0,0 +1,256 @@
+# movegenbatch.py = move generation for many positions at once
+
+"""
+Generate pseudo-moves (see movegen.pmovs()) for many positions at
+once, using precomputed tables of target squares and NumPy masking
+instead of a Python loop per piece.
+
+Positions are encoded as an (N, 64) int8 array, one row per position.
+Square (f,rk) is column (f-1)*8 + (rk-1) (the same order as
+board.sqixs), so reshaping to (N, 8, 8) indexes by [position, file-1,
+rank-1]. Pieces are coded as 1..6 for white PNBRQK, -1..-6 for black
+pnbrqk, and 0 for empty.
+
+Black's moves are generated as white's moves in the mirror position.
+"""
+
+from typing import List, Tuple, Sequence, Optional
+
+import numpy as np
+
+from board import *
+
+#---------------------------------------------------------------------
+# encoding positions
+
+PIECE_CODES = {
+    EMPTY: 0,
+    WP: 1, WN: 2, WB: 3, WR: 4, WQ: 5, WK: 6,
+    BP: -1, BN: -2, BB: -3, BR: -4, BQ: -5, BK: -6,
+}
+P_CODE = 1
+N_CODE = 2
+B_CODE = 3
+R_CODE = 4
+Q_CODE = 5
+K_CODE = 6
+OFF_CODE = 7 # the extra column 64, off the board
+
+# translates a string of square-values into int8 codes (as bytes)
+_CODE_TRANS = bytes.maketrans(
+    "".join(PIECE_CODES.keys()).encode("latin-1"),
+    bytes(c & 0xFF for c in PIECE_CODES.values()))
+
+# sqixIdx[sqix] = the column for square (sqix), -1 if off the board
+sqixIdx = np.full(121, -1, dtype=np.int64)
+for _i, _sx in enumerate(sqixs):
+    sqixIdx[_sx] = _i
+# idxSqix[i] = the square for column (i)
+idxSqix = np.array(sqixs, dtype=np.int64)
+# mirrorIdx[i] = the mirror of the square for column (i)
+mirrorIdx = np.array([(i//8)*8 + 7 - i%8 for i in range(64)],
+                     dtype=np.int64)
+
+def encodeBoard(b: Board) -> bytes:
+    """ the 64 int8 piece codes of (b), as bytes """
+    s = "".join([b.sq[sx] for sx in sqixs])
+    return s.encode("latin-1").translate(_CODE_TRANS)
+
+def encodeBoards(boards: Sequence[Board]) -> np.ndarray:
+    """ encode (boards) as an (N, 64) int8 array """
+    data = b"".join([encodeBoard(b) for b in boards])
+    return np.frombuffer(data, dtype=np.int8).reshape(len(boards), 64)
+
+# CODE_PIECES[code] = the square-value for piece code (code)
+CODE_PIECES = {code: sv for sv, code in PIECE_CODES.items()}
+
+def decodeBoard(row: np.ndarray, mover: Player = 'W') -> Board:
+    """ the position encoded as (row), with (mover) to move and no
+    castling
+    """
+    b = Board()
+    for sx, code in zip(sqixs, row.tolist()):
+        b.sq[sx] = CODE_PIECES[code]
+    b.mover = mover
+    b.castleWK = b.castleWQ = b.castleBK = b.castleBQ = False
+    return b
+
+def mirrorArr(arr: np.ndarray) -> np.ndarray:
+    """ the mirrors (see Board.getMirror()) of encoded positions:
+    ranks reversed and colours swapped
+    """
+    return -arr[:, mirrorIdx]
+
+#---------------------------------------------------------------------
+# target tables
+
+def targetIdx(i: int, df: int, drk: int) -> int:
+    """ the column (df) files and (drk) ranks from column (i),
+    or 64 if that's off the board
+    """
+    f = i//8 + df
+    rk = i%8 + drk
+    if 0 <= f < 8 and 0 <= rk < 8:
+        return f*8 + rk
+    return 64
+
+N_DELTAS = [(1,2), (2,1), (2,-1), (1,-2), (-1,-2), (-2,-1), (-2,1), (-1,2)]
+DIAG_DELTAS = [(1,1), (1,-1), (-1,-1), (-1,1)]
+ORTH_DELTAS = [(0,1), (1,0), (0,-1), (-1,0)]
+K_DELTAS = DIAG_DELTAS + ORTH_DELTAS
+
+# (64, 8) tables of the squares a knight/king on each square goes to
+knightTargets = np.array([[targetIdx(i, df, drk) for df, drk in N_DELTAS]
+                          for i in range(64)], dtype=np.int64)
+kingTargets = np.array([[targetIdx(i, df, drk) for df, drk in K_DELTAS]
+                        for i in range(64)], dtype=np.int64)
+
+def rayTarget(i: int, df: int, drk: int, n: int) -> int:
+    """ the column (n) steps in direction (df,drk) from column (i) """
+    for _ in range(n):
+        i = targetIdx(i, df, drk)
+        if i == 64: break
+    return i
+
+# (64, 8, 7) table of the squares along each ray from each square;
+# directions 0..3 are diagonal, 4..7 orthogonal
+rayTargets = np.array([[[rayTarget(i, df, drk, n) for n in range(1, 8)]
+                        for df, drk in K_DELTAS]
+                       for i in range(64)], dtype=np.int64)
+DIAG_DIRS = np.array([True]*4 + [False]*4)
+ORTH_DIRS = ~DIAG_DIRS
+
+# (64,) tables for white pawns
+pawnPush1 = np.array([targetIdx(i, 0, 1) for i in range(64)])
+pawnPush2 = np.array([targetIdx(i, 0, 2) if i%8 == 1 else 64
+                      for i in range(64)])
+# (64, 2) table of the squares a white pawn captures on
+pawnCaptures = np.array([[targetIdx(i, -1, 1), targetIdx(i, 1, 1)]
+                         for i in range(64)])
+
+#---------------------------------------------------------------------
+
+BATCH_CHUNK = 1024 # positions generated at a time, to limit memory use
+
+class BatchMoves:
+    """ the pseudo-moves of one player in N positions:
+
+    counts: (N,) the number of moves in each position
+    attacks: (N, 64) the number of moves to each square (by column)
+    moves: if asked for, an (M, 3) array of all the moves, each row
+        being (position number, source sqix, destination sqix);
+        otherwise None
+    """
+    counts: np.ndarray
+    attacks: np.ndarray
+    moves: Optional[np.ndarray] = None
+
+def _pieceMoves(a: np.ndarray, isPiece: np.ndarray, table: np.ndarray):
+    """ for the pieces where (isPiece) (an (N, 64) mask), return
+    (pos, src, targets, occ) where (pos) and (src) are the position
+    number and column of each piece, targets = table[src] and (occ)
+    is what's on the target squares.
+    """
+    pos, src = np.nonzero(isPiece)
+    targets = table[src]
+    extra = (1,)*(targets.ndim-1)
+    occ = a[pos.reshape((-1,) + extra), targets]
+    return pos, src, targets, occ
+
+def _canGoTo(occ: np.ndarray) -> np.ndarray:
+    """ can a white piece move to a square containing (occ)? """
+    return (occ == 0) | (occ < 0)
+
+def _whiteMoveMasks(arr: np.ndarray):
+    """ white's pseudo-moves in encoded positions (arr), as a list of
+    (pos, src, targets, mask) for each sort of move. For a piece on
+    column src[j] of position pos[j], mask[j, ...] says whether it can
+    move to column targets[j, ...].
+    """
+    n = arr.shape[0]
+    # add column 64, off the board, which blocks everything:
+    a = np.concatenate([arr, np.full((n, 1), OFF_CODE, dtype=np.int8)],
+                       axis=1)
+    r = []
+
+    for code, table in [(N_CODE, knightTargets), (K_CODE, kingTargets)]:
+        pos, src, targets, occ = _pieceMoves(a, arr == code, table)
+        r.append((pos, src, targets, _canGoTo(occ)))
+    #//for
+
+    for code, dirs in [(B_CODE, DIAG_DIRS), (R_CODE, ORTH_DIRS),
+                       (Q_CODE, DIAG_DIRS | ORTH_DIRS)]:
+        pos, src, targets, occ = _pieceMoves(a, arr == code,
+                                             rayTargets[:, dirs])
+        blocker = occ != 0
+        # a square is reachable if nothing is in the way before it:
+        blockedBefore = np.logical_or.accumulate(blocker, axis=2)
+        blockedBefore[:, :, 1:] = blockedBefore[:, :, :-1].copy()
+        blockedBefore[:, :, 0] = False
+        r.append((pos, src, targets, ~blockedBefore & _canGoTo(occ)))
+    #//for
+
+    pos, src, push1, occ1 = _pieceMoves(a, arr == P_CODE, pawnPush1)
+    push2 = pawnPush2[src]
+    occ2 = a[pos, push2]
+    caps = pawnCaptures[src]
+    capOcc = a[pos[:, None], caps]
+    r.append((pos, src, push1, occ1 == 0))
+    r.append((pos, src, push2, (occ1 == 0) & (occ2 == 0)))
+    r.append((pos, src, caps, capOcc < 0))
+    return r
+
+def _whiteBatchMoves(arr: np.ndarray, packed: bool) -> BatchMoves:
+    """ white's pseudo-moves in encoded positions (arr) """
+    n = arr.shape[0]
+    r = BatchMoves()
+    r.attacks = np.zeros((n, 64), dtype=np.int64)
+    moveParts = []
+    for pos, src, targets, mask in _whiteMoveMasks(arr):
+        extra = (1,)*(targets.ndim-1)
+        flat = (pos.reshape((-1,) + extra)*65 + targets)[mask]
+        r.attacks += np.bincount(flat, minlength=n*65) \
+                       .reshape(n, 65)[:, :64]
+        if packed:
+            nz = np.nonzero(mask)
+            moveParts.append(np.stack(
+                [pos[nz[0]], src[nz[0]], targets[nz]], axis=1))
+    #//for
+    r.counts = r.attacks.sum(axis=1)
+    if packed:
+        r.moves = np.concatenate(moveParts)
+    return r
+
+def pmovsBatch(arr: np.ndarray, p: Player,
+               packed: bool = False) -> BatchMoves:
+    """ the pseudo-moves (see movegen.pmovs()) for player (p) in each
+    encoded position (arr). The attack map and counts are always
+    calculated; the moves themselves only if (packed).
+    """
+    r = BatchMoves()
+    r.counts = np.zeros(arr.shape[0], dtype=np.int64)
+    r.attacks = np.zeros((arr.shape[0], 64), dtype=np.int64)
+    parts = []
+    for start in range(0, arr.shape[0], BATCH_CHUNK):
+        chunk = arr[start:start+BATCH_CHUNK]
+        if p == 'B':
+            chunk = mirrorArr(chunk)
+        cr = _whiteBatchMoves(chunk, packed)
+        if p == 'B':
+            cr.attacks = cr.attacks[:, mirrorIdx]
+        r.counts[start:start+len(chunk)] = cr.counts
+        r.attacks[start:start+len(chunk)] = cr.attacks
+        if packed:
+            mv = cr.moves.copy()
+            mv[:, 0] += start
+            if p == 'B':
+                mv[:, 1:] = mirrorIdx[mv[:, 1:]]
+            parts.append(mv)
+    #//for
+    if packed:
+        r.moves = np.concatenate(parts) if parts \
+                  else np.zeros((0, 3), dtype=np.int64)
+        r.moves[:, 1:] = idxSqix[r.moves[:, 1:]]
+    return r
+
+#end
@@ -0,0 +1,429 @@
+# nnue.py = evaluation by a small neural network, updated incrementally
+
+"""
+An alternative to evalpos.staticEval(): a small network whose first
+layer is updated incrementally as moves are made (the idea behind
+NNUE, "efficiently updatable neural networks").
+
+Features
+--------
+Each position is seen from two perspectives, white's and black's. From
+a perspective, there is one feature for each (own king square, piece,
+square) where the piece isn't a king: 65 king squares (64 means there
+is no own king), 10 pieces (own P N B R Q, then the opponent's), and
+64 squares. So there are NUM_FEATURES = 65*10*64 of them. Black's
+perspective is mirrored (see board.mirrorSq()), so the same weights
+serve both sides.
+
+The network
+-----------
+    acc[p] = b1 + sum of W1[f] for the features f active for
+             perspective p                             (the accumulator)
+    h[p] = clip(acc[p], 0, clip)
+    out = (h[mover] . W2[:H] + h[other] . W2[H:] + b2) * scale
+
+(out) is in centipawns for the mover; NnueEval returns it +ve for
+white, like staticEval().
+
+Incremental updates
+-------------------
+A move changes at most 3 features (the moved piece leaves its square,
+a captured piece goes, the moved or promoted piece arrives), so a
+child's accumulator is its parent's plus or minus a few rows of W1:
+the cost doesn't depend on how many pieces there are. Only when a
+king moves does that side's perspective have to be added up again
+from all the pieces.
+
+Board.makeMove() passes a position's Accumulator on to the new
+position (see Accumulator.afterMove()). The updates are lazy: the
+child only records which rows change, and they are added when it is
+evaluated, so positions the search never evaluates cost little.
+Because moves are made by copying, unmaking a move is just going back
+to the parent, which still has its own accumulator.
+
+Weights
+-------
+Networks are trained elsewhere and saved as a .npz file with arrays
+W1 (NUM_FEATURES, H), b1 (H,), W2 (2H,), and scalars b2, clip and
+scale; see NnueNet.load(). NnueNet.fromMaterial() makes a network
+that computes evalpos.material() exactly, which is useful for
+testing; NnueNet.random() makes one with random weights.
+
+Usage, as a Search's evalCache:
+
+    net = NnueNet.load("net.npz")
+    s = Search(evalCache=NnueEval(net))
+
+To compare speed and accuracy with the hand-written evaluation:
+
+    python nnue.py -w net.npz -d 3
+"""
+
+import argparse
+import time
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import pmovs, randomPositions
+import evalpos
+
+#---------------------------------------------------------------------
+# features
+
+NUM_KING_SQS = 65 # 64 squares, and 64 for no king
+NUM_PIECES = 10
+NUM_FEATURES = NUM_KING_SQS * NUM_PIECES * 64
+
+NO_KING = 64
+
+WHITE_VIEW = 0 # perspectives, as indexes
+BLACK_VIEW = 1
+
+# pieceIndex[perspective][sv] = index of piece (sv), from that
+# perspective. Kings aren't features.
+pieceIndex: List[Dict[Sqv,int]] = [
+    {pv: i for i, pv in enumerate("PNBRQpnbrq")},
+    {pv: i for i, pv in enumerate("pnbrqPNBRQ")},
+]
+ownKing = [WK, BK]
+
+# sqIndex[perspective][sqix] = index (0..63) of square (sqix), from
+# that perspective
+sqIndex: List[List[int]] = [[-1]*121, [-1]*121]
+for _i, _sx in enumerate(sqixs):
+    sqIndex[WHITE_VIEW][_sx] = _i
+    sqIndex[BLACK_VIEW][mirrorSq(_sx)] = _i
+
+def featureIndex(p: int, kingSq: int, sv: Sqv, sx: Sqix) -> int:
+    """ the feature for piece (sv) on (sx) from perspective (p),
+    whose king is on (kingSq) (an index from sqIndex, or NO_KING)
+    """
+    return ((kingSq*NUM_PIECES + pieceIndex[p][sv])*64
+            + sqIndex[p][sx])
+
+def kingSquare(b: Board, p: int) -> int:
+    """ where perspective (p)'s king is, as an index from sqIndex,
+    or NO_KING
+    """
+    king = ownKing[p]
+    for sx in sqixs:
+        if b.sq[sx] == king:
+            return sqIndex[p][sx]
+    return NO_KING
+
+def activeFeatures(b: Board, p: int, kingSq: int) -> List[int]:
+    """ the features of (b) from perspective (p) """
+    r = []
+    for sx in sqixs:
+        sv = b.sq[sx]
+        if sv != EMPTY and sv not in kingSet:
+            r.append(featureIndex(p, kingSq, sv, sx))
+    #//for sx
+    return r
+
+#---------------------------------------------------------------------
+# the network
+
+class NnueNet:
+    """ a network's weights """
+
+    W1: np.ndarray # (NUM_FEATURES, H) first layer
+    b1: np.ndarray # (H,)
+    W2: np.ndarray # (2H,) output layer: mover's half, then the other
+    b2: float = 0.0
+    clip: float = 1.0 # first-layer outputs are clipped to [0, clip]
+    scale: float = 1.0 # output to centipawns
+
+    def __init__(self, W1: np.ndarray, b1: np.ndarray, W2: np.ndarray,
+                 b2: float = 0.0, clip: float = 1.0, scale: float = 1.0):
+        hidden = b1.shape[0] if b1.ndim == 1 else -1
+        if (W1.shape != (NUM_FEATURES, hidden) or b1.shape != (hidden,)
+            or W2.shape != (2*hidden,)):
+            raise ValueError(form("bad network shapes W1 {} b1 {} W2 {}",
+                                  W1.shape, b1.shape, W2.shape))
+        self.W1 = np.ascontiguousarray(W1, dtype=np.float32)
+        self.b1 = np.asarray(b1, dtype=np.float32)
+        self.W2 = np.asarray(W2, dtype=np.float32)
+        self.b2 = float(b2)
+        self.clip = float(clip)
+        self.scale = float(scale)
+
+    @property
+    def hidden(self) -> int:
+        """ size of the first layer """
+        return self.b1.shape[0]
+
+    @staticmethod
+    def load(filename: str) -> 'NnueNet':
+        """ load a network from a .npz file """
+        with np.load(filename) as data:
+            return NnueNet(data['W1'], data['b1'], data['W2'],
+                           float(data['b2']), float(data['clip']),
+                           float(data['scale']))
+
+    def save(self, filename: str):
+        """ save the network to a .npz file """
+        # (written via a file object, so np.savez doesn't add .npz)
+        with open(filename, "wb") as f:
+            np.savez(f, W1=self.W1, b1=self.b1, W2=self.W2,
+                     b2=self.b2, clip=self.clip, scale=self.scale)
+
+    @staticmethod
+    def fromMaterial(params: Optional[evalpos.EvalParams] = None,
+                     hidden: int = 16) -> 'NnueNet':
+        """ a network that calculates evalpos.material() (without the
+        kings) exactly. Hidden unit i counts the pieces of index i,
+        divided by 16 so it stays under the clip.
+        """
+        ep = params or evalpos.defaultParams
+        if hidden < NUM_PIECES:
+            raise ValueError(form("need at least {} hidden units",
+                                  NUM_PIECES))
+        W1 = np.zeros((NUM_KING_SQS, NUM_PIECES, 64, hidden),
+                      dtype=np.float32)
+        W2 = np.zeros(2*hidden, dtype=np.float32)
+        values = [ep.P_VALUE, ep.N_VALUE, ep.B_VALUE, ep.R_VALUE,
+                  ep.Q_VALUE]
+        for i in range(NUM_PIECES):
+            W1[:, i, :, i] = 1/16
+            W2[i] = (values[i] if i < 5 else -values[i-5]) * 16
+        #//for i
+        return NnueNet(W1.reshape(NUM_FEATURES, hidden),
+                       np.zeros(hidden, dtype=np.float32), W2)
+
+    @staticmethod
+    def random(hidden: int = 32, seed: int = 1) -> 'NnueNet':
+        """ a network with random weights """
+        rnd = np.random.default_rng(seed)
+        return NnueNet(rnd.normal(0, 0.05, (NUM_FEATURES, hidden)),
+                       rnd.normal(0, 0.1, hidden),
+                       rnd.normal(0, 1.0, 2*hidden),
+                       0.0, 1.0, 100.0)
+
+    def refresh(self, b: Board, p: int, kingSq: int) -> np.ndarray:
+        """ the accumulator of (b) for perspective (p), from scratch """
+        return self.b1 + self.W1[activeFeatures(b, p, kingSq)].sum(axis=0)
+
+    def output(self, acc: np.ndarray, mover: Player) -> int:
+        """ the evaluation, in centipawns for white, of accumulator
+        values (acc), shape (2, H)
+        """
+        h = np.clip(acc, 0.0, self.clip)
+        own = WHITE_VIEW if mover == 'W' else BLACK_VIEW
+        H = self.hidden
+        out = (float(h[own] @ self.W2[:H]) + float(h[1-own] @ self.W2[H:])
+               + self.b2) * self.scale
+        v = int(round(out))
+        return v if mover == 'W' else -v
+
+#---------------------------------------------------------------------
+# accumulators
+
+class Accumulator:
+    """ the first-layer values of a position, for both perspectives.
+    Until they're needed, a position's values are kept as its parent's
+    plus the rows of W1 to add and subtract.
+    """
+
+    net: NnueNet
+    kingSqs: Tuple[int,int] # each perspective's king square
+    values: Optional[np.ndarray] = None # (2, H), None if not yet added up
+    parent: Optional['Accumulator'] = None
+    board: Optional[Board] = None # for refreshes
+    # for each perspective, (added, removed) features, or None to
+    # refresh it:
+    deltas: List[Optional[Tuple[List[int],List[int]]]] = []
+
+    def __init__(self, net: NnueNet, kingSqs: Tuple[int,int]):
+        self.net = net
+        self.kingSqs = kingSqs
+
+    @staticmethod
+    def fromBoard(net: NnueNet, b: Board) -> 'Accumulator':
+        """ the accumulator for (b), added up from all its pieces """
+        kingSqs = (kingSquare(b, WHITE_VIEW), kingSquare(b, BLACK_VIEW))
+        acc = Accumulator(net, kingSqs)
+        acc.values = np.stack([net.refresh(b, p, kingSqs[p])
+                               for p in (WHITE_VIEW, BLACK_VIEW)])
+        return acc
+
+    def afterMove(self, before: Board, after: Board,
+                  mv: Move) -> 'Accumulator':
+        """ the accumulator for (after), which is (before) after move
+        (mv). Called by Board.makeMove().
+        """
+        sqFrom, sqTo = mv
+        moved = before.sq[sqFrom]
+        captured = before.sq[sqTo]
+        placed = after.sq[sqTo]
+        child = Accumulator(self.net, self.kingSqs)
+        child.parent = self
+        child.deltas = [None, None]
+        kingSqs = list(self.kingSqs)
+        for p in (WHITE_VIEW, BLACK_VIEW):
+            if moved == ownKing[p] or captured == ownKing[p]:
+                kingSqs[p] = (sqIndex[p][sqTo] if moved == ownKing[p]
+                              else NO_KING)
+                child.board = after
+                continue
+            k = kingSqs[p]
+            added: List[int] = []
+            removed: List[int] = []
+            if moved not in kingSet:
+                removed.append(featureIndex(p, k, moved, sqFrom))
+                added.append(featureIndex(p, k, placed, sqTo))
+            if captured != EMPTY and captured not in kingSet:
+                removed.append(featureIndex(p, k, captured, sqTo))
+            child.deltas[p] = (added, removed)
+        #//for p
+        child.kingSqs = (kingSqs[0], kingSqs[1])
+        return child
+
+    def getValues(self) -> np.ndarray:
+        """ the (2, H) accumulator values, adding up any pending
+        updates back to the nearest ancestor that has its values
+        """
+        if self.values is None:
+            pending: List[Accumulator] = []
+            a: Optional[Accumulator] = self
+            while a.values is None:
+                pending.append(a)
+                a = a.parent
+            for a in reversed(pending):
+                a._update()
+        return self.values
+
+    def _update(self):
+        """ work out the values from the parent's """
+        W1 = self.net.W1
+        v = self.parent.values.copy()
+        for p in (WHITE_VIEW, BLACK_VIEW):
+            d = self.deltas[p]
+            if d is None:
+                v[p] = self.net.refresh(self.board, p, self.kingSqs[p])
+                continue
+            added, removed = d
+            for f in added:
+                v[p] += W1[f]
+            for f in removed:
+                v[p] -= W1[f]
+        #//for p
+        self.values = v
+        self.parent = None
+        self.board = None
+        self.deltas = []
+
+#---------------------------------------------------------------------
+
+class NnueEval:
+    """ evaluates positions with a network. It can be given to a
+    Search as its (evalCache).
+    """
+
+    net: NnueNet
+    evals: int = 0
+    refreshes: int = 0 # accumulators added up from scratch
+
+    def __init__(self, net: NnueNet):
+        self.net = net
+
+    def accumulator(self, b: Board) -> Accumulator:
+        """ (b)'s accumulator for this network, making one if it
+        hasn't got one
+        """
+        acc = b.accumulator
+        if acc is None or acc.net is not self.net:
+            self.refreshes += 1
+            acc = Accumulator.fromBoard(self.net, b)
+            b.accumulator = acc
+        return acc
+
+    def prepare(self, b: Board):
+        """ give the root of a search an accumulator, so every
+        position reached from it is updated incrementally
+        """
+        self.accumulator(b)
+
+    def staticEval(self, b: Board) -> int:
+        """ the evaluation of (b), +ve for white """
+        self.evals += 1
+        return self.net.output(self.accumulator(b).getValues(), b.mover)
+
+    def lazyEval(self, b: Board, alpha: int, beta: int) -> Tuple[int,bool]:
+        """ the network has no cheap partial evaluation, so this is
+        always exact
+        """
+        return self.staticEval(b), True
+
+    def hitRate(self) -> float:
+        return 0.0
+
+#---------------------------------------------------------------------
+# benchmark
+
+def accuracy(net: NnueNet, boards: List[Board]) -> Dict[str,float]:
+    """ how close the network's evaluations of (boards) are to
+    evalpos.staticEval()'s
+    """
+    ev = NnueEval(net)
+    nv = np.array([ev.staticEval(b) for b in boards], dtype=np.float64)
+    hv = np.array([evalpos.staticEval(b) for b in boards],
+                  dtype=np.float64)
+    corr = (float(np.corrcoef(nv, hv)[0, 1])
+            if nv.std() > 0 and hv.std() > 0 else 0.0)
+    return {
+        'meanAbsDiff': float(np.abs(nv - hv).mean()),
+        'correlation': corr,
+    }
+
+def benchmark(net: NnueNet, boards: List[Board],
+              depth: int) -> Dict[str,Dict[str,float]]:
+    """ search each of (boards) to (depth) with the hand-written
+    evaluation and with (net), returning the nodes per second of each
+    """
+    from search import Search
+    r = {}
+    for name, makeEval in [('evalpos', lambda: None),
+                           ('nnue', lambda: NnueEval(net))]:
+        nodes = 0
+        startTime = time.perf_counter()
+        for b in boards:
+            s = Search(evalCache=makeEval())
+            s.search(b, depth)
+            nodes += s.stats['nodes']
+        #//for b
+        seconds = time.perf_counter() - startTime
+        r[name] = {'nodes': nodes, 'seconds': seconds,
+                   'nodesPerSec': nodes/seconds if seconds else 0.0}
+    #//for name
+    return r
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="compare the network evaluation with evalpos")
+    ap.add_argument("-w", "--weights", default=None,
+                    help="network .npz file (default: material only)")
+    ap.add_argument("-d", "--depth", type=int, default=3,
+                    help="search depth")
+    ap.add_argument("-n", "--positions", type=int, default=20,
+                    help="number of positions to search")
+    args = ap.parse_args()
+
+    net = (NnueNet.load(args.weights) if args.weights
+           else NnueNet.fromMaterial())
+    boards = randomPositions(args.positions)
+    for name, r in benchmark(net, boards, args.depth).items():
+        prn("{:>8}: {:>8} nodes {:>7.2f}s {:>8.0f} nodes/s", name,
+            r['nodes'], r['seconds'], r['nodesPerSec'])
+    acc = accuracy(net, randomPositions(1000, seed=2))
+    prn("accuracy: mean |nnue - evalpos| {:.1f}, correlation {:.3f}",
+        acc['meanAbsDiff'], acc['correlation'])
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -0,0 +1,219 @@
+# parallel.py = search using several processes
+
+"""
+Python threads can't speed up a CPU-bound search (because of the GIL),
+so parallel search uses a pool of processes. Two modes:
+
+- "lazy" (Lazy SMP): every worker searches the whole position, within
+  the same limits. Helper workers search the root moves in a different
+  order. They speed each other up through the shared transposition
+  table; the deepest result wins.
+
+- "split": the root moves are dealt out between the workers, and each
+  searches only its own moves. The result is the best move at the
+  deepest iteration that every worker completed.
+
+The workers' transposition table is a SharedTransTable, so every worker
+sees what the others have found. Several ParallelSearches (in any
+processes) can use the same table, by passing its name as (ttName).
+
+Use it like this:
+
+    with ParallelSearch(numWorkers=8) as ps:
+        mv, score = ps.think(b, Limits(seconds=5.0))
+
+A ParallelSearch can be passed as the (searcher) to game.getBestMove().
+"""
+
+import os
+import random
+from multiprocessing import Pool
+from typing import List, Tuple, Dict, Optional
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import pmovs
+import evalpos
+import search
+from search import Search, Limits, orderMoves, STAT_NAMES
+from transtable import SharedTransTable
+
+#---------------------------------------------------------------------
+
+PARALLEL_TT_ENTRIES = 1<<20 # size of the shared transposition table
+
+LAZY = "lazy"
+SPLIT = "split"
+
+# what a worker sends back: (best move, score, depth reached,
+# iterations, stats)
+WorkerResult = Tuple[Optional[Move], int, int,
+                     List[Tuple[int,Move,int]], Dict[str,int]]
+
+#---------------------------------------------------------------------
+# running in the worker processes
+
+_workerSearch: Optional[Search] = None
+
+def _initWorker(ttName: str, params: Optional[evalpos.EvalParams] = None):
+    """ set up a worker process: attach to the shared table """
+    global _workerSearch
+    _workerSearch = Search(tt=SharedTransTable.attach(ttName),
+                           params=params)
+
+def _workerThink(args: Tuple[Tuple[bytes, List[int]], Limits,
+                             Optional[List[Move]]]) -> WorkerResult:
+    """ search a position in a worker process. It comes as the
+    position packed by Board.pack(), and its keyHistory.
+    """
+    (packed, keyHistory), limits, rootMoves = args
+    b = Board.unpack(packed)
+    b.keyHistory = keyHistory
+    s = _workerSearch
+    mv, score = s.think(b, limits, rootMoves)
+    return (mv, score, s.depthReached, s.iterations, s.stats)
+
+#---------------------------------------------------------------------
+
+class ParallelSearch:
+    """ a search using a pool of worker processes, with a shared
+    transposition table
+    """
+
+    numWorkers: int = 1
+    mode: str = LAZY
+    tt: SharedTransTable # the shared table, as seen by this process
+    stats: Dict[str,int] = {}
+    depthReached: int = 0
+
+    def __init__(self, numWorkers: Optional[int] = None,
+                       mode: str = LAZY,
+                       ttEntries: int = PARALLEL_TT_ENTRIES,
+                       ttName: Optional[str] = None,
+                       params: Optional[evalpos.EvalParams] = None):
+        """ if (ttName) is given, use that existing shared table,
+        otherwise create one with (ttEntries) entries. The workers
+        evaluate with (params), by default evalpos.defaultParams.
+        """
+        if mode not in (LAZY, SPLIT):
+            raise ValueError(form("unknown parallel search mode {!r}",
+                                  mode))
+        self.numWorkers = numWorkers or os.cpu_count() or 1
+        self.mode = mode
+        if ttName is None:
+            self.tt = SharedTransTable.create(ttEntries)
+        else:
+            self.tt = SharedTransTable.attach(ttName)
+        self.pool = Pool(self.numWorkers, initializer=_initWorker,
+                         initargs=(self.tt.name, params))
+        self.stats = {name: 0 for name in STAT_NAMES}
+
+    def close(self):
+        """ stop the workers, and free the shared table if we
+        created it
+        """
+        self.pool.close()
+        self.pool.join()
+        self.tt.close()
+
+    def __enter__(self) -> 'ParallelSearch':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def think(self, b: Board, limits: Limits
+              ) -> Tuple[Optional[Move], int]:
+        """ search position (b) within (limits) using all the workers.
+        Return the best move and its score for the mover.
+        """
+        mvs = orderMoves(b, pmovs(b, b.mover))
+        if not mvs: return None, 0
+        if self.mode == LAZY:
+            jobs = self._lazyJobs(b, limits, mvs)
+        else:
+            jobs = self._splitJobs(b, limits, mvs)
+        results = self.pool.map(_workerThink, jobs)
+
+        self.stats = {name: 0 for name in STAT_NAMES}
+        for r in results:
+            for name, n in r[4].items():
+                self.stats[name] += n
+        #//for r
+
+        if self.mode == LAZY:
+            return self._lazyResult(results)
+        else:
+            return self._splitResult(results)
+
+    def _lazyJobs(self, b: Board, limits: Limits, mvs: List[Move]):
+        """ the main worker (0) searches normally; the helpers
+        search the moves in a different order. None of them goes
+        deeper than (limits.depth), so the result is for the same
+        depth as Search.think() would give.
+        """
+        position = (b.pack(), b.keyHistory)
+        jobs = [(position, limits, None)]
+        for i in range(1, self.numWorkers):
+            helperMvs = mvs[:]
+            random.Random(i).shuffle(helperMvs)
+            jobs.append((position, limits, helperMvs))
+        #//for i
+        return jobs
+
+    def _lazyResult(self, results: List[WorkerResult]
+                    ) -> Tuple[Optional[Move], int]:
+        """ the result of the worker that got deepest, preferring
+        the main worker
+        """
+        best = results[0]
+        for r in results[1:]:
+            if r[0] is not None and r[2] > best[2]:
+                best = r
+        #//for r
+        self.depthReached = best[2]
+        return best[0], best[1]
+
+    def _splitJobs(self, b: Board, limits: Limits, mvs: List[Move]):
+        """ deal the moves out between the workers """
+        n = min(self.numWorkers, len(mvs))
+        position = (b.pack(), b.keyHistory)
+        return [(position, limits, mvs[i::n]) for i in range(n)]
+
+    def _splitResult(self, results: List[WorkerResult]
+                     ) -> Tuple[Optional[Move], int]:
+        """ the best move at the deepest iteration that all the
+        workers completed
+        """
+        depth = min(r[2] for r in results)
+        self.depthReached = depth
+        if depth == 0:
+            # no-one completed an iteration; use what we have
+            r = max(results, key=lambda r: r[1])
+            return r[0], r[1]
+        bestMove: Optional[Move] = None
+        bestScore = -search.INFINITY
+        for r in results:
+            for itDepth, mv, score in r[3]:
+                if itDepth == depth and score > bestScore:
+                    bestMove, bestScore = mv, score
+            #//for
+        #//for r
+        return bestMove, bestScore
+
+#---------------------------------------------------------------------
+
+def main():
+    b = Board.startPosition()
+    for mode in [LAZY, SPLIT]:
+        with ParallelSearch(mode=mode) as ps:
+            mv, score = ps.think(b, Limits(depth=3))
+            prn("{} with {} workers: best move {} scoring {}, {} nodes",
+                mode, ps.numWorkers, toAlmov(mv), score,
+                ps.stats['nodes'])
+
+if __name__=='__main__':
+    main()
+
+#end
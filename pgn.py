@@ -0,0 +1,205 @@
+# pgn.py = read games in PGN
+
+"""
+Read games in PGN (Portable Game Notation), a file at a time, however
+big the file is.
+
+readGames(f) is a generator over the games in file object (f). It
+reads (f) in chunks of CHUNK_SIZE characters, splits them into lines,
+and tokenises each line: tag pairs ('[Event "..."]') go into the
+game's headers, and the movetext gives its moves in SAN (e.g. "Nbd7",
+"exd6", "e8=Q+"). Comments, variations, NAGs and move numbers are
+skipped. Only one game (and one line of the file) is held in memory
+at a time.
+
+replayGames(f) also works out what each SAN move is in its position,
+and yields (headers, [(position, move), ...]) for each game.
+
+Usage:
+
+    with open("games.pgn") as f:
+        for headers, moves in pgn.replayGames(f):
+            for b, mv in moves:
+                ...
+
+SAN moves are converted with a san.MoveIndex of each position, and
+made with movegen.playMove(), which knows about castling, en passant
+and promotion to pieces other than a queen.
+"""
+
+import argparse
+import codecs
+import re
+import time
+from typing import List, Tuple, Dict, Optional, Iterator, Any
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import playMove
+from san import MoveIndex, SanError
+
+#---------------------------------------------------------------------
+
+CHUNK_SIZE = 1<<16 # characters read from the file at a time
+
+RESULTS = frozenset(["1-0", "0-1", "1/2-1/2", "*"])
+
+class PgnError(ValueError): pass
+
+#---------------------------------------------------------------------
+# reading
+
+class PgnGame:
+    """ a game, as read from a PGN file """
+
+    headers: Dict[str,str] = {}
+    sans: List[str] = []
+    result: str = "*"
+
+    def __init__(self):
+        self.headers = {}
+        self.sans = []
+
+    def __repr__(self) -> str:
+        return form("<PgnGame {} v {} {} ({} moves)>",
+                    self.headers.get("White", "?"),
+                    self.headers.get("Black", "?"),
+                    self.result, len(self.sans))
+
+    def startBoard(self) -> Board:
+        """ the position the game starts from """
+        fen = self.headers.get("FEN")
+        if fen:
+            return Board.fromFEN(fen)
+        return Board.startPosition()
+
+    def replay(self) -> Iterator[Tuple[Board,Move,Optional[Sqv]]]:
+        """ (position, move, promotion piece) for each move. Raise
+        PgnError at a move that doesn't make sense.
+        """
+        b = self.startBoard()
+        for i, san in enumerate(self.sans):
+            try:
+                mv, promo = MoveIndex(b).toMove(san)
+            except SanError as e:
+                raise PgnError(form("move {}{} {}", i//2 + 1,
+                    "." if b.mover == 'W' else "...", e))
+            yield b, mv, promo
+            b = playMove(b, mv, promo)
+        #//for
+
+def readLines(f: Any, chunkSize: int = CHUNK_SIZE) -> Iterator[str]:
+    """ the lines of file object (f), read (chunkSize) at a time.
+    Binary files are decoded as UTF-8.
+    """
+    decoder = None
+    rest = ""
+    while True:
+        chunk = f.read(chunkSize)
+        if not chunk: break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            chunk = decoder.decode(chunk)
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+    #//while
+    if rest:
+        yield rest
+
+TAG_RE = re.compile(r'^\s*\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_RE = re.compile(r"[{}();]|\$\d+|[^\s{}();]+")
+MOVE_NUMBER_RE = re.compile(r"^\d+\.+")
+
+def readGames(f: Any, chunkSize: int = CHUNK_SIZE) -> Iterator[PgnGame]:
+    """ the games in PGN file object (f) """
+    game = PgnGame()
+    inMoves = False # had movetext for (game)?
+    inComment = False # in a { comment }
+    depth = 0 # how deeply nested in ( variations )
+    for line in readLines(f, chunkSize):
+        if line.startswith("%"): continue
+        if not inComment and depth == 0:
+            m = TAG_RE.match(line)
+            if m:
+                if inMoves:
+                    yield game
+                    game, inMoves = PgnGame(), False
+                game.headers[m.group(1)] = m.group(2).replace('\\"', '"')
+                continue
+        for tok in TOKEN_RE.findall(line):
+            if inComment:
+                if tok == "}":
+                    inComment = False
+                continue
+            if tok == "{":
+                inComment = True
+            elif tok == ";":
+                break
+            elif tok == "(":
+                depth += 1
+            elif tok == ")":
+                depth = max(0, depth-1)
+            elif depth > 0 or tok.startswith("$"):
+                pass
+            elif tok in RESULTS:
+                game.result = tok
+                yield game
+                game, inMoves = PgnGame(), False
+            else:
+                tok = MOVE_NUMBER_RE.sub("", tok)
+                if tok:
+                    game.sans.append(tok)
+                    inMoves = True
+        #//for tok
+    #//for line
+    if inMoves:
+        yield game
+
+def replayGames(f: Any, chunkSize: int = CHUNK_SIZE,
+                errors: Optional[List[str]] = None
+                ) -> Iterator[Tuple[Dict[str,str],List[Tuple[Board,Move]]]]:
+    """ (headers, [(position, move), ...]) for each game in PGN file
+    object (f), where (position) is the position before (move).
+
+    If (errors) is a list, games with a move that doesn't make sense
+    are skipped, and a message added to (errors); otherwise they
+    raise PgnError.
+    """
+    for n, game in enumerate(readGames(f, chunkSize), 1):
+        try:
+            moves = [(b, mv) for b, mv, _ in game.replay()]
+        except PgnError as e:
+            if errors is None: raise
+            errors.append(form("game {}: {}", n, e))
+            continue
+        yield game.headers, moves
+    #//for
+
+#---------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="read games in PGN")
+    ap.add_argument("files", nargs="+", help="PGN files")
+    args = ap.parse_args()
+    for fn in args.files:
+        t0 = time.time()
+        games = plies = 0
+        errors: List[str] = []
+        with open(fn, encoding="utf-8", errors="replace") as f:
+            for headers, moves in replayGames(f, errors=errors):
+                games += 1
+                plies += len(moves)
+        #//with
+        t = time.time() - t0
+        prn("{}: {} games, {} moves, {} errors in {:.2f}s ({:.0f} moves/s)",
+            fn, games, plies, len(errors), t, plies/max(t, 1e-9))
+        for e in errors[:10]:
+            prn("  {}", e)
+
+if __name__=='__main__':
+    main()
+
+#end
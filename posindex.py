@@ -0,0 +1,383 @@
+# posindex.py = index of positions seen
+
+"""
+A position index is a sorted file of the Zobrist keys (see
+Board.getKey()) of a set of positions, for quickly finding out whether
+a position has been seen before, e.g. to leave out positions that have
+already been analysed.
+
+Usage:
+
+    python posindex.py build -o seen.idx -b 10 positions1.epd ...
+    python posindex.py merge -o all.idx seen1.idx seen2.idx ...
+    python posindex.py dedup -i all.idx -o new.epd positions.epd
+    python posindex.py query all.idx positions.epd
+
+Positions are read from FEN or EPD files, as analyse.py reads them.
+Two positions are the same if they have the same pieces, side to move
+and castling rights; the move counters don't matter.
+
+- build: make an index of the positions in some files. The lines are
+  dealt out in chunks to a pool of processes, which send back the
+  chunks' keys, sorted and without duplicates.
+- merge: make one index from several, e.g. ones built in parallel on
+  different machines.
+- dedup: copy the positions in a file, leaving out ones that are
+  earlier in the file or (with -i) in an index. Do this before
+  analysing them: every duplicate left out is a search saved.
+- query: print the positions in a file that are in an index.
+
+Files
+-----
+An index file is a HEADER_SIZE byte header (magic, number of keys,
+number of Bloom filter bits, number of Bloom filter hashes), then the
+keys as sorted, distinct uint64s, then the Bloom filter, if it has
+one.
+
+Looking up a key maps the file into memory and does a binary search
+on it, so only the pages that are needed are read. The Bloom filter
+(about BLOOM_BITS_PER_KEY bits per key) is much smaller than the keys,
+so it stays in memory, and most keys that aren't in the index are
+turned away by it without touching the keys at all. As the keys are
+Zobrist keys, which are already random, the filter's hashes are
+made from the key itself, (lo + i*hi) for i in 0..hashes-1, where (lo)
+and (hi) are the key's two 32-bit halves.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from multiprocessing import Pool
+from typing import List, Tuple, Dict, Optional, Iterator, Iterable, \
+    Union, TextIO
+
+import numpy as np
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from analyse import parsePosition, readChunks, Chunk
+
+#---------------------------------------------------------------------
+
+INDEX_MAGIC = b"CALIPX01"
+HEADER_SIZE = 32
+HEADER_FORMAT = "<8sQQI" # magic, keys, Bloom filter bits, hashes
+KEY_DTYPE = np.dtype('<u8')
+
+CHUNK_LINES = 10000 # positions sent to a worker at a time
+BLOOM_BITS_PER_KEY = 10 # about 1% false positives
+BLOOM_HASHES = 7
+
+#---------------------------------------------------------------------
+# reading positions
+
+def positionKey(line: str) -> Optional[int]:
+    """ the key of the FEN or EPD position in (line), or None if it's
+    blank or a comment. Raise ValueError if it's bad.
+    """
+    p = parsePosition(line)
+    if p is None: return None
+    try:
+        return Board.fromFEN(p[0]).getKey()
+    except (KeyError, IndexError):
+        raise ValueError(form("bad position {!r}", line.strip()))
+
+def chunkKeys(chunk: Chunk) -> np.ndarray:
+    """ the sorted, distinct keys of the positions in (chunk). Lines
+    that can't be read are left out.
+    """
+    keys = []
+    for _, line in chunk:
+        try:
+            k = positionKey(line)
+        except ValueError:
+            continue
+        if k is not None:
+            keys.append(k)
+    #//for
+    return np.unique(np.array(keys, dtype=KEY_DTYPE))
+
+def uniqueKeys(parts: List[np.ndarray]) -> np.ndarray:
+    """ the sorted, distinct keys in all of (parts) """
+    return np.unique(np.concatenate(parts + [np.zeros(0, KEY_DTYPE)]))
+
+#---------------------------------------------------------------------
+# the Bloom filter
+
+def bloomBits(keys: np.ndarray, numBits: int, numHashes: int
+              ) -> np.ndarray:
+    """ the filter bit numbers for (keys), shape (len(keys), numHashes) """
+    lo = keys & np.uint64(0xFFFFFFFF)
+    hi = keys >> np.uint64(32)
+    i = np.arange(numHashes, dtype=np.uint64)
+    return (lo[:, None] + i[None, :]*hi[:, None]) % np.uint64(numBits)
+
+def makeBloom(keys: np.ndarray, numBits: int, numHashes: int
+              ) -> np.ndarray:
+    """ a Bloom filter of (numBits) bits holding (keys), as bytes """
+    bloom = np.zeros(numBits // 8, dtype=np.uint8)
+    bits = bloomBits(keys, numBits, numHashes).ravel()
+    np.bitwise_or.at(bloom, bits >> np.uint64(3),
+                     (np.uint8(1) << (bits & np.uint64(7)).astype(np.uint8)))
+    return bloom
+
+def bloomSize(numKeys: int, bitsPerKey: int) -> int:
+    """ the number of filter bits for (numKeys) keys, a multiple of 64
+    (0 if there's no filter)
+    """
+    if bitsPerKey <= 0: return 0
+    return max(64, (numKeys*bitsPerKey + 63) // 64 * 64)
+
+#---------------------------------------------------------------------
+# building
+
+def allLines(filenames: List[str]) -> Iterator[str]:
+    for fn in filenames:
+        with open(fn) as f:
+            yield from f
+
+def buildIndex(filenames: List[str], outFile: str,
+               bitsPerKey: int = 0,
+               numWorkers: Optional[int] = None,
+               chunkLines: int = CHUNK_LINES) -> int:
+    """ make index file (outFile) of the positions in (filenames),
+    using a pool of (numWorkers) processes (default: one per CPU; 0
+    means don't use a pool), with a Bloom filter of (bitsPerKey) bits
+    per key (0 for none). Return the number of keys.
+    """
+    chunks = readChunks(allLines(filenames), chunkLines)
+    if numWorkers == 0:
+        parts = [chunkKeys(c) for c in chunks]
+    else:
+        with Pool(numWorkers or os.cpu_count() or 1) as pool:
+            parts = list(pool.imap_unordered(chunkKeys, chunks))
+    keys = uniqueKeys(parts)
+    writeIndex(outFile, keys, bitsPerKey)
+    return len(keys)
+
+def mergeIndexes(filenames: List[str], outFile: str,
+                 bitsPerKey: int = 0) -> int:
+    """ make index file (outFile) of all the keys in the indexes
+    (filenames). Return the number of keys.
+    """
+    parts = []
+    for fn in filenames:
+        with PositionIndex(fn) as ix:
+            parts.append(ix.keys.copy())
+    #//for
+    keys = uniqueKeys(parts)
+    writeIndex(outFile, keys, bitsPerKey)
+    return len(keys)
+
+def writeIndex(filename: str, keys: np.ndarray, bitsPerKey: int = 0):
+    """ write sorted, distinct (keys) to (filename) """
+    d = os.path.dirname(filename)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    numBits = bloomSize(len(keys), bitsPerKey)
+    numHashes = BLOOM_HASHES if numBits else 0
+    header = struct.pack(HEADER_FORMAT, INDEX_MAGIC, len(keys), numBits,
+                         numHashes)
+    with open(filename, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(keys.astype(KEY_DTYPE).tobytes())
+        if numBits:
+            f.write(makeBloom(keys, numBits, numHashes).tobytes())
+
+#---------------------------------------------------------------------
+# looking up
+
+class PositionIndex:
+    """ an index file, mapped into memory """
+
+    filename: str = ""
+    numKeys: int = 0
+    numBits: int = 0 # in the Bloom filter, 0 if there isn't one
+    numHashes: int = 0
+    mm: Optional[mmap.mmap] = None
+    keys: np.ndarray # view of the keys in (mm)
+    bloom: Optional[np.ndarray] = None
+    stats: Dict[str,int]
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.keys = np.zeros(0, KEY_DTYPE)
+        self.stats = {'lookups': 0, 'bloomRejects': 0, 'found': 0}
+        with open(filename, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(form("{}: not a position index", filename))
+            magic, n, numBits, numHashes = struct.unpack_from(
+                HEADER_FORMAT, header)
+            if magic != INDEX_MAGIC:
+                raise ValueError(form("{}: not a position index", filename))
+            self.numKeys = n
+            self.numBits = numBits
+            self.numHashes = numHashes
+            size = HEADER_SIZE + n*KEY_DTYPE.itemsize + numBits//8
+            if os.fstat(f.fileno()).st_size != size:
+                raise ValueError(form("{}: wrong length", filename))
+            if n > 0:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.keys = np.frombuffer(self.mm, KEY_DTYPE, n, HEADER_SIZE)
+                if numBits:
+                    self.bloom = np.frombuffer(self.mm, np.uint8, numBits//8,
+                        HEADER_SIZE + n*KEY_DTYPE.itemsize).copy()
+
+    def __repr__(self) -> str:
+        return form("<PositionIndex {} ({} keys)>",
+                    self.filename, self.numKeys)
+
+    def __len__(self) -> int:
+        return self.numKeys
+
+    def close(self):
+        if self.mm is not None:
+            self.keys = np.zeros(0, KEY_DTYPE)
+            self.mm.close()
+            self.mm = None
+
+    def __enter__(self) -> 'PositionIndex':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, item: Union[Board, int]) -> bool:
+        """ is position or key (item) in the index? """
+        key = item.getKey() if isinstance(item, Board) else item
+        self.stats['lookups'] += 1
+        if self.numKeys == 0: return False
+        if self.bloom is not None:
+            lo, hi = key & 0xFFFFFFFF, key >> 32
+            for i in range(self.numHashes):
+                bit = (lo + i*hi) % self.numBits
+                if not self.bloom[bit >> 3] >> (bit & 7) & 1:
+                    self.stats['bloomRejects'] += 1
+                    return False
+            #//for
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+        found = i < self.numKeys and int(self.keys[i]) == key
+        self.stats['found'] += found
+        return found
+
+    def containsKeys(self, keys: np.ndarray) -> np.ndarray:
+        """ for each of (keys), is it in the index? """
+        keys = np.asarray(keys, KEY_DTYPE)
+        self.stats['lookups'] += len(keys)
+        found = np.zeros(len(keys), dtype=bool)
+        if self.numKeys == 0: return found
+        maybe = np.ones(len(keys), dtype=bool)
+        if self.bloom is not None:
+            bits = bloomBits(keys, self.numBits, self.numHashes)
+            set_ = self.bloom[bits >> np.uint64(3)] \
+                   >> (bits & np.uint64(7)).astype(np.uint8) & 1
+            maybe = set_.all(axis=1)
+            self.stats['bloomRejects'] += int((~maybe).sum())
+        ks = keys[maybe]
+        ix = np.searchsorted(self.keys, ks)
+        ix[ix >= self.numKeys] = 0
+        found[maybe] = self.keys[ix] == ks
+        self.stats['found'] += int(found.sum())
+        return found
+
+#---------------------------------------------------------------------
+
+def dedup(f: Iterable[str], out: TextIO,
+          index: Optional[PositionIndex] = None,
+          errors: Optional[List[str]] = None) -> Tuple[int,int]:
+    """ copy the positions in (f) to (out), leaving out ones that are
+    in (index) or earlier in (f). Blank lines and comments are left
+    out; lines that can't be read are left out, and if (errors) is
+    given, a message for each is added to it. Return (positions
+    written, positions left out).
+    """
+    seen = set()
+    kept = dropped = 0
+    for n, line in enumerate(f, 1):
+        try:
+            k = positionKey(line)
+        except ValueError as e:
+            if errors is not None:
+                errors.append(form("line {}: {}", n, e))
+            continue
+        if k is None: continue
+        if k in seen or (index is not None and k in index):
+            dropped += 1
+            continue
+        seen.add(k)
+        out.write(line if line.endswith("\n") else line + "\n")
+        kept += 1
+    #//for
+    return kept, dropped
+
+#---------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="index of positions seen")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="make an index of positions")
+    p.add_argument("positions", nargs="+", help="FEN or EPD files")
+    p.add_argument("-o", "--out", required=True, help="index to write")
+    p.add_argument("-b", "--bloom", type=int, default=0,
+        help=form("Bloom filter bits per key (0 for none, try {})",
+                  BLOOM_BITS_PER_KEY))
+    p.add_argument("-w", "--workers", type=int, default=None,
+                   help="worker processes (default: one per CPU)")
+    p = sub.add_parser("merge", help="merge indexes")
+    p.add_argument("indexes", nargs="+", help="index files")
+    p.add_argument("-o", "--out", required=True, help="index to write")
+    p.add_argument("-b", "--bloom", type=int, default=0,
+                   help="Bloom filter bits per key (0 for none)")
+    p = sub.add_parser("dedup", help="leave out positions seen before")
+    p.add_argument("positions", help="FEN or EPD file")
+    p.add_argument("-i", "--index", default=None,
+                   help="also leave out positions in this index")
+    p.add_argument("-o", "--out", default=None,
+                   help="file to write (default: stdout)")
+    p = sub.add_parser("query", help="show positions in an index")
+    p.add_argument("index", help="index file")
+    p.add_argument("positions", help="FEN or EPD file")
+    args = ap.parse_args()
+
+    t0 = time.time()
+    if args.command == "build":
+        n = buildIndex(args.positions, args.out, args.bloom, args.workers)
+        prn("{}: {} positions in {:.2f}s", args.out, n, time.time() - t0)
+    elif args.command == "merge":
+        n = mergeIndexes(args.indexes, args.out, args.bloom)
+        prn("{}: {} positions in {:.2f}s", args.out, n, time.time() - t0)
+    elif args.command == "dedup":
+        index = PositionIndex(args.index) if args.index else None
+        out = open(args.out, "w") if args.out else sys.stdout
+        errors: List[str] = []
+        try:
+            with open(args.positions) as f:
+                kept, dropped = dedup(f, out, index, errors)
+        finally:
+            if args.out: out.close()
+            if index is not None: index.close()
+        for e in errors:
+            print(e, file=sys.stderr)
+        print(form("{} positions kept, {} left out", kept, dropped),
+              file=sys.stderr)
+    else:
+        with PositionIndex(args.index) as index, \
+             open(args.positions) as f:
+            for line in f:
+                try:
+                    k = positionKey(line)
+                except ValueError:
+                    continue
+                if k is not None and k in index:
+                    print(line.rstrip("\n"))
+            #//for
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -0,0 +1,287 @@
+# san.py = moves in Standard Algebraic Notation
+
+"""
+Moves in SAN (Standard Algebraic Notation), as used in PGN files and
+by most people: "e4", "Nbd7", "exd6", "R1a3", "e8=Q+", "O-O-O".
+
+A MoveIndex is made for a position, and finds the moves to a square
+by looking out from that square (as movegen.isAttacked() does). It
+keeps them by (piece, destination), so converting a SAN move needs no
+move generation and no strings: the SAN is parsed (parseSan()
+remembers the ones it has seen), and the moves of that piece to that
+square are looked up. Only if more than one is left are they checked
+for legality (SAN doesn't disambiguate from a pinned piece).
+
+Making SAN uses the same index for disambiguation, and movegen's
+check detection for "+" and "#".
+
+Usage:
+
+    mv, promo = sanToMove(b, "Nf3")
+    s = moveToSan(b, mv)
+
+Castling and en passant are made with movegen.playMove(). Whether
+castling or en passant is allowed isn't known (the Board doesn't keep
+the en passant square), so "O-O" only needs the king on its square,
+and a pawn can take en passant whenever there's a pawn to take.
+"""
+
+import time
+from typing import List, Tuple, Dict, Optional
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import (pmovs, isCastling, isEnPassant, playMove, inCheck,
+                     leavesKingAttacked, legalMoves)
+
+#---------------------------------------------------------------------
+
+class SanError(ValueError): pass
+
+CASTLE_SHORT = "O-O"
+CASTLE_LONG = "O-O-O"
+
+# (piece letter ("P" for pawns, or CASTLE_SHORT/CASTLE_LONG), from file
+# (0 if not given), from rank (0 if not given), destination, promotion
+# piece letter or None)
+SanParts = Tuple[str, File, Rank, Sqix, Optional[str]]
+
+MAX_SAN_CACHE = 1<<16
+_sanCache: Dict[str,SanParts] = {}
+
+def parseSan(san: str) -> SanParts:
+    """ the parts of move (san). Raise SanError if it isn't SAN. """
+    r = _sanCache.get(san)
+    if r is None:
+        r = _parseSan(san)
+        if len(_sanCache) < MAX_SAN_CACHE:
+            _sanCache[san] = r
+    return r
+
+def _parseSan(san: str) -> SanParts:
+    s = san.rstrip("+#!?").replace("0", "O")
+    if s in (CASTLE_SHORT, CASTLE_LONG):
+        return (s, 0, 0, 0, None)
+    promo = None
+    if len(s) > 2 and s[-1] in "NBRQ" and (s[-2] == "=" or s[-2] in "18"):
+        promo = s[-1]
+        s = s[:-2] if s[-2] == "=" else s[:-1]
+    if len(s) < 2 or not ("a" <= s[-2] <= "h" and "1" <= s[-1] <= "8"):
+        raise SanError(form("{}: not a SAN move", san))
+    dest = toSqix(s[-2:])
+    s = s[:-2]
+    piece = "P"
+    if s and s[0] in "NBRQK":
+        piece, s = s[0], s[1:]
+    if s.endswith("x"):
+        s = s[:-1]
+    fromFile = fromRank = 0
+    for ch in s:
+        if "a" <= ch <= "h" and not fromFile and not fromRank:
+            fromFile = ord(ch) - ord("a") + 1
+        elif "1" <= ch <= "8" and not fromRank:
+            fromRank = int(ch)
+        else:
+            raise SanError(form("{}: not a SAN move", san))
+    #//for ch
+    if promo and piece != "P":
+        raise SanError(form("{}: only pawns promote", san))
+    return (piece, fromFile, fromRank, dest, promo)
+
+#---------------------------------------------------------------------
+
+def sqFile(sx: Sqix) -> File:
+    return (sx - 10) // 10
+
+def sqRank(sx: Sqix) -> Rank:
+    return sx % 10
+
+class MoveIndex:
+    """ the mover's moves in a position, by (piece, destination),
+    found when they are first asked for
+    """
+
+    b: Board
+    byDest: Dict[Tuple[Sqv,Sqix],List[Move]] = {}
+
+    def __init__(self, b: Board):
+        self.b = b
+        self.byDest = {}
+
+    def movesTo(self, pv: Sqv, dest: Sqix) -> List[Move]:
+        """ the moves of piece (pv) to (dest) """
+        key = (pv, dest)
+        r = self.byDest.get(key)
+        if r is None:
+            r = self.byDest[key] = self._findMovesTo(pv, dest)
+        return r
+
+    def _findMovesTo(self, pv: Sqv, dest: Sqix) -> List[Move]:
+        sq = self.b.sq
+        p = self.b.mover
+        target = sq[dest]
+        if target == OFFBOARD or isPlayer(target, p):
+            return []
+        r: List[Move] = []
+        if pv in pawnSet:
+            if p == 'W':
+                fwd, caps, start, enemyPawn = WP_MOV, WP_CAPTURE, 2, BP
+            else:
+                fwd, caps, start, enemyPawn = BP_MOV, BP_CAPTURE, 7, WP
+            if target == EMPTY:
+                if sq[dest-fwd] == pv:
+                    r.append((dest-fwd, dest))
+                elif (sq[dest-fwd] == EMPTY and sq[dest-2*fwd] == pv
+                      and sqRank(dest-2*fwd) == start):
+                    r.append((dest-2*fwd, dest))
+            for d in caps:
+                org = dest - d
+                if sq[org] == pv and (target != EMPTY or
+                        sq[frix(sqFile(dest), sqRank(org))] == enemyPawn):
+                    r.append((org, dest))
+            #//for d
+        elif pv in knightSet or pv in kingSet:
+            for d in (N_MOV if pv in knightSet else Q_DIR):
+                if sq[dest+d] == pv:
+                    r.append((dest+d, dest))
+        else:
+            if pv in bishopSet:
+                ds = B_DIR
+            elif pv in rookSet:
+                ds = R_DIR
+            else:
+                ds = Q_DIR
+            for d in ds:
+                org = dest + d
+                while sq[org] == EMPTY:
+                    org += d
+                if sq[org] == pv:
+                    r.append((org, dest))
+            #//for d
+        return r
+
+    def toMove(self, san: str) -> Tuple[Move, Optional[Sqv]]:
+        """ the move that (san) means, and what piece a pawn promotes
+        to (None if it isn't a promotion). Raise SanError if there
+        isn't exactly one such move.
+        """
+        piece, fromFile, fromRank, dest, promo = parseSan(san)
+        b = self.b
+        white = b.mover == 'W'
+        if piece in (CASTLE_SHORT, CASTLE_LONG):
+            rank = "1" if white else "8"
+            to = "g" if piece == CASTLE_SHORT else "c"
+            mv = almovMov("e" + rank + to + rank)
+            if not isCastling(b, mv) or b.sq[mv[0]] != (WK if white else BK):
+                raise SanError(form("{}: the king can't castle", san))
+            return mv, None
+        pv = piece if white else piece.lower()
+        cands = self.movesTo(pv, dest)
+        if fromFile:
+            cands = [mv for mv in cands if sqFile(mv[0]) == fromFile]
+        if fromRank:
+            cands = [mv for mv in cands if sqRank(mv[0]) == fromRank]
+        if len(cands) > 1:
+            cands = [mv for mv in cands if not leavesKingAttacked(b, mv)]
+        if len(cands) != 1:
+            raise SanError(form("{}: {} moves match", san, len(cands)))
+        promoPiece: Optional[Sqv] = None
+        if promo:
+            promoPiece = promo if white else promo.lower()
+        return cands[0], promoPiece
+
+    def toSan(self, mv: Move, promo: Optional[Sqv] = None,
+              checks: bool = True) -> str:
+        """ move (mv) in SAN; a pawn promotes to (promo) (default: a
+        queen). If (checks), "+" or "#" is added for check or mate.
+        Raise SanError if (mv) isn't a move here.
+        """
+        b = self.b
+        sqFrom, sqTo = mv
+        pv = b.sq[sqFrom]
+        if isCastling(b, mv):
+            s = CASTLE_SHORT if sqTo > sqFrom else CASTLE_LONG
+        elif mv not in self.movesTo(pv, sqTo):
+            raise SanError(form("{}: not a move", toAlmov(mv)))
+        elif pv in pawnSet:
+            s = toAlge(sqTo)
+            if sqFile(sqFrom) != sqFile(sqTo):
+                s = toAlge(sqFrom)[0] + "x" + s
+            if sqRank(sqTo) in (1, 8):
+                s += "=" + (promo or WQ).upper()
+        else:
+            others = [m for m in self.movesTo(pv, sqTo) if m != mv]
+            if others:
+                others = [m for m in others
+                          if not leavesKingAttacked(b, m)]
+            dis = ""
+            if others:
+                if all(sqFile(m[0]) != sqFile(sqFrom) for m in others):
+                    dis = toAlge(sqFrom)[0]
+                elif all(sqRank(m[0]) != sqRank(sqFrom) for m in others):
+                    dis = toAlge(sqFrom)[1]
+                else:
+                    dis = toAlge(sqFrom)
+            capture = "x" if b.sq[sqTo] != EMPTY else ""
+            s = pv.upper() + dis + capture + toAlge(sqTo)
+        if checks:
+            b2 = playMove(b, mv, promo)
+            if inCheck(b2, b2.mover):
+                s += "+" if legalMoves(b2) else "#"
+        return s
+
+#---------------------------------------------------------------------
+
+def sanToMove(b: Board, san: str) -> Tuple[Move, Optional[Sqv]]:
+    """ the move (san) in position (b), and what a pawn promotes to """
+    return MoveIndex(b).toMove(san)
+
+def moveToSan(b: Board, mv: MovAlmov, promo: Optional[Sqv] = None,
+              checks: bool = True) -> str:
+    """ move (mv) in position (b), in SAN """
+    return MoveIndex(b).toSan(toMov(mv), promo, checks)
+
+def movesToSan(b: Board, mvs: List[MovAlmov]) -> List[str]:
+    """ a line of moves (mvs), starting from (b), in SAN """
+    r = []
+    for mv in mvs:
+        mv = toMov(mv)
+        r.append(moveToSan(b, mv))
+        b = playMove(b, mv)
+    #//for
+    return r
+
+#---------------------------------------------------------------------
+
+def main():
+    """ time converting the moves of random games """
+    import random
+    rnd = random.Random(1)
+    games = []
+    for _ in range(50):
+        b = Board.startPosition()
+        line = []
+        for _ in range(60):
+            mvs = legalMoves(b)
+            if not mvs: break
+            mv = rnd.choice(mvs)
+            line.append((b, mv))
+            b = b.makeMove(mv)
+        games.append(line)
+    #//for
+    n = sum(len(g) for g in games)
+    t0 = time.time()
+    sans = [[moveToSan(b, mv) for b, mv in g] for g in games]
+    t1 = time.time()
+    for g, ss in zip(games, sans):
+        for (b, mv), s in zip(g, ss):
+            assert sanToMove(b, s)[0] == mv
+    t2 = time.time()
+    prn("{} moves: to SAN {:.1f}us/move, from SAN {:.1f}us/move",
+        n, (t1-t0)/n*1e6, (t2-t1)/n*1e6)
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -0,0 +1,538 @@
+# search.py = search the game tree for the best move
+
+"""
+Search the game tree for the best move, using negamax with
+alpha-beta pruning.
+
+Scores inside the search are from the point of view of the player
+to move (+ve is good for the mover). evalpos.staticEval() scores are
++ve for white, so they are negated when black is to move.
+
+There is no check detection, so the search plays pseudo-moves and a
+line ends when a king is captured (scoring MATE).
+
+The search is selective. These forward-pruning techniques can each be
+switched on or off, and each keeps node-count statistics (in
+Search.stats) so their effect can be measured:
+
+- null-move pruning (useNullMove)
+- late move reductions (useLmr)
+- futility pruning at frontier nodes (useFutility)
+
+Positions with few pieces can be scored from endgame tablebases (see
+tablebase.py) instead of being searched. Likewise, in positions that
+are in the opening book (see book.py), think() plays a book move.
+
+At the leaves, only whether the score is inside (alpha, beta) matters,
+so evaluation is lazy (useLazyEval): see evalpos.lazyEval().
+
+Search.think() does iterative deepening within Limits on depth, nodes
+and wall-clock time. It always returns the best move from the last
+completed iteration.
+
+Results are kept in a transposition table (see transtable.py), which
+can be shared with other Searches. Static evaluations are kept in an
+evalpos.EvalCache; anything with the same methods can be used instead,
+e.g. an evalprofile.EvalProfiler or a nnue.NnueEval.
+"""
+
+import math
+import time
+from typing import List, Tuple, Dict, Optional
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+from movegen import pmovs
+import evalpos
+import transtable
+from transtable import TransTable, EXACT, LOWER, UPPER
+from tablebase import TablebaseSet
+from book import OpeningBook
+
+#---------------------------------------------------------------------
+# constants
+
+MATE = 100000 # score for capturing the enemy king
+INFINITY = MATE + 1
+MAX_DEPTH = 64 # no search goes deeper than this
+DRAW = 0 # score for a draw by repetition, fifty moves or material
+
+CHECK_NODES = 256 # check the limits every this many nodes
+
+TT_ENTRIES = 1<<16 # default transposition table size
+
+""" null-move pruning: the mover passes, and we search to a reduced
+depth. If the mover is still doing well enough to cause a beta cutoff,
+we assume a real move would too. This is unsafe in zugzwang, which
+is mostly a problem when the mover has only pawns, so we require some
+non-pawn material.
+"""
+NULL_MIN_DEPTH = 3 # don't try a null move with less depth than this
+NULL_REDUCTION = 2 # the null-move search is this much shallower...
+NULL_REDUCTION_DEEP = 3 # ...or this much at depth >= NULL_DEEP
+NULL_DEEP = 6
+NULL_MIN_MATERIAL = evalpos.B_VALUE # non-pawn material the mover needs
+
+""" late move reductions: quiet moves late in the move ordering are
+searched to a reduced depth with a null window. If one does better
+than expected, it is searched again at full depth.
+"""
+LMR_MIN_DEPTH = 3 # don't reduce with less depth than this
+LMR_MIN_MOVES = 3 # number of moves searched before we start reducing
+LMR_MAX_DEPTH = 32
+LMR_MAX_MOVES = 64
+
+def calcLmrTable() -> List[List[int]]:
+    """ lmrTable[depth][moveNum] is the number of plies to reduce
+    the (moveNum)th move (counting from 1) by, at (depth).
+    """
+    t = [[0]*(LMR_MAX_MOVES+1) for _ in range(LMR_MAX_DEPTH+1)]
+    for depth in range(1, LMR_MAX_DEPTH+1):
+        for moveNum in range(1, LMR_MAX_MOVES+1):
+            r = int(0.75 + math.log(depth)*math.log(moveNum)/2.25)
+            t[depth][moveNum] = max(0, min(r, depth-2))
+    return t
+
+lmrTable = calcLmrTable()
+
+def lmrReduction(depth: int, moveNum: int) -> int:
+    """ how many plies to reduce a late move by """
+    return lmrTable[min(depth, LMR_MAX_DEPTH)][min(moveNum, LMR_MAX_MOVES)]
+
+""" futility pruning: near the leaves, if the static evaluation is so
+far below alpha that a quiet move is unlikely to bring it back, don't
+search quiet moves at all.
+"""
+FUTILITY_MARGIN = [0, 200, 500] # by remaining depth; deeper isn't pruned
+
+STAT_NAMES = [
+    'nodes',           # calls to negamax(), including the root's children
+    'draws',           # positions scored as drawn without searching
+    'evals',           # static evaluations (including from the cache)
+    'nullMoveTries',   # null-move searches done
+    'nullMoveCutoffs', # ...which caused a cutoff
+    'lmrReductions',   # moves searched at reduced depth
+    'lmrResearches',   # ...which had to be searched again at full depth
+    'futilityPrunes',  # quiet moves not searched because futile
+    'ttProbes',        # transposition table lookups
+    'ttHits',          # ...which found the position
+    'ttCutoffs',       # ...which made searching the position unnecessary
+    'lazySkips',       # leaf evaluations that didn't need mobility
+    'tbHits',          # positions scored from the tablebases
+    'bookHits',        # moves played from the opening book
+]
+
+#---------------------------------------------------------------------
+# limits
+
+class SearchAborted(Exception): pass
+
+class Limits:
+    """ when to stop searching. A search stops after (depth) plies,
+    or (nodes) nodes, or (seconds) of wall-clock time, whichever
+    comes first. None means no limit.
+
+    Node limits don't depend on the speed of the machine, so use them
+    (and not time limits) when results must be reproducible.
+    """
+    depth: int = MAX_DEPTH
+    nodes: Optional[int] = None
+    seconds: Optional[float] = None
+
+    def __init__(self, depth: int = MAX_DEPTH,
+                       nodes: Optional[int] = None,
+                       seconds: Optional[float] = None):
+        self.depth = min(depth, MAX_DEPTH)
+        self.nodes = nodes
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        return form("Limits(depth={}, nodes={}, seconds={})",
+                    self.depth, self.nodes, self.seconds)
+
+#---------------------------------------------------------------------
+
+def isCapture(b: Board, mv: Move) -> bool:
+    """ does move (mv) capture a piece? """
+    return b.sq[mv[1]] != EMPTY
+
+def isPromotion(b: Board, mv: Move) -> bool:
+    """ does move (mv) promote a pawn? """
+    src, dest = mv
+    rk = dest % 10
+    return b.sq[src] in pawnSet and (rk==8 or rk==1)
+
+def isQuiet(b: Board, mv: Move) -> bool:
+    """ is (mv) a quiet move, i.e. not a capture or promotion? """
+    return not isCapture(b, mv) and not isPromotion(b, mv)
+
+def orderMoves(b: Board, mvs: List[Move]) -> List[Move]:
+    """ put moves in a good order for alpha-beta: captures first,
+    most valuable victim first, then least valuable attacker. Then
+    the quiet moves, in generated order.
+    """
+    captures = []
+    quiets = []
+    for mv in mvs:
+        src, dest = mv
+        victim = b.sq[dest]
+        if victim == EMPTY:
+            quiets.append(mv)
+        else:
+            key = (abs(evalpos.pieceValues[victim])*16
+                   - abs(evalpos.pieceValues[b.sq[src]])//100)
+            captures.append((key, mv))
+    #//for mv
+    captures.sort(key=lambda km: km[0], reverse=True)
+    return [mv for _, mv in captures] + quiets
+
+#---------------------------------------------------------------------
+
+class Search:
+    """ a negamax alpha-beta searcher, with statistics """
+
+    #----- options:
+    useNullMove: bool = True
+    useLmr: bool = True
+    useFutility: bool = True
+    useLazyEval: bool = True
+
+    #----- statistics:
+    stats: Dict[str,int] = {}
+
+    tt: TransTable
+    evalCache: evalpos.EvalCache
+    params: Optional[evalpos.EvalParams] = None # None means the defaults
+    tablebases: Optional[TablebaseSet] = None
+    book: Optional[OpeningBook] = None
+
+    #----- limits, set up by think():
+    maxNodes: Optional[int] = None
+    deadline: Optional[float] = None # compared with time.time()
+    nextCheck: int = CHECK_NODES # check limits when nodes gets here
+
+    #----- results of think():
+    depthReached: int = 0 # last iteration that completed
+    elapsed: float = 0.0 # seconds taken
+    rootBest: Optional[Tuple[Move,int]] = None # best so far at root
+    # (depth, best move, score) for each completed iteration:
+    iterations: List[Tuple[int,Move,int]] = []
+
+    def __init__(self, useNullMove: bool = True,
+                       useLmr: bool = True,
+                       useFutility: bool = True,
+                       tt: Optional[TransTable] = None,
+                       evalCache: Optional[evalpos.EvalCache] = None,
+                       useLazyEval: bool = True,
+                       params: Optional[evalpos.EvalParams] = None,
+                       tablebases: Optional[TablebaseSet] = None,
+                       book: Optional[OpeningBook] = None):
+        """ (params) are the evaluation weights; a given (evalCache)
+        should use the same ones. Positions in (tablebases) are
+        scored from them, not searched. think() plays moves from
+        (book) without searching.
+        """
+        self.useNullMove = useNullMove
+        self.useLmr = useLmr
+        self.useFutility = useFutility
+        self.useLazyEval = useLazyEval
+        self.params = params
+        self.tablebases = tablebases
+        self.book = book
+        if tt is None:
+            tt = TransTable(TT_ENTRIES)
+        self.tt = tt
+        if evalCache is None:
+            evalCache = evalpos.EvalCache(params=params)
+        self.evalCache = evalCache
+        self.resetStats()
+
+    def resetStats(self):
+        self.stats = {name: 0 for name in STAT_NAMES}
+        self.nextCheck = CHECK_NODES
+
+    def checkLimits(self):
+        """ called every CHECK_NODES nodes or so. Raise SearchAborted
+        if we have run out of nodes or time.
+        """
+        nodes = self.stats['nodes']
+        self.nextCheck = nodes + CHECK_NODES
+        if self.maxNodes is not None:
+            if nodes >= self.maxNodes:
+                raise SearchAborted
+            self.nextCheck = min(self.nextCheck, self.maxNodes)
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise SearchAborted
+
+    def think(self, b: Board, limits: Limits,
+              rootMoves: Optional[List[Move]] = None
+              ) -> Tuple[Optional[Move], int]:
+        """ search position (b) by iterative deepening, until one of
+        (limits) is reached. Return the best move from the last
+        iteration that completed, and its score for the mover.
+
+        If not even the first iteration completes, return the best
+        move found so far (or the first move generated).
+
+        If (rootMoves) is given, only those moves are considered,
+        and they are searched in that order.
+
+        If there is a move for (b) in the opening book, return it
+        without searching, with a score of 0.
+        """
+        startTime = time.time()
+        self.resetStats()
+        self.maxNodes = limits.nodes
+        if limits.nodes is not None:
+            self.nextCheck = min(self.nextCheck, limits.nodes)
+        self.deadline = None
+        if limits.seconds is not None:
+            self.deadline = startTime + limits.seconds
+        self.depthReached = 0
+        self.rootBest = None
+        self.iterations = []
+
+        bestMove: Optional[Move] = None
+        bestScore = 0
+        if self.book is not None:
+            bestMove = self.book.choose(b, rootMoves)
+            if bestMove is not None:
+                self.stats['bookHits'] += 1
+                self.elapsed = time.time() - startTime
+                return bestMove, bestScore
+        try:
+            for depth in range(1, limits.depth+1):
+                mv, score = self.search(b, depth, bestMove, rootMoves)
+                bestMove, bestScore = mv, score
+                self.depthReached = depth
+                if mv is not None:
+                    self.iterations.append((depth, mv, score))
+                if mv is None or abs(score) >= MATE//2: break
+            #//for depth
+        except SearchAborted:
+            if bestMove is None and self.rootBest is not None:
+                bestMove, bestScore = self.rootBest
+            if bestMove is None:
+                mvs = rootMoves or orderMoves(b, pmovs(b, b.mover))
+                if mvs: bestMove = mvs[0]
+        finally:
+            self.maxNodes = None
+            self.deadline = None
+            self.elapsed = time.time() - startTime
+        return bestMove, bestScore
+
+    def principalVariation(self, b: Board, firstMove: Optional[Move],
+                           maxLen: int = MAX_DEPTH) -> List[Move]:
+        """ the line of best moves from (b), starting with (firstMove)
+        (from think()) and then following the transposition table's
+        best moves, until one is missing, isn't possible, or would
+        repeat a position
+        """
+        pv: List[Move] = []
+        seen = set()
+        mv = firstMove
+        while mv is not None and len(pv) < maxLen:
+            if mv not in pmovs(b, b.mover): break
+            seen.add(b.getKey())
+            pv.append(mv)
+            b = b.makeMove(mv)
+            if b.getKey() in seen: break
+            entry = self.tt.probe(b.getKey())
+            mv = entry[0] if entry is not None else None
+        #//while
+        return pv
+
+    def statsStr(self) -> str:
+        """ the statistics, as a string for printing """
+        s = ""
+        for name in STAT_NAMES:
+            s += form("{:>16} {:>10}\n", name, self.stats[name])
+        s += form("{:>16} {:>10.1%}\n", "evalCacheHits",
+                  self.evalCache.hitRate())
+        return s
+
+    def evaluate(self, b: Board) -> int:
+        """ static evaluation from the mover's point of view """
+        self.stats['evals'] += 1
+        v = self.evalCache.staticEval(b)
+        return v if b.mover=='W' else -v
+
+    def evaluateLeaf(self, b: Board, alpha: int, beta: int) -> int:
+        """ static evaluation from the mover's point of view, clamped
+        to [alpha, beta]. Evaluation is lazy if (useLazyEval).
+        """
+        if not self.useLazyEval:
+            return max(alpha, min(beta, self.evaluate(b)))
+        self.stats['evals'] += 1
+        if b.mover == 'W':
+            v, exact = self.evalCache.lazyEval(b, alpha, beta)
+        else:
+            v, exact = self.evalCache.lazyEval(b, -beta, -alpha)
+            v = -v
+        if not exact:
+            self.stats['lazySkips'] += 1
+        return max(alpha, min(beta, v))
+
+    def search(self, b: Board, depth: int,
+               firstMove: Optional[Move] = None,
+               rootMoves: Optional[List[Move]] = None
+               ) -> Tuple[Optional[Move], int]:
+        """ search position (b) to (depth) plies. Return the best
+        move (None if there are no moves) and its score for the mover.
+        If (firstMove) is given, it is searched first. If (rootMoves)
+        is given, only those moves are searched.
+        """
+        if rootMoves is None:
+            mvs = orderMoves(b, pmovs(b, b.mover))
+        else:
+            mvs = rootMoves[:]
+        if firstMove in mvs:
+            mvs.remove(firstMove)
+            mvs.insert(0, firstMove)
+        self.evalCache.prepare(b)
+        bestMove: Optional[Move] = None
+        alpha = -INFINITY
+        for mv in mvs:
+            if b.sq[mv[1]] in kingSet:
+                self.rootBest = (mv, MATE)
+                return mv, MATE
+            b2 = b.makeMove(mv)
+            score = -self.negamax(b2, depth-1, -INFINITY, -alpha, 1, True)
+            if bestMove is None or score > alpha:
+                bestMove = mv
+                alpha = score
+                self.rootBest = (mv, score)
+        #//for mv
+        return bestMove, alpha
+
+    def negamax(self, b: Board, depth: int, alpha: int, beta: int,
+                ply: int, allowNull: bool) -> int:
+        """ return the score of position (b) for the mover, searched to
+        (depth) plies. (ply) is the distance from the root.
+        Fail-hard: the result is clamped to [alpha, beta].
+        """
+        self.stats['nodes'] += 1
+        if self.stats['nodes'] >= self.nextCheck:
+            self.checkLimits()
+
+        #>>>>> drawn by repetition, the fifty-move rule or material
+        if b.isDraw(repeats=1):
+            self.stats['draws'] += 1
+            return max(alpha, min(beta, DRAW))
+
+        #>>>>> look in the tablebases
+        if self.tablebases is not None:
+            tbScore = self.tablebases.probeScore(b, ply, MATE)
+            if tbScore is not None:
+                self.stats['tbHits'] += 1
+                return max(alpha, min(beta, tbScore))
+
+        if depth <= 0:
+            return self.evaluateLeaf(b, alpha, beta)
+
+        #>>>>> look in the transposition table
+        key = b.getKey()
+        ttMove: Optional[Move] = None
+        self.stats['ttProbes'] += 1
+        entry = self.tt.probe(key)
+        if entry is not None:
+            self.stats['ttHits'] += 1
+            ttMove, ttScore, ttDepth, ttFlag = entry
+            if ttDepth >= depth and (ttFlag == EXACT
+                or (ttFlag == LOWER and ttScore >= beta)
+                or (ttFlag == UPPER and ttScore <= alpha)):
+                self.stats['ttCutoffs'] += 1
+                return max(alpha, min(beta, ttScore))
+
+        mvs = orderMoves(b, pmovs(b, b.mover))
+        if not mvs:
+            return self.evaluateLeaf(b, alpha, beta)
+        if b.sq[mvs[0][1]] in kingSet:
+            # king captures are ordered first
+            return beta
+        if ttMove in mvs:
+            # (checking it's in mvs also guards against key collisions)
+            mvs.remove(ttMove)
+            mvs.insert(0, ttMove)
+
+        staticV: Optional[int] = None
+
+        #>>>>> null-move pruning
+        if (self.useNullMove and allowNull and depth >= NULL_MIN_DEPTH
+            and beta < MATE//2
+            and (evalpos.nonPawnMaterial(b, b.mover, self.params)
+                 >= NULL_MIN_MATERIAL)):
+            staticV = self.evaluate(b)
+            if staticV >= beta:
+                r = NULL_REDUCTION_DEEP if depth >= NULL_DEEP \
+                    else NULL_REDUCTION
+                self.stats['nullMoveTries'] += 1
+                score = -self.negamax(b.makeNullMove(), depth-1-r,
+                                      -beta, -beta+1, ply+1, False)
+                if score >= beta:
+                    self.stats['nullMoveCutoffs'] += 1
+                    return beta
+
+        #>>>>> futility pruning
+        futile = False
+        if (self.useFutility and depth < len(FUTILITY_MARGIN)
+            and abs(alpha) < MATE//2):
+            if staticV is None:
+                staticV = self.evaluate(b)
+            futile = staticV + FUTILITY_MARGIN[depth] <= alpha
+
+        alphaOrig = alpha
+        bestMove: Optional[Move] = None
+        movesSearched = 0
+        for mv in mvs:
+            quiet = isQuiet(b, mv)
+            if futile and quiet:
+                self.stats['futilityPrunes'] += 1
+                continue
+            b2 = b.makeMove(mv)
+
+            #>>>>> late move reductions
+            r = 0
+            if (self.useLmr and quiet and depth >= LMR_MIN_DEPTH
+                and movesSearched >= LMR_MIN_MOVES):
+                r = lmrReduction(depth, movesSearched+1)
+            if r > 0:
+                self.stats['lmrReductions'] += 1
+                score = -self.negamax(b2, depth-1-r, -alpha-1, -alpha,
+                                      ply+1, True)
+                if score > alpha:
+                    self.stats['lmrResearches'] += 1
+                    score = -self.negamax(b2, depth-1, -beta, -alpha,
+                                          ply+1, True)
+            else:
+                score = -self.negamax(b2, depth-1, -beta, -alpha,
+                                      ply+1, True)
+            movesSearched += 1
+
+            if score >= beta:
+                self.tt.store(key, mv, beta, depth, LOWER)
+                return beta
+            if score > alpha:
+                alpha = score
+                bestMove = mv
+        #//for mv
+        flag = EXACT if alpha > alphaOrig else UPPER
+        self.tt.store(key, bestMove, alpha, depth, flag)
+        return alpha
+
+#---------------------------------------------------------------------
+
+def main():
+    b = Board.startPosition()
+    for useAll in [False, True]:
+        s = Search(useNullMove=useAll, useLmr=useAll, useFutility=useAll)
+        bestMove, score = s.think(b, Limits(depth=3, seconds=30.0))
+        prn("pruning={} best move {} scoring {} (depth {}, {:.2f}s)\n{}",
+            useAll, toAlmov(bestMove), score, s.depthReached, s.elapsed,
+            s.statsStr())
+
+if __name__=='__main__':
+    main()
+
+#end
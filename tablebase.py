@@ -0,0 +1,838 @@
+# tablebase.py = endgame tablebases, made by retrograde analysis
+
+"""
+Endgame tablebases: for every position with a given material, whether
+the side to move wins, draws or loses, and in how many plies it's
+mate. They are made once, by retrograde analysis, and saved to files
+which the search maps into memory and probes in O(1) (see Search's
+(tablebases) option).
+
+Usage:
+
+    python tablebase.py -d tablebases          # make all of TABLES
+    python tablebase.py -d tablebases KRK KPK  # or some of them
+
+Tables that the ones asked for need (e.g. KQK for KPK, as the pawn
+promotes) are made first, if they aren't in the directory already.
+
+The 3-piece tables take a few seconds each; the 4-piece ones (KBNK,
+KQKR) have 64 times as many positions and take a good deal longer.
+
+Rules
+-----
+The results are for chess, not for the search's king-capture rules:
+mate and stalemate are told apart. The tables are made with king-
+capture moves anyway: a position where the mover could capture the
+enemy king is illegal, a move to one is an illegal move, and the side
+to move is in check if the other side could capture its king. As in
+Board.makeMove(), pawns only promote to queens. There is no en
+passant or castling in these endings.
+
+Signatures
+----------
+A table is named by its signature, the strong side's pieces then the
+weak side's, e.g. "KQKR". Tables are made with white as the strong
+side; positions with black as the strong side are probed with the
+colours swapped.
+
+Indexes
+-------
+Each position has an index from 0 to size-1, calculated from where
+the pieces are:
+
+    ((stm * LEAD + lead) * 64 + sq1) * 64 + sq2 ...
+
+(stm) is the side to move (0 for white). For tables without pawns,
+(lead) is the white king's square, which the 8 symmetries of the
+board put in the triangle a1-d1-d4 (10 squares). For tables with a
+pawn, (lead) is that pawn's square, on files a-d (the board is
+flipped left to right if need be) and ranks 2-7, so 24 squares.
+(sq1, sq2, ...) are the squares of the other pieces, 0-63 (file*8 +
+rank). Some indexes are impossible (two pieces on a square) and are
+marked INVALID.
+
+Values
+------
+Each position is one byte:
+
+    DRAW (0)      a draw
+    1 + dtm       a win or loss in (dtm) plies: if (dtm) is odd, the
+                  side to move mates; if even, it is mated (0 means
+                  it is checkmated now)
+    INVALID (255) an impossible or illegal position
+
+Files
+-----
+A file is a HEADER_SIZE byte header (magic, signature, size) followed
+by the values, one byte per index. Probing uses mmap, so only the
+pages that are used are read.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import List, Tuple, Dict, Optional, Iterator, Any
+
+import numpy as np
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+
+#---------------------------------------------------------------------
+
+TABLES = ["KQK", "KRK", "KPK", "KBNK", "KQKR"] # in the order to make them
+
+# material that can't mate: all its positions are draws
+INSUFFICIENT = ["KK", "KBK", "KNK"]
+
+DRAW = 0
+INVALID = 255
+
+TB_MAGIC = b"CALITB01"
+HEADER_SIZE = 64
+HEADER_FORMAT = "<8s8sQ" # magic, signature, size
+
+CHUNK = 1<<18 # positions handled at a time when making a table
+
+PIECE_ORDER = "KQRBNP" # order of each side's pieces in a signature
+
+WHITE = 0 # colours and sides to move, as numbers
+BLACK = 1
+
+#---------------------------------------------------------------------
+# squares and moves
+
+"""
+Squares are numbered 0-63, file*8 + rank (with files and ranks from
+0). Flipping the files is s^56, flipping the ranks is s^7.
+"""
+
+def sqNum(sx: Sqix) -> int:
+    """ the 0-63 number of board square (sx) """
+    f, rk = sqixFR(sx)
+    return (f-1)*8 + (rk-1)
+
+sqNumSqix = [toSqix((s//8 + 1, s%8 + 1)) for s in range(64)]
+
+def _destTable(steps: List[Tuple[int,int]], maxDist: int) -> np.ndarray:
+    """ dest[s, d, i] = the square (i+1) steps in direction (d) from
+    (s), or -1 if off the board
+    """
+    dest = np.full((64, len(steps), maxDist), -1, dtype=np.int64)
+    for s in range(64):
+        for d, (df, dr) in enumerate(steps):
+            f, r = s//8, s%8
+            for i in range(maxDist):
+                f += df
+                r += dr
+                if not (0 <= f < 8 and 0 <= r < 8): break
+                dest[s, d, i] = f*8 + r
+    return dest
+
+KING_STEPS = [(1,0), (-1,0), (0,1), (0,-1), (1,1), (1,-1), (-1,1), (-1,-1)]
+KNIGHT_STEPS = [(1,2), (2,1), (2,-1), (1,-2), (-1,-2), (-2,-1), (-2,1),
+                (-1,2)]
+ROOK_DIRS = KING_STEPS[:4]
+BISHOP_DIRS = KING_STEPS[4:]
+
+KING_DEST = _destTable(KING_STEPS, 1)[:, :, 0]
+KNIGHT_DEST = _destTable(KNIGHT_STEPS, 1)[:, :, 0]
+ROOK_RAYS = _destTable(ROOK_DIRS, 7)
+BISHOP_RAYS = _destTable(BISHOP_DIRS, 7)
+QUEEN_RAYS = np.concatenate([ROOK_RAYS, BISHOP_RAYS], axis=1)
+SLIDER_RAYS = {'Q': QUEEN_RAYS, 'R': ROOK_RAYS, 'B': BISHOP_RAYS}
+STEPPER_DEST = {'K': KING_DEST, 'N': KNIGHT_DEST}
+
+# the triangle a1-d1-d4, and each square's place in it (-1 if not)
+TRIANGLE = [f*8 + r for f in range(4) for r in range(f+1)]
+triangleIndex = np.full(64, -1, dtype=np.int64)
+for _i, _s in enumerate(TRIANGLE):
+    triangleIndex[_s] = _i
+TRIANGLE_SQ = np.array(TRIANGLE, dtype=np.int64)
+
+#---------------------------------------------------------------------
+# table specifications
+
+class TableSpec:
+    """ the pieces of a table, and how positions are indexed """
+
+    sig: str = "" # e.g. "KQKR"
+    pieces: List[Tuple[str,int]] = [] # (type, colour), white's first
+    hasPawns: bool = False
+    lead: int = 0 # piece whose square is (lead)
+    numLead: int = 10 # how many (lead) squares there are
+    size: int = 0 # how many indexes there are
+
+    def __init__(self, white: str, black: str):
+        """ (white) and (black) are each side's pieces, e.g. "KQ" """
+        for side in (white, black):
+            if (not side.startswith("K") or "K" in side[1:]
+                or len(set(side)) != len(side)):
+                raise ValueError(form("bad table pieces {!r} v {!r}",
+                                      white, black))
+        white = sortPieces(white)
+        black = sortPieces(black)
+        self.sig = white + black
+        self.pieces = ([(t, WHITE) for t in white]
+                       + [(t, BLACK) for t in black])
+        self.hasPawns = "P" in white + black
+        if self.hasPawns:
+            if "P" not in white:
+                raise ValueError(form("{}: only white pawns", self.sig))
+            self.lead = white.index("P")
+            self.numLead = 24
+        else:
+            self.lead = 0 # the white king
+            self.numLead = 10
+        self.size = 2 * self.numLead * 64**(len(self.pieces)-1)
+
+    def __repr__(self) -> str:
+        return form("<TableSpec {}>", self.sig)
+
+    @staticmethod
+    def fromSig(sig: str) -> 'TableSpec':
+        i = sig.index("K", 1)
+        return TableSpec(sig[:i], sig[i:])
+
+    def sides(self) -> Tuple[str,str]:
+        """ the white and black pieces """
+        return (''.join(t for t, c in self.pieces if c == WHITE),
+                ''.join(t for t, c in self.pieces if c == BLACK))
+
+    def enemyKing(self, colour: int) -> int:
+        """ the piece number of the king that isn't (colour)'s """
+        return 0 if colour == BLACK else len(self.sides()[0])
+
+    #========== vectorised indexes
+
+    def canonical(self, sq: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ the squares (M, pieces) moved by a symmetry to where
+        indexes want them, and the (lead) of each
+        """
+        sq = sq.copy()
+        ls = sq[:, self.lead]
+        if self.hasPawns:
+            flip = (ls >> 3) > 3
+            sq[flip] ^= 56
+            ls = sq[:, self.lead]
+            lead = (ls >> 3)*6 + (ls & 7) - 1
+            return sq, lead
+        flip = (ls >> 3) > 3
+        sq[flip] ^= 56
+        flip = (sq[:, self.lead] & 7) > 3
+        sq[flip] ^= 7
+        ls = sq[:, self.lead]
+        swap = (ls & 7) > (ls >> 3)
+        sq[swap] = ((sq[swap] & 7) << 3) | (sq[swap] >> 3)
+        return sq, triangleIndex[sq[:, self.lead]]
+
+    def encode(self, sq: np.ndarray, stm: np.ndarray) -> np.ndarray:
+        """ the indexes of positions with pieces on squares (sq) and
+        sides to move (stm)
+        """
+        sq, lead = self.canonical(sq)
+        idx = stm.astype(np.int64)*self.numLead + lead
+        for i in range(len(self.pieces)):
+            if i != self.lead:
+                idx = idx*64 + sq[:, i]
+        return idx
+
+    def decode(self, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ the squares (M, pieces) and sides to move of indexes (idx) """
+        n = len(self.pieces)
+        sq = np.zeros((len(idx), n), dtype=np.int64)
+        rest = idx.copy()
+        for i in reversed(range(n)):
+            if i != self.lead:
+                sq[:, i] = rest % 64
+                rest //= 64
+        lead = rest % self.numLead
+        stm = rest // self.numLead
+        if self.hasPawns:
+            sq[:, self.lead] = (lead // 6)*8 + lead % 6 + 1
+        else:
+            sq[:, self.lead] = TRIANGLE_SQ[lead]
+        return sq, stm
+
+    #========== scalar indexes, for probing
+
+    def index(self, squares: List[int], stm: int) -> int:
+        """ the index of one position (as encode()) """
+        sq = list(squares)
+        ls = sq[self.lead]
+        if self.hasPawns:
+            if ls >> 3 > 3:
+                sq = [s ^ 56 for s in sq]
+            ls = sq[self.lead]
+            idx = stm*self.numLead + (ls >> 3)*6 + (ls & 7) - 1
+        else:
+            if ls >> 3 > 3:
+                sq = [s ^ 56 for s in sq]
+            if sq[self.lead] & 7 > 3:
+                sq = [s ^ 7 for s in sq]
+            ls = sq[self.lead]
+            if ls & 7 > ls >> 3:
+                sq = [((s & 7) << 3) | (s >> 3) for s in sq]
+            idx = stm*self.numLead + int(triangleIndex[sq[self.lead]])
+        for i, s in enumerate(sq):
+            if i != self.lead:
+                idx = idx*64 + s
+        return idx
+
+def sortPieces(side: str) -> str:
+    return ''.join(sorted(side, key=PIECE_ORDER.index))
+
+#---------------------------------------------------------------------
+# move generation, for many positions at once
+
+def occupant(sq: np.ndarray, dest: np.ndarray) -> np.ndarray:
+    """ which piece is on (dest) in each position, -1 if none """
+    occ = np.full(len(dest), -1, dtype=np.int64)
+    for j in range(sq.shape[1]):
+        occ[sq[:, j] == dest] = j
+    return occ
+
+QUIET, CAPTURE, EITHER = 1, 2, 3 # which kinds of move a slot allows
+
+def pseudoMoves(spec: TableSpec, sq: np.ndarray, stm: np.ndarray
+                ) -> Iterator[Tuple[int, np.ndarray, np.ndarray, int]]:
+    """ the moves of the side to move, one slot at a time. Yields
+    (piece, dest, ok, kind): the move of piece number (piece) to
+    (dest), in the positions where (ok), allowing (kind) of move.
+    Captures of the mover's own pieces aren't removed.
+    """
+    for i, (t, colour) in enumerate(spec.pieces):
+        mine = stm == colour
+        if not mine.any(): continue
+        frm = sq[:, i]
+        if t in STEPPER_DEST:
+            table = STEPPER_DEST[t]
+            for j in range(table.shape[1]):
+                dest = table[frm, j]
+                yield i, dest, mine & (dest >= 0), EITHER
+        elif t in SLIDER_RAYS:
+            rays = SLIDER_RAYS[t]
+            for d in range(rays.shape[1]):
+                ok = mine.copy()
+                for k in range(rays.shape[2]):
+                    dest = rays[frm, d, k]
+                    ok &= dest >= 0
+                    if not ok.any(): break
+                    yield i, dest, ok, EITHER
+                    ok = ok & (occupant(sq, dest) < 0)
+            #//for d
+        else:
+            # a pawn
+            dr = 1 if colour == WHITE else -1
+            dest = frm + dr
+            empty = occupant(sq, dest) < 0
+            yield i, dest, mine & empty, QUIET
+            startRank = 1 if colour == WHITE else 6
+            dest2 = frm + 2*dr
+            yield i, dest2, (mine & empty & ((frm & 7) == startRank)
+                             & (occupant(sq, dest2) < 0)), QUIET
+            for df in (-8, 8):
+                dest = frm + df + dr
+                fileOk = ((frm >> 3) > 0) if df < 0 else ((frm >> 3) < 7)
+                yield i, np.where(fileOk, dest, -1), mine & fileOk, CAPTURE
+        #//if
+    #//for i
+
+def canCaptureKing(spec: TableSpec, sq: np.ndarray,
+                   stm: np.ndarray) -> np.ndarray:
+    """ whether the side to move can capture the other king, i.e.
+    the position is illegal
+    """
+    r = np.zeros(len(stm), dtype=bool)
+    for colour in (WHITE, BLACK):
+        rows = np.nonzero(stm == colour)[0]
+        if not len(rows): continue
+        ksq = sq[rows, spec.enemyKing(colour)]
+        for i, dest, ok, kind in pseudoMoves(spec, sq[rows], stm[rows]):
+            if kind & CAPTURE:
+                r[rows[ok & (dest == ksq)]] = True
+    #//for colour
+    return r
+
+#---------------------------------------------------------------------
+# values
+
+def codeResult(code: int) -> Optional[Tuple[int,int]]:
+    """ a value as (result, dtm) where (result) is +1 if the side to
+    move wins, 0 for a draw and -1 if it loses. None if INVALID.
+    """
+    if code == INVALID:
+        return None
+    if code == DRAW:
+        return 0, 0
+    dtm = code - 1
+    return (1 if dtm % 2 else -1), dtm
+
+#---------------------------------------------------------------------
+# making tables
+
+UNKNOWN, WIN, LOSS, DRAWN, BAD = 0, 1, 2, 3, 4 # while making a table
+
+class Generator:
+    """ makes a table by retrograde analysis """
+
+    spec: TableSpec
+    values: Dict[str,np.ndarray] = {} # the tables it can use, by sig
+    bad: np.ndarray # positions that are impossible or illegal
+    res: np.ndarray # UNKNOWN, WIN, ...
+    dtm: np.ndarray
+    numLegal: np.ndarray # legal moves of each position
+    extLossMin: np.ndarray # least dtm of moves out of the table to a
+                           # position lost for its mover (255 if none)
+    extWinMax: np.ndarray # most dtm of those to a won one (-1 if none)
+    extWins: np.ndarray # how many of those there are
+    extDraw: np.ndarray # whether any move out of the table draws
+
+    def __init__(self, sig: str, values: Dict[str,np.ndarray]):
+        """ (values) has the tables that this one's captures and
+        promotions lead to
+        """
+        self.spec = TableSpec.fromSig(sig)
+        self.values = values
+
+    def chunks(self, rows: Optional[np.ndarray] = None
+               ) -> Iterator[np.ndarray]:
+        """ (rows), by default all positions, CHUNK at a time """
+        if rows is None:
+            for start in range(0, self.spec.size, CHUNK):
+                yield np.arange(start, min(start+CHUNK, self.spec.size))
+        else:
+            for start in range(0, len(rows), CHUNK):
+                yield rows[start:start+CHUNK]
+
+    def childCodes(self, white: str, black: str, sq: np.ndarray,
+                   stm: np.ndarray) -> np.ndarray:
+        """ the values of positions with another material (each
+        side's pieces, in the order of the columns of (sq))
+        """
+        spec = TableSpec(white, black)
+        if white + black in INSUFFICIENT or black + white in INSUFFICIENT:
+            return np.where(canCaptureKing(spec, sq, stm), INVALID, DRAW)
+        if spec.sig in self.values:
+            return self.values[spec.sig][spec.encode(sq, stm)]
+        # the other way round: swap the colours
+        nw = len(white)
+        swapped = np.concatenate([sq[:, nw:], sq[:, :nw]], axis=1) ^ 7
+        other = TableSpec(black, white)
+        if other.sig in self.values:
+            return self.values[other.sig][other.encode(swapped, 1-stm)]
+        raise ValueError(form("{} needs table {} or {}", self.spec.sig,
+                              spec.sig, other.sig))
+
+    def moves(self, rows: np.ndarray, external: bool
+              ) -> Iterator[Tuple[np.ndarray, np.ndarray, bool]]:
+        """ the moves of positions (rows), which must be legal. Yields
+        (parents, children, isExternal): (parents) are positions in
+        (rows), (children) are indexes into this table for moves
+        within it, or values for moves out of it (if (external)).
+        """
+        spec = self.spec
+        sq, stm = spec.decode(rows)
+        pos = np.arange(len(rows))
+        white, black = spec.sides()
+        for i, dest, ok, kind in pseudoMoves(spec, sq, stm):
+            occ = occupant(sq, dest)
+            own = np.zeros(len(rows), dtype=bool)
+            for j, (t, c) in enumerate(spec.pieces):
+                own |= (occ == j) & (stm == c)
+            ok = ok & ~own
+            if kind == QUIET:
+                ok &= occ < 0
+            elif kind == CAPTURE:
+                ok &= occ >= 0
+            t = spec.pieces[i][0]
+            promo = np.zeros(len(rows), dtype=bool)
+            if t == "P":
+                promo = (dest & 7) == (7 if spec.pieces[i][1] == WHITE
+                                       else 0)
+            quiet = ok & (occ < 0) & ~promo
+            if quiet.any():
+                csq = sq[quiet].copy()
+                csq[:, i] = dest[quiet]
+                yield pos[quiet], spec.encode(csq, 1-stm[quiet]), False
+            if not external: continue
+            for j, isPromo in [(j, isPromo)
+                               for j in range(-1, len(spec.pieces))
+                               for isPromo in (False, True)]:
+                # j: the piece captured, or -1 for none
+                if j < 0 and not isPromo: continue # (quiet, done above)
+                sel = ok & (occ == j) & (promo == isPromo)
+                if not sel.any(): continue
+                csq = sq[sel].copy()
+                csq[:, i] = dest[sel]
+                w, b = list(white), list(black)
+                if isPromo:
+                    side = w if spec.pieces[i][1] == WHITE else b
+                    side[side.index("P")] = "Q"
+                if j >= 0:
+                    csq = np.delete(csq, j, axis=1)
+                    if j < len(white):
+                        del w[j]
+                    else:
+                        del b[j - len(white)]
+                yield from self._external(pos[sel], w, b, csq,
+                                          1-stm[sel])
+            #//for j
+        #//for
+
+    def _external(self, parents: np.ndarray, w: List[str], b: List[str],
+                  csq: np.ndarray, cstm: np.ndarray
+                  ) -> Iterator[Tuple[np.ndarray, np.ndarray, bool]]:
+        """ the values of moves out of the table, to positions with
+        pieces (w) and (b) on squares (csq)
+        """
+        # sort each side's pieces, and their columns, into order:
+        cols = (sorted(range(len(w)), key=lambda k: PIECE_ORDER.index(w[k]))
+                + sorted(range(len(w), len(w)+len(b)),
+                         key=lambda k: PIECE_ORDER.index(b[k-len(w)])))
+        yield parents, self.childCodes(sortPieces(''.join(w)),
+            sortPieces(''.join(b)), csq[:, cols], cstm), True
+
+    def make(self, verbose: bool = False) -> np.ndarray:
+        """ make the table, returning its values """
+        spec = self.spec
+        n = spec.size
+        startTime = time.time()
+
+        #>>>>> impossible and illegal positions
+        self.bad = np.zeros(n, dtype=bool)
+        for rows in self.chunks():
+            sq, stm = spec.decode(rows)
+            clash = np.zeros(len(rows), dtype=bool)
+            for a in range(sq.shape[1]):
+                for c in range(a+1, sq.shape[1]):
+                    clash |= sq[:, a] == sq[:, c]
+            self.bad[rows] = clash
+            ok = ~clash
+            self.bad[rows[ok]] = canCaptureKing(spec, sq[ok], stm[ok])
+        #//for rows
+        inCheck = np.roll(self.bad, n//2) # the same, other side to move
+
+        #>>>>> count the legal moves, and look at those out of the table
+        self.numLegal = np.zeros(n, dtype=np.int64)
+        self.extLossMin = np.full(n, 255, dtype=np.int64)
+        self.extWinMax = np.full(n, -1, dtype=np.int64)
+        self.extWins = np.zeros(n, dtype=np.int64)
+        self.extDraw = np.zeros(n, dtype=bool)
+        good = np.nonzero(~self.bad)[0]
+        for rows in self.chunks(good):
+            for parents, children, isExternal in self.moves(rows, True):
+                if isExternal:
+                    legal = children != INVALID
+                    p = rows[parents[legal]]
+                    codes = children[legal].astype(np.int64)
+                    np.add.at(self.numLegal, p, 1)
+                    self.extDraw[p[codes == DRAW]] = True
+                    dtm = codes - 1
+                    lost = (codes != DRAW) & (dtm % 2 == 0)
+                    np.minimum.at(self.extLossMin, p[lost], dtm[lost])
+                    won = (codes != DRAW) & (dtm % 2 == 1)
+                    np.maximum.at(self.extWinMax, p[won], dtm[won])
+                    np.add.at(self.extWins, p[won], 1)
+                else:
+                    legal = ~self.bad[children]
+                    np.add.at(self.numLegal, rows[parents[legal]], 1)
+            #//for
+        #//for rows
+
+        #>>>>> mates and stalemates
+        self.res = np.where(self.bad, BAD, UNKNOWN).astype(np.int8)
+        self.dtm = np.zeros(n, dtype=np.int64)
+        noMoves = ~self.bad & (self.numLegal == 0)
+        self.res[noMoves & inCheck] = LOSS
+        self.res[noMoves & ~inCheck] = DRAWN
+
+        #>>>>> retrograde analysis, a ply at a time
+        extMax = max(int(self.extWinMax.max()),
+                     int(np.where(self.extLossMin < 255,
+                                  self.extLossMin, -1).max()))
+        ply = 1
+        while True:
+            changed = self.step(ply)
+            if verbose:
+                prn("{} ply {}: {} positions", spec.sig, ply, changed)
+            if changed == 0 and ply > extMax + 1: break
+            ply += 1
+        #//while
+        self.res[self.res == UNKNOWN] = DRAWN
+
+        codes = np.full(n, INVALID, dtype=np.uint8)
+        codes[self.res == DRAWN] = DRAW
+        wl = (self.res == WIN) | (self.res == LOSS)
+        codes[wl] = 1 + self.dtm[wl]
+        if verbose:
+            prn("{}: {} positions in {:.1f}s", spec.sig, n,
+                time.time() - startTime)
+        return codes
+
+    def step(self, ply: int) -> int:
+        """ find the positions won or lost in (ply) plies. Return how
+        many there are.
+        """
+        unknown = np.nonzero(self.res == UNKNOWN)[0]
+        newWin: List[np.ndarray] = []
+        newLoss: List[Tuple[np.ndarray,np.ndarray]] = []
+        for rows in self.chunks(unknown):
+            m = len(rows)
+            win = self.extLossMin[rows] == ply-1
+            wins = self.extWins[rows].copy()
+            winMax = self.extWinMax[rows].copy()
+            for parents, children, isExternal in self.moves(rows, False):
+                legal = ~self.bad[children]
+                parents, children = parents[legal], children[legal]
+                cres = self.res[children]
+                cdtm = self.dtm[children]
+                win[parents[(cres == LOSS) & (cdtm == ply-1)]] = True
+                won = cres == WIN
+                np.add.at(wins, parents[won], 1)
+                np.maximum.at(winMax, parents[won], cdtm[won])
+            #//for
+            newWin.append(rows[win])
+            lost = (~win & (wins == self.numLegal[rows])
+                    & ~self.extDraw[rows])
+            newLoss.append((rows[lost], winMax[lost] + 1))
+        #//for rows
+        changed = 0
+        for rows in newWin:
+            self.res[rows] = WIN
+            self.dtm[rows] = ply
+            changed += len(rows)
+        for rows, dtm in newLoss:
+            self.res[rows] = LOSS
+            self.dtm[rows] = dtm
+            changed += len(rows)
+        return changed
+
+#---------------------------------------------------------------------
+# files
+
+def tablePath(tbDir: str, sig: str) -> str:
+    return os.path.join(tbDir, sig + ".tb")
+
+def writeTable(filename: str, sig: str, codes: np.ndarray):
+    """ write a table's values to a file """
+    header = struct.pack(HEADER_FORMAT, TB_MAGIC, sig.encode(), len(codes))
+    with open(filename, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(codes.astype(np.uint8).tobytes())
+
+def swappedSig(sig: str) -> str:
+    """ the signature with the colours swapped, e.g. "KKQ" for "KQK" """
+    white, black = TableSpec.fromSig(sig).sides()
+    return black + white
+
+def prerequisites(sig: str) -> List[str]:
+    """ the tables that table (sig) needs: those that a capture or a
+    promotion leads to, other than insufficient material. Each has
+    the side with pawns, or else more pieces, as white.
+    """
+    white, black = TableSpec.fromSig(sig).sides()
+    r: List[str] = []
+    for mover, other, moverIsWhite in [(white, black, True),
+                                       (black, white, False)]:
+        promos = [False, True] if "P" in mover else [False]
+        for promo in promos:
+            for captured in [None] + [t for t in other if t != "K"]:
+                if not promo and captured is None: continue
+                m = mover.replace("P", "Q", 1) if promo else mover
+                o = other.replace(captured, "", 1) if captured else other
+                w, b = (m, o) if moverIsWhite else (o, m)
+                w, b = sortPieces(w), sortPieces(b)
+                if w + b in INSUFFICIENT or b + w in INSUFFICIENT:
+                    continue
+                if ("P" in b and "P" not in w) or len(b) > len(w):
+                    w, b = b, w
+                if w + b not in r:
+                    r.append(w + b)
+            #//for captured
+    #//for mover
+    return r
+
+def withPrerequisites(sigs: List[str], have: List[str]) -> List[str]:
+    """ (sigs), with the tables they need (see prerequisites()) put
+    before them, unless they're in (have) (either way round)
+    """
+    r: List[str] = []
+    def add(sig: str, needed: bool):
+        if sig in r: return
+        if needed and (sig in have or swappedSig(sig) in have
+                       or swappedSig(sig) in r): return
+        for pre in prerequisites(sig):
+            add(pre, True)
+        r.append(sig)
+    for sig in sigs:
+        add(sig, False)
+    return r
+
+def makeTables(tbDir: str, sigs: List[str] = TABLES,
+               verbose: bool = False) -> Dict[str,np.ndarray]:
+    """ make tables (sigs), in that order, and write them to (tbDir).
+    Tables they need that are already in (tbDir) are read from it;
+    ones that aren't are made first.
+    """
+    os.makedirs(tbDir, exist_ok=True)
+    values: Dict[str,np.ndarray] = {}
+    for fn in os.listdir(tbDir):
+        if fn.endswith(".tb"):
+            tb = Tablebase(os.path.join(tbDir, fn))
+            values[tb.sig] = tb.values()
+    for sig in withPrerequisites(sigs, list(values)):
+        codes = Generator(sig, values).make(verbose)
+        writeTable(tablePath(tbDir, sig), sig, codes)
+        values[sig] = codes
+    return values
+
+class Tablebase:
+    """ a table file, mapped into memory """
+
+    sig: str = ""
+    spec: TableSpec
+    filename: str = ""
+    mm: Optional[mmap.mmap] = None
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(form("{}: not a tablebase", filename))
+            magic, sig, size = struct.unpack_from(HEADER_FORMAT, header)
+            if magic != TB_MAGIC:
+                raise ValueError(form("{}: not a tablebase", filename))
+            self.sig = sig.rstrip(b"\0").decode()
+            self.spec = TableSpec.fromSig(self.sig)
+            if size != self.spec.size:
+                raise ValueError(form("{}: {} entries, should be {}",
+                                      filename, size, self.spec.size))
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) != HEADER_SIZE + size:
+            raise ValueError(form("{}: wrong length", filename))
+
+    def __repr__(self) -> str:
+        return form("<Tablebase {}>", self.sig)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def values(self) -> np.ndarray:
+        """ all the values, as an array (read from the file) """
+        return np.frombuffer(self.mm, dtype=np.uint8, offset=HEADER_SIZE)
+
+    def code(self, index: int) -> int:
+        """ the value of position (index) """
+        return self.mm[HEADER_SIZE + index]
+
+#---------------------------------------------------------------------
+# probing
+
+class TablebaseSet:
+    """ the tables in a directory, found by a position's material key """
+
+    tables: Dict[str,Tablebase] = {}
+    # byMaterial[material key] = (table, whether colours are swapped)
+    byMaterial: Dict[int,Tuple[Tablebase,bool]] = {}
+    probes: int = 0
+    hits: int = 0
+
+    def __init__(self, tbDir: str):
+        self.tables = {}
+        self.byMaterial = {}
+        for fn in sorted(os.listdir(tbDir)):
+            if fn.endswith(".tb"):
+                tb = Tablebase(os.path.join(tbDir, fn))
+                self.add(tb)
+
+    def add(self, tb: Tablebase):
+        self.tables[tb.sig] = tb
+        for swapped in (False, True):
+            counts: Dict[Sqv,int] = {}
+            for t, c in tb.spec.pieces:
+                pv = t if (c == WHITE) != swapped else t.lower()
+                counts[pv] = counts.get(pv, 0) + 1
+            self.byMaterial[materialKeyOf(counts)] = (tb, swapped)
+        #//for swapped
+
+    def close(self):
+        for tb in self.tables.values():
+            tb.close()
+
+    def probe(self, b: Board) -> Optional[Tuple[int,int]]:
+        """ look up position (b), returning (result, dtm) for the side
+        to move (see codeResult()), or None if there's no table for it
+        (or it's illegal)
+        """
+        entry = self.byMaterial.get(b.getMaterialKey())
+        if entry is None:
+            return None
+        self.probes += 1
+        tb, swapped = entry
+        where: Dict[Sqv,int] = {}
+        for sx in sqixs:
+            sv = b.sq[sx]
+            if sv != EMPTY:
+                where[sv] = sqNum(sx)
+        squares = []
+        for t, c in tb.spec.pieces:
+            if swapped:
+                squares.append(where[t if c == BLACK else t.lower()] ^ 7)
+            else:
+                squares.append(where[t if c == WHITE else t.lower()])
+        stm = WHITE if (b.mover == 'W') != swapped else BLACK
+        r = codeResult(tb.code(tb.spec.index(squares, stm)))
+        if r is not None:
+            self.hits += 1
+        return r
+
+    def probeScore(self, b: Board, ply: int, mate: int) -> Optional[int]:
+        """ the score of (b) for the mover, where (mate) is the score
+        for capturing the king at the root, so mate in (dtm) plies
+        (capturing the king a ply later) is (mate - ply - dtm - 1).
+        None if it can't be probed.
+        """
+        r = self.probe(b)
+        if r is None:
+            return None
+        result, dtm = r
+        if result == 0:
+            return 0
+        return result * (mate - ply - dtm - 1)
+
+#---------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="make endgame tablebases")
+    ap.add_argument("sigs", nargs="*", default=TABLES,
+                    help="tables to make (default: {})".format(
+                        " ".join(TABLES)))
+    ap.add_argument("-d", "--dir", default="tablebases",
+                    help="directory to write them to")
+    args = ap.parse_args()
+    try:
+        values = makeTables(args.dir, args.sigs, verbose=True)
+    except ValueError as e:
+        prn("{}", e)
+        sys.exit(1)
+    for sig in args.sigs:
+        codes = values[sig]
+        dtm = codes.astype(np.int64) - 1
+        wl = (codes != DRAW) & (codes != INVALID)
+        prn("{}: {} won, {} lost, {} drawn, longest mate {} plies",
+            sig, int((wl & (dtm % 2 == 1)).sum()),
+            int((wl & (dtm % 2 == 0)).sum()), int((codes == DRAW).sum()),
+            int(dtm[wl].max()) if wl.any() else 0)
+
+if __name__=='__main__':
+    main()
+
+#end
@@ -15,6 +15,57 @@ group.add(test_movegen.group)
 import test_evalpos
 group.add(test_evalpos.group)
 
+import test_endgame
+group.add(test_endgame.group)
+
+import test_movegenbatch
+group.add(test_movegenbatch.group)
+
+import test_evalbatch
+group.add(test_evalbatch.group)
+
+import test_evalprofile
+group.add(test_evalprofile.group)
+
+import test_tune
+group.add(test_tune.group)
+
+import test_nnue
+group.add(test_nnue.group)
+
+import test_tablebase
+group.add(test_tablebase.group)
+
+import test_san
+group.add(test_san.group)
+
+import test_pgn
+group.add(test_pgn.group)
+
+import test_book
+group.add(test_book.group)
+
+import test_game
+group.add(test_game.group)
+
+import test_search
+group.add(test_search.group)
+
+import test_mate
+group.add(test_mate.group)
+
+import test_analyse
+group.add(test_analyse.group)
+
+import test_posindex
+group.add(test_posindex.group)
+
+import test_transtable
+group.add(test_transtable.group)
+
+import test_parallel
+group.add(test_parallel.group)
+
 if __name__=='__main__': group.run()
 
 #end
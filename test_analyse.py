@@ -0,0 +1,110 @@
+# test_analyse.py = test <analyse.py>
+
+import io
+import json
+from multiprocessing import Pool
+
+from ulib import lintest
+
+from board import *
+import analyse
+from search import Limits
+
+#---------------------------------------------------------------------
+
+POSITIONS = """\
+# some positions
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - bm e4; id "start";
+6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1
+
+not a position
+6k1/5ppp/8/q7/8/8/5PPP/3R2K1 w - - 3 20
+4k3/8/8/8/8/8/4P3/4K3 b - - 0 1
+7k/8/8/8/8/8/8/X6K w - - 0 1
+"""
+
+def square(x: int) -> int:
+    return x*x
+
+#---------------------------------------------------------------------
+
+class T_read(lintest.TestCase):
+    """ reading positions """
+
+    def test_parse(self):
+        self.assertSame(analyse.parsePosition("8/8/8/8/8/8/8/K6k b - - 7 40"),
+            ("8/8/8/8/8/8/8/K6k b - - 7 40", {}), "FEN")
+        self.assertSame(analyse.parsePosition(
+            '8/8/8/8/8/8/8/K6k b - - bm Kg2; id "x 1";'),
+            ("8/8/8/8/8/8/8/K6k b - - 0 1", {'bm': "Kg2", 'id': "x 1"}),
+            "EPD")
+        self.assertSame(analyse.parsePosition("  # comment"), None,
+            "comment")
+        ok = False
+        try:
+            analyse.parsePosition("8/8/8 w")
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "too short raises ValueError")
+
+    def test_chunks(self):
+        chunks = list(analyse.readChunks(io.StringIO(POSITIONS), 2))
+        self.assertSame([[n for n, _ in c] for c in chunks],
+            [[2, 3], [5, 6], [7, 8]], "numbered, without blanks and comments")
+
+#---------------------------------------------------------------------
+
+class T_analyse(lintest.TestCase):
+    """ analysing positions """
+
+    def analyseAll(self, numWorkers: int) -> List[dict]:
+        out = io.StringIO()
+        n = analyse.analyseFile(io.StringIO(POSITIONS), out,
+                                Limits(depth=3, nodes=2000), numWorkers, 1)
+        self.assertSame(n, 6, "6 results")
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_results(self):
+        rs = self.analyseAll(0)
+        self.assertSame([r['line'] for r in rs], [2, 3, 5, 6, 7, 8],
+            "in order")
+        self.assertSame(rs[0]['id'], "start", "EPD id")
+        self.assertSame(rs[1]['bestMove'], "a1a8", "finds the mate")
+        self.assertSame(rs[1]['san'], "Ra8#", "in SAN")
+        self.assertSame(rs[1]['pv'][0], "a1a8", "PV starts with it")
+        self.assertTrue('error' in rs[2], "bad line")
+        self.assertTrue('error' in rs[5], "bad piece letter")
+        self.assertTrue(all(r['nodes'] <= 2000 for r in rs if 'nodes' in r),
+            "node limit")
+        self.assertSame(sorted(rs[3].keys()), sorted(['line', 'fen',
+            'bestMove', 'san', 'score', 'pv', 'depth', 'nodes', 'time']),
+            "fields")
+
+    def test_pool(self):
+        strip = lambda rs: [{k: v for k, v in r.items() if k != 'time'}
+                            for r in rs]
+        self.assertSame(strip(self.analyseAll(2)), strip(self.analyseAll(0)),
+            "the same with a pool")
+
+    def test_window(self):
+        consumed = []
+        def items():
+            for i in range(20):
+                consumed.append(i)
+                yield i
+        with Pool(2) as pool:
+            it = analyse.orderedMap(pool, square, items(), 3)
+            first = next(it)
+            self.assertSame(len(consumed), 3, "only (window) items read")
+            self.assertSame([first] + list(it), [i*i for i in range(20)],
+                "results in order")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_read)
+group.add(T_analyse)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -1,7 +1,7 @@
 # test_board.py = test <board.py>
 
 from ulib import lintest
-from ulib.butil import pr, prn
+from ulib.butil import form, pr, prn
 
 import board
 from board import Board, frix, algeSqix, toSqix, movAlmov
@@ -147,13 +147,226 @@ class T_Board(lintest.TestCase):
         self.assertSame(r2, 
             "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
             "FEN of (b2)")
-        
+
+    def test_fenRoundTrip(self):
+        for fen in [
+                "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R"
+                " w KQkq - 4 4",
+                "8/8/8/8/8/8/8/K6k b - - 7 40",
+                "4k3/8/8/8/Q2Q4/8/8/Q3K3 w - - 0 1"]:
+            self.assertSame(Board.fromFEN(fen).toFen(), fen, fen)
+        #//for
+
+    def test_badFen(self):
+        for fen, what in [
+                ("7k/8/8/8/8/8/8/X6K w - - 0 1", "piece letter"),
+                ("7k/8/8/8/8/8/8/7K x - - 0 1", "side to move"),
+                ("7k/8/8/8/8/8/8/7K w KX - 0 1", "castling")]:
+            ok = False
+            try:
+                Board.fromFEN(fen)
+            except ValueError:
+                ok = True
+            self.assertTrue(ok, "a bad " + what + " raises ValueError")
+        #//for
+
+    def test_fenCache(self):
+        b = Board.startPosition()
+        r = b.toFen()
+        self.assertTrue(b.fenPieces is not None
+                        and r.startswith(b.fenPieces + " "),
+                        "piece placement kept once made")
+        b2 = b.makeMove("e2e4")
+        self.assertSame(b2.toFen(),
+            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+            "not shared with the next position")
+        b.setSq("e2", board.EMPTY)
+        self.assertSame(b.toFen(),
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPP1PPP/RNBQKBNR w KQkq - 0 1",
+            "made again when a piece is altered")
+        b.mover = 'B'
+        b.castleWK = False
+        b.mspmc = 3
+        b.ply = 8
+        self.assertSame(b.toFen(),
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPP1PPP/RNBQKBNR b Qkq - 3 5",
+            "other fields set directly")
+
+
+#---------------------------------------------------------------------
+
+class T_zobrist(lintest.TestCase):
+    """ Zobrist keys """
+
+    def test_incremental(self):
+        b = Board.startPosition()
+        k = b.getKey()
+        self.assertSame(k, b.calcKey(), "key of start position")
+        for am in ["e2e4", "d7d5", "e4d5", "d8d5", "b1c3", "d5a2",
+                   "a1a2"]:
+            b = b.makeMove(am)
+            self.assertSame(b.key, b.calcKey(),
+                form("incremental key after {}", am))
+        self.assertFalse(b.castleWQ, "white can't castle queenside")
+
+    def test_promotion(self):
+        b = Board.fromFEN("8/1P6/8/8/8/8/5k2/K7 w - - 0 1")
+        b.getKey()
+        b2 = b.makeMove("b7b8")
+        self.assertSame(b2.getSq("b8"), board.WQ, "promoted to queen")
+        self.assertSame(b2.key, b2.calcKey(), "key after promotion")
+
+    def test_nullMove(self):
+        b = Board.startPosition()
+        b.getKey()
+        b2 = b.makeNullMove()
+        self.assertSame(b2.mover, "B", "black to move")
+        self.assertSame(b2.key, b2.calcKey(), "key after null move")
+        self.assertNotEqual(b2.key, b.key, "mover changes key")
+
+    def test_setSq(self):
+        b = Board.startPosition()
+        k = b.getKey()
+        b.setSq("e4", board.WN)
+        self.assertNotEqual(b.getKey(), k, "setSq() changes key")
+
+    def test_pawnKeyAndCounts(self):
+        b = Board.startPosition()
+        b.getPawnKey()
+        b.getPieceCounts()
+        for am in ["e2e4", "d7d5", "e4d5", "d8d5", "b1c3", "d5a2",
+                   "a1a2"]:
+            b = b.makeMove(am)
+            self.assertSame(b.pawnKey, b.calcPawnKey(),
+                form("incremental pawn key after {}", am))
+            self.assertSame(b.pieceCounts, b.calcPieceCounts(),
+                form("incremental piece counts after {}", am))
+        self.assertSame(b.pieceCounts[board.BQ], 0, "black queen taken")
+        b2 = Board.fromFEN("8/1P6/8/8/8/8/5k2/K7 w - - 0 1")
+        pk = b2.getPawnKey()
+        b2.getPieceCounts()
+        b2 = b2.makeMove("b7b8")
+        self.assertSame(b2.pawnKey, 0, "no pawns after promotion")
+        self.assertSame((b2.pieceCounts[board.WP], b2.pieceCounts[board.WQ]),
+                        (0, 1), "pawn became a queen")
+        b3 = Board.fromFEN("8/1P6/8/8/8/8/5k2/K7 w - - 0 1").makeMove("a1a2")
+        self.assertSame(b3.getPawnKey(), pk, "king moves keep the pawn key")
+
+    def test_materialKey(self):
+        b = Board.startPosition()
+        mk = b.getMaterialKey()
+        for am in ["e2e4", "d7d5", "e4d5", "d8d5", "b1c3", "d5a2",
+                   "a1a2"]:
+            b = b.makeMove(am)
+            self.assertSame(b.materialKey,
+                board.materialKeyOf(b.calcPieceCounts()),
+                form("incremental material key after {}", am))
+        self.assertSame(b.materialKey, mk - (1 << board.materialShift[board.BP])
+            - (1 << board.materialShift[board.BQ])
+            - (2 << board.materialShift[board.WP]),
+            "2 white pawns, a black pawn and black's queen taken")
+        b2 = Board.fromFEN("8/1P6/8/8/8/8/5k2/K7 w - - 0 1")
+        b2.getMaterialKey()
+        b2 = b2.makeMove("b7b8")
+        self.assertSame(b2.materialKey,
+            board.materialKeyOf({board.WK: 1, board.WQ: 1, board.BK: 1}), "KQK after promotion")
+        b2.setSq("b8", board.EMPTY)
+        self.assertSame(b2.getMaterialKey(),
+            board.materialKeyOf({board.WK: 1, board.BK: 1}), "recalculated after setSq()")
+
+#---------------------------------------------------------------------
+
+class T_pack(lintest.TestCase):
+    """ packing positions into bytes """
+
+    FENS = [
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b Kq - 5 4",
+        "8/8/8/8/8/8/8/K6k b - - 99 140"]
+
+    def test_roundTrip(self):
+        for fen in self.FENS:
+            b = Board.fromFEN(fen)
+            packed = b.pack()
+            self.assertSame(len(packed), board.PACKED_SIZE, "size")
+            b2 = Board.unpack(packed)
+            self.assertSame(b2.toFen(), fen, fen)
+            self.assertSame(b2.getKey(), b.getKey(), "same key")
+        #//for
+        self.assertSame(board.PACKED_SIZE, 38, "38 bytes")
+
+    def test_bulk(self):
+        boards = [Board.fromFEN(fen) for fen in self.FENS]
+        data = board.packBoards(boards)
+        self.assertSame(len(data), 3*board.PACKED_SIZE, "3 positions")
+        self.assertSame(
+            [b.toFen() for b in board.unpackBoards(memoryview(data))],
+            self.FENS, "unpacked from a memoryview")
+        self.assertSame(Board.unpack(data, board.PACKED_SIZE).toFen(),
+            self.FENS[1], "one from the middle")
+        ok = False
+        try:
+            board.unpackBoards(data[:-1])
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "part of a position raises ValueError")
+        ok = False
+        try:
+            Board.unpack(b"\x77" + data[1:])
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "a bad square raises ValueError")
+
+#---------------------------------------------------------------------
+
+class T_draws(lintest.TestCase):
+    """ draws by repetition, fifty moves and material """
+
+    def test_repetition(self):
+        b = Board.startPosition()
+        dance = ["g1f3", "g8f6", "f3g1", "f6g8"]
+        for am in dance:
+            b = b.makeMove(am)
+        self.assertSame(len(b.keyHistory), 4, "4 earlier positions")
+        self.assertSame(b.repetitions(), 1, "back to the start")
+        self.assertTrue(b.isDraw(repeats=1), "a draw for the search")
+        self.assertFalse(b.isDraw(), "not yet for the game")
+        for am in dance:
+            b = b.makeMove(am)
+        self.assertSame(b.drawReason(), "repetition", "threefold")
+        b = b.makeMove("e2e4")
+        self.assertSame((b.keyHistory, b.repetitions()), ([], 0),
+            "forgotten after a pawn move")
+        b2 = b.makeMove("g8f6").makeNullMove()
+        self.assertSame(b2.keyHistory, [], "or a null move")
+
+    def test_fifty(self):
+        b = Board.fromFEN("4k3/8/8/8/8/8/4P3/R3K3 w - - 99 80")
+        self.assertFalse(b.isDraw(), "99 plies")
+        self.assertSame(b.makeMove("a1a2").drawReason(), "fifty-move rule",
+            "100 plies")
+        self.assertFalse(b.makeMove("e2e4").isDraw(), "not after a pawn move")
+
+    def test_material(self):
+        for fen, dead in [
+                ("4k3/8/8/8/8/8/8/4K3 w - - 0 1", True),
+                ("4k3/8/8/8/8/8/8/1N2K3 w - - 0 1", True),
+                ("4k3/8/8/8/8/8/8/NN2K3 w - - 0 1", False),
+                ("4k3/8/8/8/8/8/8/2b1K3 w - - 0 1", True),
+                ("4k3/8/8/8/8/8/P7/4K3 w - - 0 1", False),
+                ("2b1k3/8/8/8/8/8/8/2B1K3 w - - 0 1", False),
+                ("2b1k3/8/8/8/8/8/8/3BK3 w - - 0 1", True)]:
+            self.assertSame(Board.fromFEN(fen).isDeadMaterial(), dead, fen)
+        #//for
 
 #---------------------------------------------------------------------
 
 group = lintest.TestGroup()
 group.add(T_conversionFunctions)
 group.add(T_Board)
+group.add(T_zobrist)
+group.add(T_pack)
+group.add(T_draws)
 
 if __name__=='__main__': group.run()
 
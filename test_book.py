@@ -0,0 +1,184 @@
+# test_book.py = test <book.py>
+
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from ulib import lintest
+
+from board import *
+from movegen import pmovs
+import book
+from book import OpeningBook
+from search import Search, Limits
+
+#---------------------------------------------------------------------
+
+GAMES = """\
+# a few openings
+1. e2e4 e7e5 2. g1f3 b8c6 3. f1b5 1-0
+1. e2e4 e7e5 2. g1f3 g8f6 0-1
+1.e2e4 c7c5 2.g1f3 d7d6 1/2-1/2
+
+d2d4 d7d5 c2c4 e7e6
+e2e4 e7e5 g1f3 b8c6 f1c4
+d2d4 g8f6 c2c4 e7e5 e1e8 h7h6
+"""
+
+def startMoves(bk: OpeningBook) -> Dict[Almov,int]:
+    return {toAlmov(mv): w for mv, w in bk.probe(Board.startPosition())}
+
+#---------------------------------------------------------------------
+
+class T_games(lintest.TestCase):
+    """ reading games """
+
+    def test_parse(self):
+        self.assertSame(book.parseMoveList("1. e2e4 e7e5 2.g1f3 1-0"),
+            ["e2e4", "e7e5", "g1f3"], "numbers and result skipped")
+
+    def test_records(self):
+        recs = book.gameRecords(["e2e4", "e7e5", "e1e8", "g1f3"])
+        self.assertSame(len(recs), 2, "stops at an impossible move")
+        self.assertSame(recs[0], (Board.startPosition().getKey(),
+            book.encodeMove(almovMov("e2e4"))), "first record")
+        self.assertSame(len(book.gameRecords(["e2e4"]*30, 1)), 1,
+            "only maxPly moves")
+
+    def test_moveCode(self):
+        mv = almovMov("h7h8")
+        self.assertSame(book.decodeMove(book.encodeMove(mv)), mv,
+            "decode(encode())")
+
+#---------------------------------------------------------------------
+
+class T_book(lintest.TestCase):
+    """ building and probing books """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+        self.games = os.path.join(self.dir, "games.txt")
+        with open(self.games, "w") as f:
+            f.write(GAMES)
+        self.fn = os.path.join(self.dir, "book.bin")
+        book.buildBook([self.games], self.fn, numWorkers=2, chunkGames=2)
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_probe(self):
+        with OpeningBook(self.fn) as bk:
+            self.assertSame(startMoves(bk), {"e2e4": 4, "d2d4": 2},
+                "moves from the start position")
+            b = Board.startPosition().makeMove("e2e4").makeMove("e7e5")
+            self.assertSame(
+                {toAlmov(mv): w for mv, w in bk.probe(b)},
+                {"g1f3": 3}, "after 1 e4 e5")
+            b = b.makeMove("g1f3").makeMove("b8c6")
+            self.assertSame(
+                {toAlmov(mv): w for mv, w in bk.probe(b)},
+                {"f1b5": 1, "f1c4": 1}, "after 2 Nf3 Nc6")
+            b = Board.fromFEN("8/8/4k3/8/8/4K3/8/8 w - - 0 1")
+            self.assertSame(bk.probe(b), [], "not in the book")
+
+    def test_sameInOneProcess(self):
+        fn = os.path.join(self.dir, "book1.bin")
+        book.buildBook([self.games], fn, numWorkers=0)
+        with open(fn, "rb") as f1, open(self.fn, "rb") as f2:
+            self.assertTrue(f1.read() == f2.read(),
+                "the same book without a pool")
+
+    def test_minWeight(self):
+        fn = os.path.join(self.dir, "book2.bin")
+        n = book.buildBook([self.games], fn, minWeight=2, numWorkers=0)
+        with OpeningBook(fn) as bk:
+            self.assertSame(len(bk), n, "number of records")
+            self.assertSame(startMoves(bk), {"e2e4": 4, "d2d4": 2},
+                "start moves kept")
+            b = Board.startPosition().makeMove("d2d4")
+            self.assertSame(bk.probe(b), [], "moves played once left out")
+
+    def test_binarySearch(self):
+        fn = os.path.join(self.dir, "big.bin")
+        rnd = np.random.default_rng(1)
+        keys = rnd.integers(0, 1<<63, 5000, dtype=np.uint64)
+        keys[100:110] = keys[99] # some keys with several moves
+        k, m, w = book.aggregate(keys,
+            np.arange(5000, dtype=np.uint16) % 7,
+            np.ones(5000, dtype=np.uint32))
+        recs = np.zeros(len(k), dtype=book.RECORD_DTYPE)
+        recs['key'], recs['move'], recs['weight'] = k, m, w
+        book.writeBook(fn, recs, 10)
+        with OpeningBook(fn) as bk:
+            ok = all(len(bk.lookup(int(key))) == int((k == key).sum())
+                     for key in list(k[::97]) + [k[0], k[-1]])
+            self.assertTrue(ok, "finds every record for a key")
+            self.assertSame(len(bk.lookup(int(keys[99]))), 7,
+                "11 moves, 7 different ones")
+            self.assertSame(bk.lookup(0), [], "a key that isn't there")
+
+    def test_pgn(self):
+        fn = os.path.join(self.dir, "games.pgn")
+        with open(fn, "w") as f:
+            f.write('[Event "a"]\n\n1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 '
+                    '4. O-O Be7 5. d4 1-0\n\n'
+                    '[Event "b"]\n[FEN "8/8/4k3/8/8/4K3/8/8 w - - 0 1"]\n\n'
+                    '1. Kd3 *\n')
+        bn = os.path.join(self.dir, "pgn.bin")
+        self.assertSame(book.buildBook([fn], bn, numWorkers=0), 9,
+            "a record for each move of the first game")
+        with OpeningBook(bn) as bk:
+            self.assertSame(startMoves(bk), {"e2e4": 1}, "start move")
+            b = Board.startPosition()
+            for am in ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6"]:
+                b = b.makeMove(am)
+            self.assertSame(bk.lookup(b.getKey()),
+                [(almovMov("e1g1"), 1)], "castling is in the book")
+
+    def test_bad(self):
+        fn = os.path.join(self.dir, "junk.bin")
+        with open(fn, "wb") as f:
+            f.write(b"x"*100)
+        ok = False
+        try:
+            OpeningBook(fn)
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "not a book raises ValueError")
+
+    def test_choose(self):
+        with OpeningBook(self.fn, seed=1) as bk:
+            b = Board.startPosition()
+            self.assertSame(toAlmov(bk.choose(b, best=True)), "e2e4",
+                "most played")
+            self.assertSame(
+                toAlmov(bk.choose(b, rootMoves=[almovMov("d2d4")])),
+                "d2d4", "only from rootMoves")
+            chosen = set(toAlmov(bk.choose(b)) for _ in range(50))
+            self.assertSame(chosen, {"e2e4", "d2d4"}, "chosen at random")
+
+    def test_search(self):
+        with OpeningBook(self.fn) as bk:
+            s = Search(book=bk)
+            b = Board.startPosition()
+            mv, score = s.think(b, Limits(depth=3))
+            self.assertTrue(toAlmov(mv) in ("e2e4", "d2d4"), "a book move")
+            self.assertSame((s.stats['bookHits'], s.stats['nodes'],
+                s.depthReached), (1, 0, 0), "without searching")
+            b = b.makeMove("a2a3")
+            mv, score = s.think(b, Limits(depth=2))
+            self.assertSame((s.stats['bookHits'], s.depthReached), (0, 2),
+                "searched when out of the book")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_games)
+group.add(T_book)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,120 @@
+# test_endgame.py = test <endgame.py>
+
+from ulib import lintest
+
+from board import *
+import evalpos
+from evalpos import staticEval
+import endgame
+from endgame import findEndgame, KNOWN_WIN
+
+#---------------------------------------------------------------------
+
+class T_dispatch(lintest.TestCase):
+    """ finding the endgame from the material key """
+
+    def test_find(self):
+        self.assertSame(findEndgame(Board.startPosition()), None,
+            "not an endgame")
+        eg = findEndgame(Board.fromFEN("8/8/8/3k4/8/8/8/R3K3 w - - 0 1"))
+        self.assertSame((eg.name, eg.strong), ("KRK", 'W'), "KRK for white")
+        eg = findEndgame(Board.fromFEN("8/8/8/3k4/8/8/8/r3K3 w - - 0 1"))
+        self.assertSame((eg.name, eg.strong), ("KRK", 'B'), "KRK for black")
+        eg = findEndgame(Board.fromFEN("8/p4bk1/8/8/8/8/PP3BK1/8 w - - 0 1"))
+        self.assertSame(eg.name, "KBPPKBP", "bishops and pawns")
+
+    def test_signatureKey(self):
+        b = Board.fromFEN("8/8/8/3k4/8/8/3N4/1B2K3 w - - 0 1")
+        self.assertSame(endgame.signatureKey("KBNK"), b.getMaterialKey(),
+            "KBNK")
+        self.assertSame(endgame.signatureKey("KBNK", 'B'),
+            b.getMirror().getMaterialKey(), "KBNK for black")
+
+#---------------------------------------------------------------------
+
+class T_evaluators(lintest.TestCase):
+    """ the specialised evaluations """
+
+    def test_KRK(self):
+        centre = staticEval(Board.fromFEN("8/8/8/3k4/8/8/8/R3K3 w - - 0 1"))
+        b = Board.fromFEN("3k4/8/3K4/8/8/8/8/R7 w - - 0 1")
+        edge = staticEval(b)
+        self.assertTrue(centre > KNOWN_WIN, "a known win")
+        self.assertTrue(edge > centre, "better with the king on the edge")
+        self.assertSame(staticEval(b.getMirror()), -edge,
+            "the same for black")
+
+    def test_KBNK(self):
+        right = staticEval(Board.fromFEN("k7/8/2K5/8/8/8/3N4/1B6 w - - 0 1"))
+        wrong = staticEval(Board.fromFEN("7k/8/5K2/8/8/8/3N4/1B6 w - - 0 1"))
+        self.assertTrue(right > wrong,
+            "the light-squared bishop mates in a8, not h8")
+
+    def test_KPK(self):
+        cases = [
+            # outside the square
+            ("8/8/8/8/P7/8/8/5k1K w - - 0 1", True),
+            ("8/8/8/4k3/P7/8/8/7K b - - 0 1", False),
+            # lone king in front of the pawn
+            ("8/8/4k3/8/4P3/4K3/8/8 w - - 0 1", False),
+            # rook pawn, lone king in the corner
+            ("k7/8/1K6/P7/8/8/8/8 w - - 0 1", False),
+            # king on a key square
+            ("8/8/8/2k1K3/8/4P3/8/8 w - - 0 1", True),
+            # the pawn can be taken
+            ("8/8/8/8/8/8/3kP3/7K b - - 0 1", False),
+            # the lone king in front, but not close enough to draw
+            ("4k3/8/8/8/8/8/1K2P3/8 w - - 0 1", None),
+            ("6k1/6P1/8/4K3/8/8/8/8 w - - 0 1", None),
+            ("5k2/5P2/8/3K4/8/8/8/8 w - - 0 1", None),
+            ("3k4/8/8/8/8/3PK3/8/8 w - - 0 1", None),
+            ("4k3/8/8/8/8/8/4P3/7K w - - 0 1", None),
+            # outside the square, but promoting would stalemate
+            ("8/1P6/k7/8/K7/8/8/8 w - - 0 1", None),
+            # stalemate
+            ("k7/2K5/1P6/8/8/8/8/8 b - - 0 1", False),
+        ]
+        for fen, wins in cases:
+            b = Board.fromFEN(fen)
+            v = staticEval(b)
+            if wins:
+                self.assertTrue(v > KNOWN_WIN, fen + " wins")
+            elif wins is None:
+                self.assertTrue(0 < v < KNOWN_WIN, fen + " isn't clear")
+            else:
+                self.assertTrue(v < KNOWN_WIN, fen + " doesn't win")
+            self.assertSame(staticEval(b.getMirror()), -v,
+                fen + " the same for black")
+        self.assertSame(staticEval(Board.fromFEN(
+            "8/8/4k3/8/4P3/4K3/8/8 w - - 0 1")), 0, "a draw")
+
+    def test_insufficient(self):
+        for fen in ["8/8/3k4/8/8/8/8/4K3 w - - 0 1",
+                    "8/8/3k4/8/8/8/8/4KN2 w - - 0 1",
+                    "8/8/3k4/8/8/8/8/4KB2 b - - 0 1",
+                    "8/8/3k4/8/8/8/8/3NKN2 w - - 0 1",
+                    "8/5b2/3k4/8/8/8/8/4KB2 w - - 0 1"]:
+            b = Board.fromFEN(fen)
+            self.assertSame(staticEval(b), 0, fen)
+            self.assertSame(evalpos.lazyEval(b, -10, 10), (0, True),
+                fen + " lazily")
+
+    def test_oppositeBishops(self):
+        ocb = Board.fromFEN("8/p4bk1/8/8/8/8/PP3BK1/8 w - - 0 1")
+        general = (evalpos.material(ocb) + evalpos.pawnStructure(ocb)
+                   + evalpos.mobility(ocb))
+        self.assertSame(staticEval(ocb), int(general/2), "scaled by half")
+        same = Board.fromFEN("8/p4bk1/8/8/8/8/PP2B1K1/8 w - - 0 1")
+        general = (evalpos.material(same) + evalpos.pawnStructure(same)
+                   + evalpos.mobility(same))
+        self.assertSame(staticEval(same), general, "same colours unscaled")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_dispatch)
+group.add(T_evaluators)
+
+if __name__=='__main__': group.run()
+
+#end
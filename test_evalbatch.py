@@ -0,0 +1,144 @@
+# test_evalbatch.py = test <evalbatch.py>
+
+from ulib import lintest
+
+from board import *
+from movegen import randomPositions
+import evalpos
+import evalbatch
+from evalprofile import EvalProfiler
+
+#---------------------------------------------------------------------
+
+class T_encode(lintest.TestCase):
+    """ encoding positions as arrays """
+
+    def test_encodeBoards(self):
+        b = Board.startPosition()
+        arr = evalbatch.encodeBoards([b, Board()])
+        self.assertSame(arr.shape, (2, 64), "shape")
+        self.assertSame(int(arr[0, 0]), 4, "a1 is WR")
+        self.assertSame(int(arr[0, 6]), -1, "a7 is BP")
+        self.assertSame(int(arr[0, 4*8+7]), -6, "e8 is BK")
+        self.assertSame(int(abs(arr[1]).sum()), 0, "empty board")
+
+    def test_mirror(self):
+        b = Board.startPosition().makeMove("e2e4")
+        arr = evalbatch.mirrorArr(evalbatch.encodeBoards([b]))
+        sb = evalbatch.encodeBoards([b.getMirror()])
+        self.assertSame(arr.tolist(), sb.tolist(), "mirror")
+
+    def test_decode(self):
+        b = Board.fromFEN("r3k2r/pp3ppp/2n5/3q4/8/2N2B2/PPP2PPP/R2Q1RK1 "
+                          "b kq - 0 1")
+        b2 = evalbatch.decodeBoard(evalbatch.encodeBoards([b])[0], 'B')
+        self.assertSame(b2.sq, b.sq, "the same squares")
+        self.assertSame(b2.getKey() == b.getKey(), False,
+            "no castling")
+
+#---------------------------------------------------------------------
+
+class T_staticEvalBatch(lintest.TestCase):
+    """ batch evaluation gives the same results as staticEval() """
+
+    def test_terms(self):
+        boards = randomPositions(60)
+        arr = evalbatch.encodeBoards(boards)
+        self.assertSame(evalbatch.materialBatch(arr).tolist(),
+            [evalpos.material(b) for b in boards], "material")
+        self.assertSame(evalbatch.pawnStructureBatch(arr).tolist(),
+            [evalpos.pawnStructure(b) for b in boards], "pawn structure")
+        wCounts, bCounts = evalbatch.destCounts(arr)
+        self.assertSame(
+            evalbatch.mobilityBatch(arr, wCounts, bCounts).tolist(),
+            [evalpos.mobility(b) for b in boards], "mobility")
+
+    def test_pawns(self):
+        fens = [
+            "8/8/8/8/8/8/8/8 w - - 0 1",
+            "4k3/5ppp/5p2/8/5p2/8/8/4K3 w - - 0 1",
+            "4k3/pp6/8/1P1p4/P2P4/8/6P1/4K3 w - - 0 1",
+            "4k3/2p5/8/1P6/8/P7/P7/4K3 b - - 0 1",
+        ]
+        boards = [Board.fromFEN(fen) for fen in fens]
+        self.assertSame(evalbatch.staticEvalBatch(boards).tolist(),
+            [evalpos.staticEval(b) for b in boards], "pawn positions")
+
+    def test_staticEvalBatch(self):
+        boards = randomPositions(40, seed=2)
+        self.assertSame(evalbatch.staticEvalBatch(boards).tolist(),
+            [evalpos.staticEval(b) for b in boards], "random positions")
+
+    def test_features(self):
+        boards = randomPositions(40, seed=3)
+        X = evalbatch.featuresBatch(boards)
+        self.assertSame(X.shape, (40, len(evalbatch.FEATURE_NAMES)),
+            "one feature per weight")
+        self.assertSame((X @ evalbatch.weightVector()).tolist(),
+            [evalpos.staticEval(b) for b in boards],
+            "features times weights is the evaluation")
+
+    def test_params(self):
+        boards = randomPositions(40, seed=4)
+        params = evalpos.EvalParams({'N_VALUE': 250, 'DOUBLED': -40,
+                                     'EK': 9})
+        v = evalbatch.staticEvalBatch(boards, params)
+        self.assertSame(v.tolist(),
+            [evalpos.staticEval(b, params=params) for b in boards],
+            "other weights")
+        self.assertSame(v.tolist(),
+            (evalbatch.featuresBatch(boards)
+             @ evalbatch.weightVector(params)).tolist(),
+            "features times other weights")
+
+#---------------------------------------------------------------------
+
+ENDGAME_FENS = [
+    "8/8/8/4k3/8/8/8/KQ6 w - - 0 1", # KQK
+    "8/8/8/4k3/8/8/8/KQ6 b - - 0 1",
+    "8/8/8/4K3/8/8/8/kr6 w - - 0 1", # KRK, black the strong side
+    "4k3/8/8/8/8/8/1K2P3/8 w - - 0 1", # KPK
+    "4k3/8/8/8/8/8/1K2P3/8 b - - 0 1",
+    "7k/8/8/8/8/8/8/KBN5 w - - 0 1", # KBNK
+    "8/8/8/4k3/8/8/8/KN6 w - - 0 1", # KNK
+    "4k3/2b2p2/8/8/3B4/8/5P2/4K3 w - - 0 1", # opposite bishops
+]
+
+class T_endgames(lintest.TestCase):
+    """ endgames that endgame.py evaluates, through the batch
+    evaluation and the profiler
+    """
+
+    def test_endgames(self):
+        boards = [Board.fromFEN(fen) for fen in ENDGAME_FENS]
+        expected = [evalpos.staticEval(b) for b in boards]
+        self.assertSame(evalbatch.staticEvalBatch(boards).tolist(),
+            expected, "staticEvalBatch()")
+        prof = EvalProfiler()
+        self.assertSame([prof.staticEval(b) for b in boards], expected,
+            "EvalProfiler.staticEval()")
+        self.assertSame([prof.lazyEval(b, -10, 10) for b in boards],
+            [evalpos.lazyEval(b, -10, 10) for b in boards],
+            "EvalProfiler.lazyEval()")
+        self.assertSame(prof.breakdown(boards[0])['endgame'],
+            expected[0] - evalpos.material(boards[0])
+            - evalpos.mobility(boards[0]), "endgame term")
+
+    def test_arr(self):
+        boards = [Board.fromFEN(fen) for fen in ENDGAME_FENS
+                  if " w " in fen]
+        arr = evalbatch.encodeBoards(boards)
+        self.assertSame(evalbatch.staticEvalArr(arr).tolist(),
+            [evalpos.staticEval(b) for b in boards],
+            "decoded, white to move")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_encode)
+group.add(T_staticEvalBatch)
+group.add(T_endgames)
+
+if __name__=='__main__': group.run()
+
+#end
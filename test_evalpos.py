@@ -1,5 +1,9 @@
 # test_evalpos.py  = test <evalpos.py>
 
+import os
+import shutil
+import tempfile
+
 from ulib import lintest
 
 from board import *
@@ -96,6 +100,20 @@ class T_pawnStructure(lintest.TestCase):
             evalpos.ISOLATED*3 + evalpos.DOUBLED*2 
             + evalpos.PASSED + evalpos.PASSED_ADVANCE[9-4], 
             "black->white tripled isolated pawns on f-file, but passed")
+
+    def test_masks(self):
+        b = Board.fromFEN("6k1/p4p1p/8/3P4/1p6/8/PP3P1P/6K1 w - - 0 1")
+        wp, bp = evalpos.pawnMasks(b)
+        self.assertSame(evalpos.popcount(wp), 5, "5 white pawns")
+        self.assertSame(wp & evalpos.fileMask[4], evalpos.sqBit(4, 5),
+            "white d-pawn on d5")
+        self.assertSame(evalpos.mirrorMask(bp),
+            evalpos.pawnMasks(b.getMirror())[0], "mirror of mask")
+        self.assertTrue(evalpos.blackBlocking(b, 1, 2), "b4 blocks a2")
+        self.assertFalse(evalpos.blackBlocking(b, 4, 5), "d5 not blocked")
+        self.assertSame(evalpos.pawnStructure(b),
+            sum(evalpos.pawnTermsMasks(wp, bp))
+            - evalpos.pawnStructureW(b.getMirror()), "white minus black")
         
  
     
@@ -127,6 +145,176 @@ class T_mobility(lintest.TestCase):
     
 #---------------------------------------------------------------------
 
+class T_EvalCache(lintest.TestCase):
+    """ caching static evaluations """
+
+    def test_cache(self):
+        ec = evalpos.EvalCache(16)
+        b = Board.startPosition().makeMove("e2e4")
+        v = ec.staticEval(b)
+        self.assertSame(v, staticEval(b), "same as staticEval()")
+        self.assertSame((ec.hits, ec.misses), (0, 1), "1 miss")
+        v2 = ec.staticEval(b.copy())
+        self.assertSame(v2, v, "same value from cache")
+        self.assertSame((ec.hits, ec.misses), (1, 1), "1 hit")
+        self.assertApprox(ec.hitRate(), 0.5, "hit rate")
+
+    def test_replace(self):
+        ec = evalpos.EvalCache(1)
+        b = Board.startPosition()
+        b2 = b.makeMove("e2e4")
+        ec.staticEval(b)
+        ec.staticEval(b2)
+        self.assertSame(ec.staticEval(b), staticEval(b),
+            "replaced entry evaluated again")
+        self.assertSame(ec.misses, 3, "all misses in a 1-entry cache")
+
+    def test_lazyEval(self):
+        ec = evalpos.EvalCache(16)
+        b = Board.fromFEN("6k1/5ppp/8/8/8/8/5PPP/3QR1K1 w - - 0 1")
+        v, exact = ec.lazyEval(b, -100, 100)
+        self.assertFalse(exact, "a queen and rook up is outside the window")
+        self.assertTrue(v >= 100, "lazy score above beta")
+        self.assertSame(ec.misses, 1, "inexact score...")
+        ec.lazyEval(b, -100, 100)
+        self.assertSame(ec.misses, 2, "...isn't cached")
+        v, exact = ec.lazyEval(b, v-10, v+10)
+        self.assertTrue(exact, "full evaluation inside the window")
+        self.assertSame(v, staticEval(b), "same as staticEval()")
+        self.assertSame(ec.lazyEval(b, -100, 100), (v, True),
+                        "exact score from the cache")
+
+#---------------------------------------------------------------------
+
+class T_lazyEval(lintest.TestCase):
+    """ lazy evaluation, and the cheap terms it uses """
+
+    def test_pawnCache(self):
+        b = Board.fromFEN("6k1/p4ppp/8/3P4/8/8/PP3P1P/6K1 w - - 0 1")
+        self.assertSame(evalpos.pawnStructure(b),
+                        evalpos.calcPawnStructure(b), "cache miss")
+        self.assertSame(evalpos.pawnStructure(b.copy()),
+                        evalpos.calcPawnStructure(b), "cache hit")
+
+    def test_window(self):
+        b = Board.startPosition().makeMove("e2e4")
+        v = staticEval(b)
+        evalpos.resetLazyStats()
+        self.assertSame(staticEval(b, v-1, v+1), v, "inside window")
+        self.assertSame(evalpos.lazyStats['lazySkips'], 0, "not skipped")
+        lazyV = staticEval(b, 500, 600)
+        self.assertTrue(lazyV <= 500, "below window")
+        lazyV = staticEval(b, -600, -500)
+        self.assertTrue(lazyV >= -500, "above window")
+        self.assertSame(evalpos.lazyStats,
+                        {'lazyEvals': 3, 'lazySkips': 2}, "counters")
+
+#---------------------------------------------------------------------
+
+class T_weights(lintest.TestCase):
+    """ replacing the weights """
+
+    def setUpAll(self):
+        self.saved = evalpos.getWeights()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDownAll(self):
+        evalpos.setWeights(self.saved)
+        shutil.rmtree(self.dir)
+
+    def test_setWeights(self):
+        b = Board.fromFEN("6k1/5ppp/8/8/8/8/P4PPP/6K1 w - - 0 1")
+        v = staticEval(b)
+        evalpos.setWeights({'P_VALUE': 150})
+        self.assertSame(evalpos.pieceValues[BP], -150, "piece values")
+        self.assertSame(staticEval(b), v+50, "one more pawn for white")
+        evalpos.setWeights(self.saved)
+        self.assertSame(staticEval(b), v, "back as before")
+        ok = False
+        try:
+            evalpos.setWeights({'NO_SUCH': 1})
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "unknown weight raises ValueError")
+
+    def test_saveLoad(self):
+        fn = os.path.join(self.dir, "weights.json")
+        evalpos.setWeights({'ISOLATED': -33})
+        evalpos.saveWeights(fn)
+        evalpos.setWeights(self.saved)
+        evalpos.loadWeights(fn)
+        self.assertSame(evalpos.defaultParams.ISOLATED, -33, "loaded weight")
+        self.assertSame(evalpos.getWeights()['P_VALUE'],
+            self.saved['P_VALUE'], "other weights saved too")
+        evalpos.setWeights(self.saved)
+
+#---------------------------------------------------------------------
+
+class T_EvalParams(lintest.TestCase):
+    """ more than one set of weights """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_twoSets(self):
+        b = Board.fromFEN("6k1/p4ppp/8/3P4/8/8/PP3P1P/6K1 w - - 0 1")
+        heavy = evalpos.EvalParams({'ISOLATED': -100, 'P_VALUE': 90},
+                                   name="heavy")
+        self.assertSame(staticEval(b, params=evalpos.EvalParams()),
+            staticEval(b), "default weights")
+        self.assertSame(staticEval(b, params=heavy) - staticEval(b),
+            (-100 - evalpos.ISOLATED)*(3-1) + (90 - evalpos.P_VALUE)*(5-4),
+            "isolated pawns and pawns, white's minus black's")
+        self.assertSame(heavy.pieceValues[BP], -90, "piece values")
+        self.assertSame(evalpos.pieceValues[BP], -evalpos.P_VALUE,
+            "defaults unchanged")
+
+    def test_pawnCache(self):
+        b = Board.fromFEN("6k1/p4ppp/8/3P4/8/8/PP3P1P/6K1 w - - 0 1")
+        heavy = evalpos.EvalParams({'ISOLATED': -100})
+        v = evalpos.pawnStructure(b)
+        self.assertSame(evalpos.pawnStructure(b, heavy),
+            evalpos.calcPawnStructure(b, heavy),
+            "not the default set's cached value")
+        self.assertSame(evalpos.pawnStructure(b), v, "default still cached")
+
+    def test_evalCache(self):
+        b = Board.fromFEN("6k1/5ppp/8/8/4N3/8/5PPP/6K1 w - - 0 1")
+        params = evalpos.EvalParams({'CENTER': 50, 'BASE': 7})
+        ec = evalpos.EvalCache(16, params)
+        self.assertSame(ec.staticEval(b), staticEval(b, params=params),
+            "cache evaluates with its params")
+        self.assertTrue(ec.staticEval(b) != staticEval(b),
+            "different from the defaults")
+
+    def test_saveLoad(self):
+        fn = os.path.join(self.dir, "params.json")
+        evalpos.EvalParams({'PASSED': 44}).save(fn)
+        params = evalpos.EvalParams.load(fn, name="loaded")
+        self.assertSame(params.PASSED, 44, "loaded weight")
+        self.assertSame(params.toDict(),
+            dict(evalpos.getWeights(), PASSED=44), "all the weights")
+        self.assertSame(params.name, "loaded", "name")
+
+    def test_bad(self):
+        ok = False
+        try:
+            evalpos.EvalParams({'NO_SUCH': 1})
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "unknown weight raises ValueError")
+        ok = False
+        try:
+            evalpos.EvalParams({'PASSED_ADVANCE': [1, 2]})
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "short PASSED_ADVANCE raises ValueError")
+
+#---------------------------------------------------------------------
+
 class T_swapOff(lintest.TestCase):
     """ test swap-off """
     
@@ -150,6 +338,10 @@ group = lintest.TestGroup()
 group.add(T_material)
 group.add(T_pawnStructure)
 group.add(T_mobility)
+group.add(T_EvalCache)
+group.add(T_lazyEval)
+group.add(T_weights)
+group.add(T_EvalParams)
 group.add(T_swapOff)
 
 if __name__=='__main__': group.run()
@@ -0,0 +1,86 @@
+# test_evalprofile.py  = test <evalprofile.py>
+
+import json
+import os
+import shutil
+import tempfile
+
+from ulib import lintest
+
+from board import *
+import evalpos
+from evalpos import staticEval
+from evalprofile import EvalProfiler, TERM_NAMES, TIMED_TERMS
+from search import Search
+
+#---------------------------------------------------------------------
+
+class T_breakdown(lintest.TestCase):
+    """ per-term contributions """
+
+    def test_terms(self):
+        b = Board.fromFEN("6k1/p4ppp/8/3P4/8/8/PP3P1P/6K1 w - - 0 1")
+        r = EvalProfiler().breakdown(b)
+        self.assertSame(sorted(r), sorted(TERM_NAMES + ['total']),
+            "all the terms")
+        self.assertSame(r['total'], staticEval(b), "same as staticEval()")
+        self.assertSame(r['material'], evalpos.material(b), "material")
+        self.assertSame(r['pawnStructure'], evalpos.pawnStructure(b),
+            "pawn structure")
+        self.assertSame(r['pawnStructure'],
+            sum(r[name] for name in TERM_NAMES if name.startswith("pawn.")),
+            "pawn terms add up")
+        self.assertSame(r['mobility'], r['mobilityW'] + r['mobilityB'],
+            "mobility terms add up")
+        self.assertSame(r['pawn.isolatedW'], 3*evalpos.ISOLATED,
+            "isolated white d, f and h pawns")
+        self.assertTrue(r['pawn.passedW'] > 0, "passed white d-pawn")
+        self.assertSame(r['pawn.doubledB'], 0, "no doubled black pawns")
+
+#---------------------------------------------------------------------
+
+class T_report(lintest.TestCase):
+    """ cumulative times and calls """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_search(self):
+        prof = EvalProfiler()
+        s = Search(evalCache=prof)
+        mv, score = s.search(Board.startPosition(), 2)
+        mv2, score2 = Search().search(Board.startPosition(), 2)
+        self.assertSame((mv, score), (mv2, score2), "same search result")
+        rep = prof.report()
+        self.assertSame(rep['evals'], s.stats['evals'],
+            "every evaluation profiled")
+        self.assertSame(rep['terms']['material']['calls'], rep['evals'],
+            "material calls")
+        self.assertTrue(rep['terms']['mobilityW']['seconds'] > 0,
+            "mobility took some time")
+
+    def test_dump(self):
+        prof = EvalProfiler()
+        prof.breakdown(Board.startPosition())
+        fn = os.path.join(self.dir, "profile.json")
+        prof.dump(fn)
+        with open(fn) as f:
+            rep = json.load(f)
+        self.assertSame(sorted(rep['terms']), sorted(TIMED_TERMS),
+            "timed terms in JSON")
+        self.assertSame(rep['evals'], 1, "1 evaluation")
+        prof.reset()
+        self.assertSame(prof.report()['evals'], 0, "reset")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_breakdown)
+group.add(T_report)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,38 @@
+# test_game.py = test <game.py>
+
+from ulib import lintest
+
+from board import *
+from movegen import pmovs
+from game import readMove
+
+#---------------------------------------------------------------------
+
+class T_readMove(lintest.TestCase):
+    """ reading the player's moves """
+
+    def test_forms(self):
+        b = Board.startPosition()
+        mvs = pmovs(b, 'W')
+        self.assertSame(readMove(b, "g1f3", mvs), almovMov("g1f3"),
+            "Almov")
+        self.assertSame(readMove(b, " Nf3 ", mvs), almovMov("g1f3"), "SAN")
+        self.assertSame(readMove(b, "e2e5", mvs), None, "not a move")
+        self.assertSame(readMove(b, "Zz9", mvs), None, "not SAN")
+
+    def test_rankDisambiguated(self):
+        b = Board.fromFEN("7k/8/8/8/R7/8/8/R6K w - - 0 1")
+        mvs = pmovs(b, 'W')
+        self.assertSame(readMove(b, "R1a3", mvs), almovMov("a1a3"),
+            "the rook on a1")
+        self.assertSame(readMove(b, "R4a3", mvs), almovMov("a4a3"),
+            "the rook on a4")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_readMove)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,76 @@
+# test_mate.py = test <mate.py>
+
+from ulib import lintest
+
+from board import *
+import mate
+from mate import MateSolver, legalChildren, lineSan
+
+#---------------------------------------------------------------------
+
+# the position after 13...Kg5 in Ed. Lasker v Thomas, London 1912
+LASKER = "rn3r2/pbppq1p1/1p2pN2/6k1/3P2N1/3B4/PPP2PPP/R3K2R w KQ - 3 14"
+
+def solveSan(fen: str, maxMoves: int, **kw) -> Optional[Tuple[int,List[str]]]:
+    b = Board.fromFEN(fen)
+    r = MateSolver(**kw).solve(b, maxMoves)
+    if r is None: return None
+    return r[0], lineSan(b, r[1])
+
+#---------------------------------------------------------------------
+
+class T_moves(lintest.TestCase):
+    """ the solver's moves """
+
+    def test_children(self):
+        b = Board.fromFEN("4k3/1P6/8/8/8/8/8/R3K2R w KQ - 0 1")
+        mps = [mate.moveStr(mp) for mp, _ in legalChildren(b)]
+        self.assertSame(sorted(am for am in mps if am.startswith("b7")),
+            ["b7b8", "b7b8b", "b7b8n", "b7b8r"], "all the promotions")
+        self.assertTrue("e1g1" in mps and "e1c1" in mps, "castling")
+        checks = [mate.moveStr(mp) for mp, _ in legalChildren(b, True)]
+        self.assertSame(sorted(checks),
+            ["a1a8", "b7b8", "b7b8r", "h1h8"], "only checks")
+
+#---------------------------------------------------------------------
+
+class T_solve(lintest.TestCase):
+    """ finding mates """
+
+    def test_short(self):
+        self.assertSame(solveSan("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", 3),
+            (1, ["Ra8#"]), "mate in 1")
+        self.assertSame(solveSan("r1b2k1r/ppp1bppp/8/1B1Q4/5q2/2P5/"
+                                 "PPP2PPP/R3R1K1 w - - 1 1", 3),
+            (2, ["Qd8+", "Bxd8", "Re8#"]), "mate in 2")
+        self.assertSame(solveSan("5rk1/5Npp/8/8/2Q5/8/6PP/6K1 w - - 0 1", 3),
+            (3, ["Nh6+", "Kh8", "Qg8+", "Rxg8", "Nf7#"]), "smothered mate")
+
+    def test_none(self):
+        self.assertSame(solveSan("6k1/5ppp/8/8/8/8/8/R5K1 b - - 0 1", 3),
+            None, "no mate for black")
+        self.assertSame(solveSan("7k/8/5K2/8/8/8/8/6R1 w - - 0 1", 3),
+            None, "none with checks only")
+        self.assertSame(solveSan("7k/8/5K2/8/8/8/8/6R1 w - - 0 1", 3,
+                                 checksOnly=False),
+            (2, ["Kf7", "Kh7", "Rh1#"]), "a quiet first move")
+
+    def test_longer(self):
+        b = Board.fromFEN(LASKER)
+        s = MateSolver()
+        r = s.solve(b, 5)
+        self.assertSame(r[0], 4, "mate in 4")
+        self.assertTrue(lineSan(b, r[1])[-1].endswith("#"), "ends in mate")
+        self.assertTrue(s.stats['nodes'] < 1000, "a small tree")
+        s = MateSolver(maxNodes=50)
+        self.assertSame(s.solve(b, 5), None, "gives up at the node limit")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_moves)
+group.add(T_solve)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -73,8 +73,65 @@ class T_moveGeneration(lintest.TestCase):
 
 #---------------------------------------------------------------------
 
+class T_check(lintest.TestCase):
+    """ check detection and special moves """
+
+    def test_isAttacked(self):
+        b = board.Board.fromFEN("4k3/8/8/3n4/8/8/1P6/R3K3 w - - 0 1")
+        self.assertTrue(isAttacked(b, toSqix("a8"), 'W'), "rook up the file")
+        self.assertTrue(isAttacked(b, toSqix("c3"), 'W'), "pawn")
+        self.assertTrue(not isAttacked(b, toSqix("b3"), 'W'),
+            "pawns don't attack forwards")
+        self.assertTrue(isAttacked(b, toSqix("e3"), 'B'), "knight")
+        self.assertTrue(not isAttacked(b, toSqix("e1"), 'B'), "not in check")
+        self.assertTrue(inCheck(board.Board.fromFEN(
+            "4k3/8/8/8/1b6/8/8/4K3 w - - 0 1"), 'W'), "bishop checks")
+
+    def test_legalMoves(self):
+        b = board.Board.fromFEN("4r1k1/8/8/8/8/8/4N3/4K3 w - - 0 1")
+        mvs = [movAlmov(mv) for mv in legalMoves(b)]
+        self.assertTrue(all(not am.startswith("e2") for am in mvs),
+            "the pinned knight can't move")
+        self.assertSame(sorted(mvs),
+            ['e1d1', 'e1d2', 'e1f1', 'e1f2'], "only king moves")
+
+    def test_special(self):
+        b = board.Board.fromFEN("4k3/8/8/3pP3/8/8/8/R3K2R w KQ - 0 1")
+        b2 = playMove(b, almovMov("e5d6"))
+        self.assertSame((b2.getSq("d6"), b2.getSq("d5")), ('P', ' '),
+            "en passant")
+        self.assertTrue(not isEnPassant(b, almovMov("e5e6")),
+            "a pawn moving forward isn't en passant")
+        b2 = playMove(b, almovMov("e1c1"))
+        self.assertSame((b2.getSq("c1"), b2.getSq("d1"), b2.getSq("a1")),
+            ('K', 'R', ' '), "castling queen side")
+        self.assertSame(b2.getKey(), b2.calcKey(), "key")
+        b = board.Board.fromFEN("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+        self.assertSame(playMove(b, almovMov("b7b8"), 'N').getSq("b8"), 'N',
+            "promotion to a knight")
+
+    def test_castlingMoves(self):
+        b = board.Board.fromFEN("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        self.assertSame(sorted(movAlmov(mv) for mv in castlingMoves(b)),
+            ["e1c1", "e1g1"], "both sides")
+        b.mover = 'B'
+        self.assertSame(len(castlingMoves(b)), 2, "black too")
+        b = board.Board.fromFEN("r3k2r/8/8/8/8/8/8/R3K2R w Qkq - 0 1")
+        self.assertSame([movAlmov(mv) for mv in castlingMoves(b)],
+            ["e1c1"], "no right to castle king side")
+        b = board.Board.fromFEN("r3k2r/8/8/8/8/8/8/RN2K1nR w KQkq - 0 1")
+        self.assertSame(castlingMoves(b), [], "blocked")
+        b = board.Board.fromFEN("r3k2r/8/8/8/8/8/5r2/R3K2R w KQkq - 0 1")
+        self.assertSame([movAlmov(mv) for mv in castlingMoves(b)],
+            ["e1c1"], "f1 is attacked")
+        b = board.Board.fromFEN("4k3/8/8/8/8/8/4r3/R3K2R w KQ - 0 1")
+        self.assertSame(castlingMoves(b), [], "not out of check")
+
+#---------------------------------------------------------------------
+
 group = lintest.TestGroup()
 group.add(T_moveGeneration)
+group.add(T_check)
 
 if __name__=='__main__': group.run()
 
@@ -0,0 +1,82 @@
+# test_movegenbatch.py = test <movegenbatch.py>
+
+from ulib import lintest
+
+from board import *
+from movegen import pmovs, randomPositions
+import movegenbatch
+from movegenbatch import encodeBoards, pmovsBatch
+
+#---------------------------------------------------------------------
+
+class T_pmovsBatch(lintest.TestCase):
+    """ batched pseudo-move generation matches pmovs() """
+
+    def test_empty(self):
+        r = pmovsBatch(encodeBoards([Board()]), 'W', packed=True)
+        self.assertSame(r.counts.tolist(), [0], "no moves")
+        self.assertSame(r.moves.shape, (0, 3), "no packed moves")
+
+    def test_start(self):
+        b = Board.startPosition()
+        arr = encodeBoards([b])
+        for p in ['W', 'B']:
+            r = pmovsBatch(arr, p, packed=True)
+            self.assertSame(int(r.counts[0]), 20,
+                form("{} has 20 moves", p))
+            mvs = sorted((int(src), int(dest))
+                         for _, src, dest in r.moves)
+            self.assertSame(mvs, sorted(pmovs(b, p)),
+                form("{}'s moves", p))
+
+    def test_attacks(self):
+        b = Board()
+        b.setSq("a1", WR)
+        b.setSq("a4", BP)
+        b.setSq("c1", WN)
+        r = pmovsBatch(encodeBoards([b]), 'W')
+        att = r.attacks[0]
+        idx = movegenbatch.sqixIdx
+        self.assertSame(int(att[idx[toSqix("a4")]]), 1, "R attacks a4")
+        self.assertSame(int(att[idx[toSqix("a5")]]), 0, "a5 blocked")
+        self.assertSame(int(att[idx[toSqix("b1")]]), 1,
+            "R attacks b1, blocked by N after that")
+        self.assertSame(int(att[idx[toSqix("b3")]]), 1, "N attacks b3")
+        self.assertSame(int(r.counts[0]), 3+1+4, "R, N moves")
+
+    def test_random(self):
+        boards = randomPositions(200, seed=3)
+        arr = encodeBoards(boards)
+        for p in ['W', 'B']:
+            r = pmovsBatch(arr, p, packed=True)
+            self.assertSame(r.counts.tolist(),
+                [len(pmovs(b, p)) for b in boards],
+                form("{}'s move counts", p))
+            got = [[] for b in boards]
+            for n, src, dest in r.moves.tolist():
+                got[n].append((src, dest))
+            self.assertSame([sorted(mvs) for mvs in got],
+                [sorted(pmovs(b, p)) for b in boards],
+                form("{}'s moves", p))
+
+    def test_chunks(self):
+        boards = randomPositions(30, seed=4)
+        arr = encodeBoards(boards)
+        whole = pmovsBatch(arr, 'B', packed=True)
+        oldChunk = movegenbatch.BATCH_CHUNK
+        movegenbatch.BATCH_CHUNK = 7
+        chunked = pmovsBatch(arr, 'B', packed=True)
+        movegenbatch.BATCH_CHUNK = oldChunk
+        self.assertSame(chunked.attacks.tolist(), whole.attacks.tolist(),
+            "same attacks in chunks")
+        self.assertSame(sorted(chunked.moves.tolist()),
+            sorted(whole.moves.tolist()), "same moves in chunks")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_pmovsBatch)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,170 @@
+# test_nnue.py = test <nnue.py>
+
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from ulib import lintest
+
+from board import *
+from movegen import pmovs, randomPositions
+import evalpos
+import nnue
+from nnue import NnueNet, NnueEval, Accumulator
+from search import Search
+
+#---------------------------------------------------------------------
+
+class T_features(lintest.TestCase):
+    """ feature indexes """
+
+    def test_mirror(self):
+        wk = nnue.sqIndex[nnue.WHITE_VIEW][toSqix("g1")]
+        bk = nnue.sqIndex[nnue.BLACK_VIEW][toSqix("g8")]
+        self.assertSame(wk, bk, "kings on the same square, mirrored")
+        self.assertSame(
+            nnue.featureIndex(nnue.WHITE_VIEW, wk, WP, toSqix("e2")),
+            nnue.featureIndex(nnue.BLACK_VIEW, bk, BP, toSqix("e7")),
+            "own pawn on the same square, mirrored")
+
+    def test_active(self):
+        b = Board.startPosition()
+        for p in (nnue.WHITE_VIEW, nnue.BLACK_VIEW):
+            k = nnue.kingSquare(b, p)
+            fs = nnue.activeFeatures(b, p, k)
+            self.assertSame(len(set(fs)), 30, "30 pieces that aren't kings")
+            self.assertTrue(all(0 <= f < nnue.NUM_FEATURES for f in fs),
+                "in range")
+        self.assertSame(nnue.kingSquare(Board(), nnue.WHITE_VIEW),
+            nnue.NO_KING, "no king")
+
+#---------------------------------------------------------------------
+
+class T_accumulator(lintest.TestCase):
+    """ incremental updates give the same values as adding up """
+
+    def setUpAll(self):
+        self.net = NnueNet.random(8)
+
+    def same(self, b: Board) -> bool:
+        fresh = Accumulator.fromBoard(self.net, b)
+        return (b.accumulator.kingSqs == fresh.kingSqs
+                and np.allclose(b.accumulator.getValues(), fresh.values,
+                                atol=1e-4))
+
+    def test_randomGame(self):
+        rnd = random.Random(5)
+        b = Board.startPosition()
+        b.accumulator = Accumulator.fromBoard(self.net, b)
+        ok = True
+        for _ in range(80):
+            mvs = pmovs(b, b.mover)
+            if not mvs: break
+            b = b.makeMove(rnd.choice(mvs))
+            ok = ok and self.same(b)
+        #//for
+        self.assertTrue(ok, "every position along a random game")
+
+    def test_lazy(self):
+        b = Board.startPosition()
+        b.accumulator = Accumulator.fromBoard(self.net, b)
+        for mv in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5"]:
+            b = b.makeMove(mv)
+        self.assertSame(b.accumulator.values, None, "not added up yet")
+        self.assertTrue(self.same(b), "5 moves added at once")
+
+    def test_special(self):
+        for fen, mv in [
+                ("6k1/P7/8/8/8/8/8/4K3 w - - 0 1", "a7a8"), # promotion
+                ("6k1/8/8/8/8/8/8/r3K3 w - - 0 1", "e1d1"), # king moves
+                ("6k1/8/8/8/8/8/3q4/4K3 w - - 0 1", "e1d2"), # K captures
+                ("6k1/8/8/8/8/8/3q4/4K3 b - - 0 1", "d2e1"), # K captured
+            ]:
+            b = Board.fromFEN(fen)
+            b.accumulator = Accumulator.fromBoard(self.net, b)
+            self.assertTrue(self.same(b.makeMove(mv)), fen + " " + mv)
+
+    def test_invalidate(self):
+        b = Board.startPosition()
+        b.accumulator = Accumulator.fromBoard(self.net, b)
+        b.setSq("e2", EMPTY)
+        self.assertSame(b.accumulator, None, "altering the board")
+
+#---------------------------------------------------------------------
+
+class T_NnueEval(lintest.TestCase):
+    """ evaluating with a network """
+
+    def test_material(self):
+        ev = NnueEval(NnueNet.fromMaterial())
+        boards = randomPositions(100, seed=3)
+        self.assertSame([ev.staticEval(b) for b in boards],
+            [evalpos.material(b) for b in boards],
+            "the material network is the same as material()")
+        params = evalpos.EvalParams({'N_VALUE': 333})
+        ev = NnueEval(NnueNet.fromMaterial(params))
+        self.assertSame([ev.staticEval(b) for b in boards],
+            [evalpos.material(b, params) for b in boards],
+            "with other weights")
+
+    def test_search(self):
+        b = Board.fromFEN("6k1/5ppp/8/q7/8/8/5PPP/3R2K1 w - - 0 1")
+        ev = NnueEval(NnueNet.fromMaterial())
+        s = Search(evalCache=ev)
+        mv, score = s.search(b, 3)
+        self.assertTrue(b.accumulator is not None, "root prepared")
+        self.assertSame(ev.refreshes, 1, "only the root added up")
+        self.assertTrue(ev.evals > 0, "evaluations made")
+        self.assertTrue(mv is not None, "a move")
+
+    def test_accuracy(self):
+        r = nnue.accuracy(NnueNet.fromMaterial(),
+                          randomPositions(50))
+        self.assertTrue(r['correlation'] > 0.5,
+            "material correlates with staticEval()")
+
+#---------------------------------------------------------------------
+
+class T_weights(lintest.TestCase):
+    """ saving and loading networks """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_saveLoad(self):
+        fn = os.path.join(self.dir, "net.npz")
+        net = NnueNet.random(4, seed=7)
+        net.save(fn)
+        net2 = NnueNet.load(fn)
+        self.assertTrue(np.array_equal(net.W1, net2.W1), "W1")
+        self.assertSame((net2.hidden, net2.scale), (4, 100.0),
+            "size and scale")
+        b = Board.startPosition().makeMove("d2d4")
+        self.assertSame(NnueEval(net2).staticEval(b),
+            NnueEval(net).staticEval(b), "same evaluation")
+
+    def test_badShape(self):
+        ok = False
+        try:
+            NnueNet(np.zeros((10, 4)), np.zeros(4), np.zeros(8))
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "wrong W1 shape raises ValueError")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_features)
+group.add(T_accumulator)
+group.add(T_NnueEval)
+group.add(T_weights)
+
+if __name__=='__main__': group.run()
+
+#end
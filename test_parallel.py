@@ -0,0 +1,63 @@
+# test_parallel.py = test <parallel.py>
+
+from ulib import lintest
+
+from board import *
+import parallel
+from parallel import ParallelSearch
+from search import Limits
+
+#---------------------------------------------------------------------
+
+QUEEN_HANGS = "6k1/5ppp/8/3q4/8/8/1N3PPP/3R2K1 w - - 0 1"
+
+class T_parallel(lintest.TestCase):
+    """ parallel search with a pool of processes """
+
+    def test_lazy(self):
+        b = Board.fromFEN(QUEEN_HANGS)
+        with ParallelSearch(numWorkers=2, mode=parallel.LAZY,
+                            ttEntries=1<<12) as ps:
+            mv, score = ps.think(b, Limits(depth=2))
+            self.assertSame(toAlmov(mv), "d1d5", "rook takes queen")
+            self.assertTrue(score > 0, "good for white")
+            self.assertSame(ps.depthReached, 2,
+                "searched to depth 2, not deeper")
+            self.assertTrue(ps.tt.used() > 0,
+                "workers' results are in the shared table")
+            self.assertTrue(ps.stats['nodes'] > 0, "stats collected")
+
+    def test_split(self):
+        b = Board.fromFEN(QUEEN_HANGS)
+        with ParallelSearch(numWorkers=3, mode=parallel.SPLIT,
+                            ttEntries=1<<12) as ps:
+            mv, score = ps.think(b, Limits(depth=2))
+            self.assertSame(toAlmov(mv), "d1d5", "rook takes queen")
+            self.assertSame(ps.depthReached, 2, "searched to depth 2")
+
+    def test_sharedTable(self):
+        b = Board.fromFEN(QUEEN_HANGS)
+        with ParallelSearch(numWorkers=1, ttEntries=1<<12) as ps:
+            ps.think(b, Limits(depth=2))
+            with ParallelSearch(numWorkers=1, ttName=ps.tt.name) as ps2:
+                self.assertSame(ps2.tt.numEntries, 1<<12, "same table")
+                ps2.think(b, Limits(depth=2))
+                self.assertTrue(ps2.stats['ttCutoffs'] > 0,
+                    "second search uses the first one's results")
+
+    def test_badMode(self):
+        ok = False
+        try:
+            ParallelSearch(numWorkers=1, mode="nonsense")
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "unknown mode raises ValueError")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_parallel)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,132 @@
+# test_pgn.py = test <pgn.py>
+
+import io
+
+from ulib import lintest
+
+from board import *
+from movegen import playMove
+import pgn
+
+#---------------------------------------------------------------------
+
+OPERA = """\
+[Event "Paris"]
+[Site "Paris FRA"]
+[White "Paul Morphy"]
+[Black "Duke Karl / Count Isouard"]
+[Result "1-0"]
+
+1.e4 e5 2.Nf3 d6 3.d4 Bg4 {This is a weak move
+already.--Fischer} 4.dxe5 Bxf3 5.Qxf3 dxe5 6.Bc4 Nf6 7.Qb3 Qe7
+8.Nc3 c6 9.Bg5 $1 b5 ; a comment to the end of the line
+10.Nxb5! cxb5 11.Bxb5+ Nbd7 12.O-O-O Rd8 (12...Qb4 13.Qxb4 (13.Bxf6)
+13...Bxb4) 13.Rxd7 Rxd7 14.Rd1 Qe6 15.Bxd7+ Nxd7 16.Qb8+ Nxb8
+17.Rd8# 1-0
+"""
+
+SPECIAL = """\
+[Event "en passant and under-promotion"]
+[SetUp "1"]
+[FEN "k7/2P5/8/8/3p4/8/4P3/7K w - - 0 1"]
+
+1. e4 dxe3 2. c8=N Kb7 3. Kg2 *
+
+[Event "pinned knight"]
+[FEN "4r1k1/8/8/8/8/1N6/4N3/4K3 w - - 0 1"]
+
+1. Nd4 Kh8 *
+
+[Event "illegal"]
+
+1. e4 e5 2. Ke3 *
+
+[Event "castling"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 5. d3 O-O *
+"""
+
+def finalBoard(moves, promo=None) -> Board:
+    b, mv = moves[-1]
+    return playMove(b, mv, promo)
+
+#---------------------------------------------------------------------
+
+class T_read(lintest.TestCase):
+    """ reading games """
+
+    def test_headers(self):
+        games = list(pgn.readGames(io.StringIO(OPERA)))
+        self.assertSame(len(games), 1, "one game")
+        g = games[0]
+        self.assertSame(g.headers["White"], "Paul Morphy", "White")
+        self.assertSame(g.result, "1-0", "result")
+        self.assertSame(len(g.sans), 33, "comments and variations skipped")
+        self.assertSame(g.sans[:3], ["e4", "e5", "Nf3"], "first moves")
+        self.assertSame(g.sans[-1], "Rd8#", "last move")
+
+    def test_chunks(self):
+        big = list(pgn.readGames(io.StringIO(SPECIAL + OPERA)))
+        small = list(pgn.readGames(io.StringIO(SPECIAL + OPERA), 7))
+        self.assertSame([(g.headers, g.sans) for g in small],
+            [(g.headers, g.sans) for g in big], "read 7 characters at a time")
+        self.assertSame(len(big), 5, "5 games")
+        binary = list(pgn.readGames(io.BytesIO(OPERA.encode()), 5))
+        self.assertSame(binary[0].sans, big[4].sans, "a binary file")
+
+    def test_noResult(self):
+        games = list(pgn.readGames(io.StringIO(
+            '[Event "a"]\n\n1. e4 e5\n\n[Event "b"]\n\n1. d4\n')))
+        self.assertSame([g.sans for g in games], [["e4", "e5"], ["d4"]],
+            "games without results")
+
+#---------------------------------------------------------------------
+
+class T_replay(lintest.TestCase):
+    """ replaying the moves """
+
+    def test_opera(self):
+        (headers, moves), = pgn.replayGames(io.StringIO(OPERA))
+        self.assertSame(len(moves), 33, "all the moves")
+        self.assertSame(toAlmov(moves[21][1]), "b8d7", "Nbd7")
+        self.assertSame(toAlmov(moves[22][1]), "e1c1", "O-O-O")
+        b = finalBoard(moves)
+        self.assertSame(b.getSq("d1"), EMPTY, "rook left d1")
+        self.assertSame(b.getSq("d8"), WR, "mate on d8")
+        self.assertSame(b.getKey(), b.calcKey(), "key is right")
+
+    def test_special(self):
+        errors = []
+        games = list(pgn.replayGames(io.StringIO(SPECIAL), errors=errors))
+        self.assertSame(len(games), 3, "the illegal game is skipped")
+        self.assertSame(errors, ["game 3: move 2. Ke3: 0 moves match"],
+            "error message")
+
+        moves = games[0][1]
+        b = playMove(*moves[1])
+        self.assertSame((b.getSq("e3"), b.getSq("e4")), (BP, EMPTY),
+            "en passant")
+        game = list(pgn.readGames(io.StringIO(SPECIAL)))[0]
+        b, mv, promo = list(game.replay())[2]
+        self.assertSame(playMove(b, mv, promo).getSq("c8"), WN,
+            "promoted to a knight")
+
+        self.assertSame(toAlmov(games[1][1][0][1]), "b3d4",
+            "the pinned knight can't move")
+
+        b = finalBoard(games[2][1])
+        self.assertSame(
+            [b.getSq(a) for a in ("g1", "f1", "h1", "g8", "f8", "h8")],
+            [WK, WR, EMPTY, BK, BR, EMPTY], "castled on both sides")
+        self.assertSame((b.castleWK, b.castleWQ, b.castleBK),
+            (False, False, False), "castling rights")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_read)
+group.add(T_replay)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,140 @@
+# test_posindex.py = test <posindex.py>
+
+import io
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from ulib import lintest
+
+from board import *
+import posindex
+from posindex import PositionIndex
+from movegen import randomPositions
+
+#---------------------------------------------------------------------
+
+POSITIONS = """\
+# the same position 3 times, with different counters
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - bm e4;
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 5 9
+
+not a position
+6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1
+6k1/5ppp/8/8/8/8/8/R5K1 b - - 0 1
+"""
+
+def writeFens(filename: str, boards: List[Board]):
+    with open(filename, "w") as f:
+        for b in boards:
+            f.write(b.toFen() + "\n")
+
+#---------------------------------------------------------------------
+
+class T_index(lintest.TestCase):
+    """ building and looking up in indexes """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+        self.boards = randomPositions(600, seed=3)
+        self.fens = os.path.join(self.dir, "a.fen")
+        writeFens(self.fens, self.boards[:400])
+        self.fens2 = os.path.join(self.dir, "b.fen")
+        writeFens(self.fens2, self.boards[300:])
+        self.fn = os.path.join(self.dir, "a.idx")
+        posindex.buildIndex([self.fens], self.fn, 10, numWorkers=2,
+                            chunkLines=50)
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_build(self):
+        keys = set(b.getKey() for b in self.boards[:400])
+        with PositionIndex(self.fn) as ix:
+            self.assertSame(len(ix), len(keys), "one key per position")
+            self.assertSame(list(ix.keys), sorted(keys), "sorted keys")
+            self.assertTrue(ix.bloom is not None, "has a Bloom filter")
+        fn = os.path.join(self.dir, "nopool.idx")
+        posindex.buildIndex([self.fens], fn, 10, numWorkers=0)
+        with open(fn, "rb") as f, open(self.fn, "rb") as f2:
+            self.assertTrue(f.read() == f2.read(), "the same without a pool")
+
+    def test_contains(self):
+        rnd = random.Random(1)
+        others = [rnd.getrandbits(64) for _ in range(2000)]
+        with PositionIndex(self.fn) as ix:
+            self.assertTrue(all(b in ix for b in self.boards[:400]),
+                "all the positions")
+            self.assertFalse(any(k in ix for k in others),
+                "not random keys")
+            self.assertTrue(ix.stats['bloomRejects'] > 1900,
+                "most turned away by the Bloom filter")
+            keys = np.array([b.getKey() for b in self.boards[:400]]
+                            + others, np.uint64)
+            self.assertSame(list(ix.containsKeys(keys)),
+                [True]*400 + [False]*2000, "many at once")
+
+    def test_merge(self):
+        fn2 = os.path.join(self.dir, "b.idx")
+        posindex.buildIndex([self.fens2], fn2, numWorkers=0)
+        merged = os.path.join(self.dir, "merged.idx")
+        n = posindex.mergeIndexes([self.fn, fn2], merged, 10)
+        keys = set(b.getKey() for b in self.boards)
+        self.assertSame(n, len(keys), "each key once")
+        with PositionIndex(merged) as ix, PositionIndex(fn2) as ix2:
+            self.assertSame(ix2.bloom, None, "built without a filter")
+            self.assertTrue(all(b in ix for b in self.boards),
+                "all the positions")
+
+    def test_bad(self):
+        fn = os.path.join(self.dir, "bad.idx")
+        with open(fn, "wb") as f:
+            f.write(b"not an index at all, not at all!")
+        ok = False
+        try:
+            PositionIndex(fn)
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "not an index raises ValueError")
+
+#---------------------------------------------------------------------
+
+class T_dedup(lintest.TestCase):
+    """ leaving out positions seen before """
+
+    def test_dedup(self):
+        out = io.StringIO()
+        errors: List[str] = []
+        r = posindex.dedup(io.StringIO(POSITIONS), out, errors=errors)
+        self.assertSame(r, (3, 2), "3 kept, 2 left out")
+        self.assertSame(out.getvalue().splitlines(),
+            [POSITIONS.splitlines()[i] for i in (1, 6, 7)],
+            "the first of each, in order")
+        self.assertSame(len(errors), 1, "the bad line")
+
+    def test_withIndex(self):
+        d = tempfile.mkdtemp()
+        try:
+            fn = os.path.join(d, "seen.idx")
+            posindex.writeIndex(fn, np.array(
+                [Board.startPosition().getKey()], np.uint64), 10)
+            out = io.StringIO()
+            with PositionIndex(fn) as ix:
+                r = posindex.dedup(io.StringIO(POSITIONS), out, ix)
+            self.assertSame(r, (2, 3), "the start position is in the index")
+        finally:
+            shutil.rmtree(d)
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_index)
+group.add(T_dedup)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,121 @@
+# test_san.py = test <san.py>
+
+from ulib import lintest
+
+from board import *
+from movegen import pmovs, legalMoves, isEnPassant, randomPositions
+import san
+from san import MoveIndex, SanError, sanToMove, moveToSan
+
+#---------------------------------------------------------------------
+
+def isError(f) -> bool:
+    try:
+        f()
+    except SanError:
+        return True
+    return False
+
+#---------------------------------------------------------------------
+
+class T_parse(lintest.TestCase):
+    """ parsing SAN """
+
+    def test_parts(self):
+        self.assertSame(san.parseSan("Nbd7"), ("N", 2, 0, toSqix("d7"), None),
+            "from file")
+        self.assertSame(san.parseSan("R1a3"), ("R", 0, 1, toSqix("a3"), None),
+            "from rank")
+        self.assertSame(san.parseSan("Qh4xe1+"),
+            ("Q", 8, 4, toSqix("e1"), None), "from square")
+        self.assertSame(san.parseSan("exd8=N#"),
+            ("P", 5, 0, toSqix("d8"), "N"), "promotion")
+        self.assertSame(san.parseSan("0-0-0")[0], san.CASTLE_LONG, "castling")
+
+    def test_bad(self):
+        self.assertTrue(isError(lambda: san.parseSan("Xe4")), "Xe4")
+        self.assertTrue(isError(lambda: san.parseSan("e9")), "e9")
+        self.assertTrue(isError(lambda: san.parseSan("Nd8=Q")),
+            "only pawns promote")
+
+#---------------------------------------------------------------------
+
+class T_convert(lintest.TestCase):
+    """ converting between SAN and moves """
+
+    def test_index(self):
+        ok = True
+        for b in randomPositions(200):
+            idx = MoveIndex(b)
+            pieces = set(sv for sv in b.sq if isPlayer(sv, b.mover))
+            found = set(mv for pv in pieces for sx in sqixs
+                        for mv in idx.movesTo(pv, sx)
+                        if not isEnPassant(b, mv))
+            ok = ok and found == set(pmovs(b, b.mover))
+        #//for b
+        self.assertTrue(ok, "the index has the same moves as pmovs()")
+
+    def test_roundTrip(self):
+        ok = True
+        for b in randomPositions(300, seed=2):
+            mvs = legalMoves(b)
+            sans = [moveToSan(b, mv) for mv in mvs]
+            ok = (ok and len(set(sans)) == len(sans)
+                  and all(sanToMove(b, s)[0] == mv
+                          for s, mv in zip(sans, mvs)))
+        #//for b
+        self.assertTrue(ok, "every legal move, to SAN and back")
+
+    def test_disambiguation(self):
+        b = Board.fromFEN("4k3/8/8/8/8/R6R/8/R3K3 w - - 0 1")
+        self.assertSame(moveToSan(b, "h3d3"), "Rhd3", "by file")
+        self.assertSame(moveToSan(b, "a1a2"), "R1a2", "by rank")
+        b = Board.fromFEN("4k3/8/8/8/Q2Q4/8/8/Q3K3 w - - 0 1")
+        self.assertSame(moveToSan(b, "a4d1"), "Qa4d1", "by square")
+        self.assertSame(sanToMove(b, "Qa4d1"), (almovMov("a4d1"), None),
+            "and back")
+        self.assertTrue(isError(lambda: sanToMove(b, "Qd1")), "ambiguous")
+        b = Board.fromFEN("4r1k1/8/8/8/8/1N6/4N3/4K3 w - - 0 1")
+        self.assertSame(moveToSan(b, "b3d4"), "Nd4",
+            "not from a pinned piece")
+
+    def test_special(self):
+        b = Board.fromFEN("r3k3/1P6/8/3pP3/8/8/8/R3K2R w KQq - 0 1")
+        self.assertSame(moveToSan(b, "e5d6"), "exd6", "en passant")
+        self.assertSame(sanToMove(b, "exd6")[0], almovMov("e5d6"),
+            "en passant back")
+        self.assertSame(moveToSan(b, "b7a8", WN), "bxa8=N",
+            "under-promotion")
+        self.assertSame(sanToMove(b, "bxa8=N"), (almovMov("b7a8"), WN),
+            "under-promotion back")
+        self.assertSame(moveToSan(b, "b7b8"), "b8=Q+", "promotion, check")
+        self.assertSame(moveToSan(b, "e1g1"), "O-O", "castling")
+        self.assertSame(sanToMove(b, "O-O-O")[0], almovMov("e1c1"),
+            "castling back")
+        self.assertTrue(isError(lambda: sanToMove(b, "exf6")),
+            "no pawn to take en passant")
+
+    def test_checks(self):
+        b = Board.fromFEN("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        self.assertSame(moveToSan(b, "a1a8"), "Ra8#", "mate")
+        self.assertSame(moveToSan(b, "a1a8", checks=False), "Ra8",
+            "without checks")
+        b = Board.fromFEN("6k1/5pp1/8/8/8/8/8/R5K1 w - - 0 1")
+        self.assertSame(moveToSan(b, "a1a8"), "Ra8+", "check")
+        self.assertSame(san.movesToSan(Board.startPosition(),
+            ["e2e4", "e7e5", "g1f3"]), ["e4", "e5", "Nf3"], "a line")
+
+    def test_errors(self):
+        b = Board.startPosition()
+        self.assertTrue(isError(lambda: sanToMove(b, "Nd2")), "no move")
+        self.assertTrue(isError(lambda: moveToSan(b, "e2e5")), "not a move")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_parse)
+group.add(T_convert)
+
+if __name__=='__main__': group.run()
+
+#end
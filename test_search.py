@@ -0,0 +1,178 @@
+# test_search.py = test <search.py>
+
+from ulib import lintest
+
+from board import *
+from movegen import pmovs
+import evalpos
+import search
+from search import Search, Limits, orderMoves, lmrReduction
+
+#---------------------------------------------------------------------
+
+def queenHangs() -> Board:
+    """ a position where white can capture a black queen """
+    b = Board()
+    b.setSq("a1", WK)
+    b.setSq("d1", WR)
+    b.setSq("b2", WN)
+    b.setSq("d5", BQ)
+    b.setSq("h8", BK)
+    b.setSq("g7", BP)
+    return b
+
+class T_helpers(lintest.TestCase):
+    """ helper functions for searching """
+
+    def test_lmrReduction(self):
+        self.assertSame(lmrReduction(3, 1), 0, "first move not reduced")
+        self.assertSame(lmrReduction(2, 30), 0,
+            "no reduction that would drop into quiescence")
+        self.assertTrue(lmrReduction(8, 20) >= 1, "late move reduced")
+        self.assertTrue(lmrReduction(8, 40) >= lmrReduction(8, 5),
+            "later moves reduced at least as much")
+        self.assertTrue(lmrReduction(10, 20) >= lmrReduction(4, 20),
+            "deeper searches reduced at least as much")
+
+    def test_orderMoves(self):
+        b = queenHangs()
+        b.setSq("d2", BP)
+        mvs = orderMoves(b, pmovs(b, 'W'))
+        self.assertSame(toAlmov(mvs[0]), "d1d2",
+            "capturing the pawn that blocks the queen comes first")
+        b.setSq("c4", BQ)
+        mvs = orderMoves(b, pmovs(b, 'W'))
+        self.assertSame(toAlmov(mvs[0]), "b2c4",
+            "capturing a queen comes before capturing a pawn")
+
+#---------------------------------------------------------------------
+
+class T_search(lintest.TestCase):
+    """ searching for the best move """
+
+    def test_captureQueen(self):
+        for depth in [1, 2, 3]:
+            s = Search()
+            mv, score = s.search(queenHangs(), depth)
+            self.assertSame(toAlmov(mv), "d1d5",
+                form("depth {}: rook takes queen", depth))
+            self.assertTrue(score > 0, "good for white")
+
+    def test_captureKing(self):
+        b = queenHangs()
+        b.setSq("h1", BK)
+        b.setSq("h8", EMPTY)
+        mv, score = Search().search(b, 2)
+        self.assertSame(toAlmov(mv), "d1h1", "rook takes king")
+        self.assertSame(score, search.MATE, "king capture scores MATE")
+
+    def test_pruningOff(self):
+        b = Board.fromFEN("6k1/5ppp/8/3q4/8/8/1N3PPP/3R2K1 w - - 0 1")
+        s = Search(useNullMove=False, useLmr=False, useFutility=False)
+        mv, _ = s.search(b, 3)
+        self.assertSame(toAlmov(mv), "d1d5", "rook takes queen")
+        self.assertSame(s.stats['nullMoveTries'], 0, "no null moves")
+        self.assertSame(s.stats['lmrReductions'], 0, "no reductions")
+        self.assertSame(s.stats['futilityPrunes'], 0, "no futility")
+
+        s2 = Search()
+        mv2, _ = s2.search(b, 3)
+        self.assertSame(mv2, mv, "same move with pruning")
+        self.assertTrue(s2.stats['nodes'] <= s.stats['nodes'],
+            "pruning doesn't search more nodes")
+
+    def test_lazyEval(self):
+        b = Board.fromFEN("6k1/5ppp/8/3q4/8/8/1N3PPP/3R2K1 w - - 0 1")
+        s = Search(useLazyEval=False)
+        mv, score = s.search(b, 3)
+        self.assertSame(s.stats['lazySkips'], 0, "nothing skipped")
+        s2 = Search()
+        mv2, score2 = s2.search(b, 3)
+        self.assertSame((mv2, score2), (mv, score), "same result when lazy")
+        self.assertTrue(s2.stats['lazySkips'] > 0, "some evals skipped")
+
+    def test_params(self):
+        b = Board.fromFEN("6k1/5ppp/8/q7/8/8/5PPP/3R2K1 w - - 0 1")
+        params = evalpos.EvalParams({'Q_VALUE': 2000})
+        s = Search(params=params)
+        mv, score = s.search(b, 2)
+        self.assertSame(s.evalCache.params, params, "cache uses params")
+        mv2, score2 = Search().search(b, 2)
+        self.assertTrue(score < score2, "black's queen is worth more")
+
+    def test_zugzwangGuard(self):
+        b = Board.fromFEN("8/8/4k3/8/4P3/4K3/8/8 w - - 0 1")
+        s = Search(useLmr=False, useFutility=False)
+        s.search(b, 4)
+        self.assertSame(s.stats['nullMoveTries'], 0,
+            "no null move with only pawns")
+
+#---------------------------------------------------------------------
+
+class T_think(lintest.TestCase):
+    """ iterative deepening within limits """
+
+    def test_depthLimit(self):
+        s = Search()
+        mv, _ = s.think(queenHangs(), Limits(depth=2))
+        self.assertSame(toAlmov(mv), "d1d5", "rook takes queen")
+        self.assertSame(s.depthReached, 2, "searched to depth 2")
+
+    def test_nodeLimit(self):
+        b = Board.startPosition()
+        s = Search()
+        mv, score = s.think(b, Limits(nodes=300))
+        self.assertTrue(mv is not None, "returns a move")
+        self.assertSame(s.stats['nodes'], 300, "stopped at the node limit")
+
+        s2 = Search()
+        mv2, score2 = s2.think(b, Limits(nodes=300))
+        self.assertSame((mv2, score2, s2.depthReached),
+                        (mv, score, s.depthReached),
+                        "node limits are deterministic")
+
+    def test_tinyNodeLimit(self):
+        s = Search()
+        mv, _ = s.think(Board.startPosition(), Limits(nodes=5))
+        self.assertTrue(mv is not None,
+            "returns a move even if no iteration completes")
+        self.assertSame(s.depthReached, 0, "no iteration completed")
+
+    def test_timeLimit(self):
+        s = Search()
+        mv, _ = s.think(Board.startPosition(), Limits(seconds=0.2))
+        self.assertTrue(mv is not None, "returns a move")
+        self.assertTrue(s.elapsed < 1.0, "stopped in time")
+
+    def test_principalVariation(self):
+        b = Board.startPosition()
+        s = Search()
+        mv, _ = s.think(b, Limits(depth=3))
+        pv = s.principalVariation(b, mv)
+        self.assertSame(pv[0], mv, "starts with the best move")
+        self.assertTrue(1 < len(pv) <= 3, "a few moves long")
+        self.assertSame(s.principalVariation(b, None), [], "no move")
+
+    def test_draws(self):
+        b = Board.startPosition()
+        for am in ["g1f3", "g8f6", "f3g1"]:
+            b = b.makeMove(am)
+        s = Search()
+        score = s.negamax(b.makeMove("f6g8"), 3, -search.INFINITY,
+                          search.INFINITY, 1, True)
+        self.assertSame((score, s.stats['draws'], s.stats['nodes']),
+            (search.DRAW, 1, 1), "a repetition isn't searched")
+        b = Board.fromFEN("4k3/8/8/8/8/8/8/2B1K3 w - - 0 1")
+        mv, score = Search().think(b, Limits(depth=3))
+        self.assertSame(score, search.DRAW, "KBK is a draw")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_helpers)
+group.add(T_search)
+group.add(T_think)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,184 @@
+# test_tablebase.py = test <tablebase.py>
+
+import os
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from ulib import lintest
+
+from board import *
+import tablebase
+import endgame
+from tablebase import TableSpec, TablebaseSet, Tablebase, DRAW, INVALID
+from search import Search, Limits, MATE
+
+#---------------------------------------------------------------------
+
+class T_indexes(lintest.TestCase):
+    """ position indexes """
+
+    def test_roundTrip(self):
+        for sig in ["KRK", "KPK", "KQKR"]:
+            spec = TableSpec.fromSig(sig)
+            idx = np.arange(0, spec.size, 997)
+            sq, stm = spec.decode(idx)
+            self.assertSame(spec.encode(sq, stm).tolist(), idx.tolist(),
+                sig + " encode(decode())")
+            i = int(idx[5])
+            self.assertSame(spec.index(sq[5].tolist(), int(stm[5])), i,
+                sig + " scalar index")
+
+    def test_symmetry(self):
+        spec = TableSpec.fromSig("KRK")
+        sq = np.array([[tablebase.sqNum(toSqix(a)) for a in squares]
+                       for squares in [("g7", "b5", "c2"),
+                                       ("b7", "g5", "f2"),
+                                       ("b2", "g4", "f7")]])
+        idx = spec.encode(sq, np.zeros(3, dtype=np.int64))
+        self.assertSame(len(set(idx.tolist())), 1,
+            "reflections have the same index")
+
+    def test_badSpec(self):
+        ok = False
+        try:
+            TableSpec("KQ", "Kp")
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "bad pieces raise ValueError")
+
+#---------------------------------------------------------------------
+
+class T_tables(lintest.TestCase):
+    """ making and probing tables """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+        # KQK isn't asked for, but KPK needs it
+        tablebase.makeTables(self.dir, ["KRK", "KPK"])
+        self.tbs = TablebaseSet(self.dir)
+
+    def tearDownAll(self):
+        self.tbs.close()
+        shutil.rmtree(self.dir)
+
+    def probe(self, fen: str):
+        return self.tbs.probe(Board.fromFEN(fen))
+
+    def test_prerequisites(self):
+        self.assertSame(tablebase.prerequisites("KQKR"), ["KQK", "KRK"],
+            "captures")
+        self.assertSame(tablebase.prerequisites("KPK"), ["KQK"],
+            "promotion")
+        self.assertSame(tablebase.prerequisites("KBNK"), [],
+            "insufficient material isn't a table")
+        self.assertSame(tablebase.withPrerequisites(["KPK", "KQKR"], []),
+            ["KQK", "KPK", "KRK", "KQKR"], "in the order to make them")
+        self.assertSame(tablebase.withPrerequisites(["KPK"], ["KKQ"]),
+            ["KPK"], "not ones there already")
+        self.assertTrue(os.path.exists(tablebase.tablePath(self.dir, "KQK")),
+            "KQK made for KPK")
+
+    def test_longestMates(self):
+        for sig, plies in [("KQK", 19), ("KRK", 31), ("KPK", 55)]:
+            codes = self.tbs.tables[sig].values().astype(np.int64)
+            wl = (codes != DRAW) & (codes != INVALID)
+            wins = (codes - 1)[wl & ((codes - 1) % 2 == 1)]
+            self.assertSame(int(wins.max()), plies,
+                form("{} longest mate is {} moves", sig, (plies+1)//2))
+
+    def test_mateAndStalemate(self):
+        self.assertSame(self.probe("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1"),
+            (-1, 0), "checkmated")
+        self.assertSame(self.probe("k7/2Q5/1K6/8/8/8/8/8 b - - 0 1"),
+            (0, 0), "stalemate")
+        self.assertSame(self.probe("k7/2Q5/1K6/8/8/8/8/8 w - - 0 1"),
+            (1, 1), "mate in 1")
+        self.assertSame(self.probe("k7/1Q6/1K6/8/8/8/8/8 w - - 0 1"),
+            None, "illegal: black is in check with white to move")
+        self.assertSame(self.probe("k7/1Q6/8/8/8/8/8/7K b - - 0 1"),
+            (0, 0), "the queen can be taken")
+
+    def test_KPK(self):
+        self.assertSame(self.probe("8/8/4k3/8/4P3/4K3/8/8 w - - 0 1"),
+            (0, 0), "king in front of the pawn")
+        self.assertSame(self.probe("4k3/8/4K3/4P3/8/8/8/8 b - - 0 1")[0],
+            -1, "king on the 6th wins")
+        self.assertSame(self.probe("k7/8/1K6/P7/8/8/8/8 w - - 0 1"),
+            (0, 0), "rook pawn")
+
+    def test_colours(self):
+        rnd = random.Random(3)
+        ok = True
+        n = 0
+        while n < 200:
+            sqs = rnd.sample(sqixs, 3)
+            b = Board()
+            b.sq[sqs[0]] = WK
+            b.sq[sqs[1]] = BK
+            b.sq[sqs[2]] = WR
+            b.mover = rnd.choice("WB")
+            r = self.tbs.probe(b)
+            if r is None: continue
+            n += 1
+            ok = ok and self.tbs.probe(b.getMirror()) == r
+        #//while
+        self.assertTrue(ok, "the same with the colours swapped")
+
+    def test_kpkRules(self):
+        rnd = random.Random(5)
+        falseDraws = falseWins = n = 0
+        while n < 3000:
+            sk, wk, pawn = rnd.sample(sqixs, 3)
+            if sqixFR(pawn)[1] in (1, 8): continue
+            b = Board()
+            b.sq[sk] = WK
+            b.sq[wk] = BK
+            b.sq[pawn] = WP
+            b.mover = rnd.choice("WB")
+            r = self.tbs.probe(b)
+            if r is None: continue
+            n += 1
+            wins = r[0] == (1 if b.mover == 'W' else -1)
+            k = endgame.kpkResult(endgame.relative(sk, 'W'),
+                endgame.relative(wk, 'W'), endgame.relative(pawn, 'W'),
+                b.mover == 'W')
+            falseDraws += k is False and wins
+            falseWins += k is True and not wins
+        #//while
+        self.assertSame(falseDraws, 0, "endgame.kpkResult() no false draws")
+        self.assertSame(falseWins, 0, "endgame.kpkResult() no false wins")
+
+    def test_file(self):
+        fn = os.path.join(self.dir, "junk.dat")
+        with open(fn, "wb") as f:
+            f.write(b"x"*100)
+        ok = False
+        try:
+            Tablebase(fn)
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "not a tablebase raises ValueError")
+
+    def test_search(self):
+        b = Board.fromFEN("8/8/8/3k4/8/8/8/R3K3 w - - 0 1")
+        s = Search(tablebases=self.tbs)
+        mv, score = s.think(b, Limits(depth=4))
+        self.assertTrue(s.stats['tbHits'] > 0, "tablebases probed")
+        self.assertSame(score, MATE - 1 - 26 - 1,
+            "score for a mate in 14 moves")
+        self.assertSame(self.tbs.probe(b.makeMove(mv)), (-1, 26),
+            "a move that keeps the mate in 14")
+        self.assertSame(s.depthReached, 1, "no need to search deeper")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_indexes)
+group.add(T_tables)
+
+if __name__=='__main__': group.run()
+
+#end
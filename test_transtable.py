@@ -0,0 +1,205 @@
+# test_transtable.py = test <transtable.py>
+
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+
+from ulib import lintest
+
+from board import *
+import transtable
+from transtable import (TransTable, SharedTransTable, MappedTransTable,
+    EXACT, LOWER, UPPER)
+
+#---------------------------------------------------------------------
+
+class T_TransTable(lintest.TestCase):
+    """ storing and probing """
+
+    def test_empty(self):
+        tt = TransTable(16)
+        self.assertSame(tt.probe(12345), None, "empty table")
+        self.assertSame(tt.used(), 0, "no entries used")
+
+    def test_store(self):
+        tt = TransTable(16)
+        tt.store(0x123456789abcdef0, (62,64), -57, 3, LOWER)
+        r = tt.probe(0x123456789abcdef0)
+        self.assertSame(r, ((62,64), -57, 3, LOWER), "entry stored")
+        self.assertSame(tt.probe(0x123456789abcdef1), None,
+            "different key")
+        tt.store(7, None, 100000, 1, EXACT)
+        self.assertSame(tt.probe(7), (None, 100000, 1, EXACT),
+            "no move, mate score")
+        self.assertSame(tt.used(), 2, "2 entries used")
+
+    def test_replace(self):
+        tt = TransTable(16)
+        tt.store(5, (22,23), 10, 2, EXACT)
+        tt.store(5+16, (32,33), 20, 1, UPPER)
+        self.assertSame(tt.probe(5), None, "replaced")
+        self.assertSame(tt.probe(21), ((32,33), 20, 1, UPPER),
+            "new entry")
+        tt.clear()
+        self.assertSame(tt.used(), 0, "cleared")
+
+    def test_badSize(self):
+        ok = False
+        try:
+            TransTable(100)
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "size not a power of 2")
+
+    def test_packData(self):
+        for fields in [((62,64), -57, 3, LOWER),
+                       (None, -100000, -1, UPPER),
+                       ((98,21), 100000, 64, EXACT)]:
+            data = transtable.packData(*fields)
+            self.assertSame(transtable.unpackData(data), fields,
+                "pack/unpack round trip")
+
+    def test_tornWrite(self):
+        tt = TransTable(16)
+        tt.store(0x1111, (22,23), 10, 2, EXACT)
+        tt.store(0x2222, (32,33), 20, 5, LOWER)
+        # simulate 2 processes writing entry 1 at once, so that the
+        # check word of one goes with the data word of the other:
+        struct.pack_into("<Q", tt.buf, 1*16+8,
+                         transtable.packData((42,43), 30, 1, UPPER))
+        self.assertSame(tt.probe(0x1111), None, "torn entry ignored")
+        self.assertSame(tt.probe(0x2222), ((32,33), 20, 5, LOWER),
+            "other entries fine")
+
+#---------------------------------------------------------------------
+
+def storeInOtherProcess(name: str):
+    tt = SharedTransTable.attach(name)
+    tt.store(999, (55,56), 42, 7, EXACT)
+    tt.close()
+
+class T_SharedTransTable(lintest.TestCase):
+    """ tables in shared memory """
+
+    def test_attach(self):
+        tt = SharedTransTable.create(64)
+        tt.store(12345, (62,64), 17, 4, EXACT)
+        tt2 = SharedTransTable.attach(tt.name)
+        self.assertSame(tt2.numEntries, 64, "size comes from header")
+        self.assertSame(tt2.probe(12345), ((62,64), 17, 4, EXACT),
+            "entry seen through attached table")
+        tt2.close()
+
+        p = multiprocessing.Process(target=storeInOtherProcess,
+                                    args=(tt.name,))
+        p.start()
+        p.join()
+        self.assertSame(tt.probe(999), ((55,56), 42, 7, EXACT),
+            "entry stored by another process")
+        tt3 = SharedTransTable.attach(tt.name)
+        self.assertSame(tt3.probe(999), ((55,56), 42, 7, EXACT),
+            "not deleted when the other process exits")
+        tt3.close()
+        tt.close()
+        ok = False
+        try:
+            SharedTransTable.attach(tt.name)
+        except FileNotFoundError:
+            ok = True
+        self.assertTrue(ok, "deleted when the creator closes it")
+
+    def test_badHeader(self):
+        tt = SharedTransTable.create(16)
+        tt.shm.buf[0:8] = b"NOTATTAB"
+        ok = False
+        try:
+            SharedTransTable.attach(tt.name)
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "bad magic number rejected")
+        tt.close()
+
+#---------------------------------------------------------------------
+
+class T_MappedTransTable(lintest.TestCase):
+    """ saving tables to files, and memory-mapping them back """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, "tt.bin")
+        tt = TransTable(32)
+        tt.store(12345, (62,64), 17, 4, EXACT)
+        tt.store(678, None, -300, 2, UPPER)
+        tt.save(self.fn)
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_open(self):
+        tt = MappedTransTable.open(self.fn)
+        self.assertSame(tt.numEntries, 32, "size comes from header")
+        self.assertSame(tt.probe(12345), ((62,64), 17, 4, EXACT),
+            "saved entry")
+        self.assertSame(tt.probe(678), (None, -300, 2, UPPER),
+            "saved entry")
+        tt.store(999, (22,23), 1, 1, LOWER)
+        self.assertSame(tt.probe(999), ((22,23), 1, 1, LOWER),
+            "can store in the mapped table")
+        tt.close()
+        tt = MappedTransTable.open(self.fn)
+        self.assertSame(tt.probe(999), None,
+            "without writeBack, the file isn't changed")
+        tt.close()
+
+    def test_writeBack(self):
+        fn2 = os.path.join(self.dir, "tt2.bin")
+        TransTable(16).save(fn2)
+        tt = MappedTransTable.open(fn2, writeBack=True)
+        tt.store(999, (22,23), 1, 1, LOWER)
+        tt.close()
+        tt = MappedTransTable.open(fn2)
+        self.assertSame(tt.probe(999), ((22,23), 1, 1, LOWER),
+            "with writeBack, the file is changed")
+        tt.close()
+
+    def rejects(self, data: bytes) -> bool:
+        """ is a table file containing (data) rejected? """
+        fn = os.path.join(self.dir, "bad.bin")
+        with open(fn, "wb") as f:
+            f.write(data)
+        try:
+            MappedTransTable.open(fn).close()
+        except ValueError:
+            return True
+        return False
+
+    def test_stale(self):
+        with open(self.fn, "rb") as f:
+            good = bytearray(f.read())
+        self.assertFalse(self.rejects(bytes(good)), "good file accepted")
+
+        bad = good[:]
+        struct.pack_into("<I", bad, 8, transtable.TT_VERSION-1)
+        self.assertTrue(self.rejects(bytes(bad)), "old version rejected")
+
+        bad = good[:]
+        struct.pack_into("<Q", bad, 16, transtable.keyScheme() ^ 1)
+        self.assertTrue(self.rejects(bytes(bad)),
+            "different Zobrist keys rejected")
+
+        self.assertTrue(self.rejects(bytes(good[:-16])),
+            "truncated file rejected")
+        self.assertTrue(self.rejects(b"CALI"), "very short file rejected")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_TransTable)
+group.add(T_SharedTransTable)
+group.add(T_MappedTransTable)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,97 @@
+# test_tune.py = test <tune.py>
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ulib import lintest
+
+from board import *
+import evalpos
+import evalbatch
+import tune
+from movegen import randomPositions
+
+#---------------------------------------------------------------------
+
+class T_parse(lintest.TestCase):
+    """ reading the positions file """
+
+    def test_parseLine(self):
+        fen = "6k1/5ppp/8/8/8/8/5PPP/6K1 w - - 0 1"
+        self.assertSame(tune.parseLine(fen + " 1-0"), (fen, 1.0), "FEN")
+        self.assertSame(tune.parseLine(fen + " [0.5]\n"), (fen, 0.5),
+            "result in []")
+        self.assertSame(
+            tune.parseLine("6k1/5ppp/8/8/8/8/5PPP/6K1 w - - c9 \"0-1\";"),
+            (fen, 0.0), "EPD")
+        self.assertSame(tune.parseLine("  \n"), None, "blank line")
+        self.assertSame(tune.parseLine("# comment"), None, "comment")
+        ok = False
+        try:
+            tune.parseLine(fen + " 2-0")
+        except ValueError:
+            ok = True
+        self.assertTrue(ok, "bad result raises ValueError")
+
+#---------------------------------------------------------------------
+
+class T_tune(lintest.TestCase):
+    """ features and tuning """
+
+    def setUpAll(self):
+        self.dir = tempfile.mkdtemp()
+        self.fn = os.path.join(self.dir, "positions.txt")
+        self.boards = randomPositions(300, seed=5)
+        results = ["1-0", "0-1", "1/2-1/2"]
+        with open(self.fn, "w") as f:
+            f.write("# random positions\n")
+            for i, b in enumerate(self.boards):
+                f.write(form("{} {}\n", b.toFen(), results[i%3]))
+
+    def tearDownAll(self):
+        shutil.rmtree(self.dir)
+
+    def test_loadFeatures(self):
+        cache = os.path.join(self.dir, "features.npz")
+        X, y = tune.loadFeatures(self.fn, 2, cache)
+        self.assertTrue((X == evalbatch.featuresBatch(self.boards)).all(),
+            "features of every position, in order")
+        self.assertSame(y[:3].tolist(), [1.0, 0.0, 0.5], "results")
+        self.assertTrue(os.path.exists(cache), "cache written")
+        X2, y2 = tune.loadFeatures(self.fn, 2, cache)
+        self.assertTrue((X2 == X).all() and (y2 == y).all(),
+            "same from the cache")
+
+    def test_tuner(self):
+        X = evalbatch.featuresBatch(self.boards)
+        weights = evalpos.getWeights()
+        # results that the current weights predict perfectly:
+        y = tune.sigmoid(X @ tune.weightsToVector(weights), 1.0)
+        start = dict(weights, P_VALUE=60, ISOLATED=-5)
+        tuner = tune.Tuner(X, y, start, k=1.0)
+        before = tuner.error
+        tuner.tune()
+        self.assertTrue(tuner.error < before/100, "error reduced")
+        tuned = tuner.weights()
+        self.assertTrue(abs(tuned['P_VALUE'] - weights['P_VALUE']) <= 5,
+            "pawn value recovered")
+        self.assertSame(tuned['K_VALUE'], weights['K_VALUE'],
+            "king value not tuned")
+
+    def test_fitK(self):
+        scores = np.linspace(-500, 500, 101)
+        y = tune.sigmoid(scores, 1.5)
+        self.assertApprox(tune.fitK(scores, y), 1.5, "k recovered")
+
+#---------------------------------------------------------------------
+
+group = lintest.TestGroup()
+group.add(T_parse)
+group.add(T_tune)
+
+if __name__=='__main__': group.run()
+
+#end
@@ -0,0 +1,320 @@
+# transtable.py = transposition table
+
+"""
+A transposition table remembers the results of searching positions,
+keyed by the positions' Zobrist keys (see Board.getKey()).
+
+The table is a fixed number of entries, packed into a flat buffer
+(ENTRY bytes each). Each key maps to exactly one entry (the low bits of
+the key), and a new result always replaces the old one.
+
+Because the table is just bytes, the buffer can be a bytearray, or
+memory shared between processes. SharedTransTable is a table in a named
+multiprocessing.shared_memory block, which any process can attach to.
+
+A table can be saved to a file (TransTable.save()) and opened again with
+MappedTransTable.open(), which memory-maps the file rather than reading
+it, so a warm table is available straight away.
+
+## Lockless hashing
+
+Several processes may write the same entry at once without locking,
+so an entry might end up as one process's key with another's data.
+To detect this, an entry doesn't store the key itself but
+(key XOR data). When probing, (stored XOR data) must give the key
+we're looking for; a torn entry won't, so it is ignored.
+"""
+
+import mmap
+import struct
+import sys
+import weakref
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Tuple, Union
+
+from ulib.butil import form
+
+from board import Move, zobristSq, zobristBlack, zobristCastle, WP
+
+#---------------------------------------------------------------------
+
+# entry flags, saying what (score) means:
+EMPTY_ENTRY = 0 # nothing stored here
+EXACT = 1 # score is exact
+LOWER = 2 # score is a lower bound (the search failed high)
+UPPER = 3 # score is an upper bound (the search failed low)
+
+""" an entry is 2 64-bit words:
+    check: key XOR data
+    data: the bit fields:
+        0..7    src   } the best move, (0,0) if none
+        8..15   dest  }
+        16..47  score (32 bit signed)
+        48..55  depth (8 bit signed)
+        56..63  flag (one of the flags above)
+"""
+ENTRY = struct.Struct("<QQ")
+
+MASK32 = 0xFFFFFFFF
+
+NO_MOVE = (0, 0)
+
+# the result of a probe: (move, score, depth, flag)
+TtEntry = Tuple[Optional[Move], int, int, int]
+
+Buffer = Union[bytearray, memoryview]
+
+def tableBytes(numEntries: int) -> int:
+    """ the size of buffer needed for a table of (numEntries) """
+    return numEntries * ENTRY.size
+
+def packData(mv: Optional[Move], score: int, depth: int, flag: int) -> int:
+    """ pack the fields of an entry into a 64-bit data word """
+    src, dest = mv if mv else NO_MOVE
+    return (src | dest<<8 | (score & MASK32)<<16 | (depth & 0xFF)<<48
+            | flag<<56)
+
+def unpackData(data: int) -> TtEntry:
+    """ unpack a 64-bit data word into (move, score, depth, flag) """
+    src = data & 0xFF
+    mv = (src, (data>>8) & 0xFF) if src else None
+    score = (data>>16) & MASK32
+    if score & 0x80000000: score -= 0x100000000
+    depth = (data>>48) & 0xFF
+    if depth & 0x80: depth -= 0x100
+    return (mv, score, depth, data>>56)
+
+#---------------------------------------------------------------------
+# header
+
+"""
+Tables that other processes can open (shared memory, or files) start
+with a header, so that they can be checked before use:
+    magic: identifies the file/block as a table
+    version: the entry layout version
+    numEntries: the table size
+    keyScheme: identifies the Zobrist numbers used to make keys
+"""
+HEADER = struct.Struct("<8sIIQ")
+TT_MAGIC = b"CALI-TT\0"
+TT_VERSION = 2 # 1 was the layout before lockless hashing
+
+def keyScheme() -> int:
+    """ a number identifying the Zobrist keys in use. If board.py's
+    Zobrist numbers change, so does this.
+    """
+    return zobristSq[WP][21] ^ zobristBlack ^ zobristCastle[15]
+
+def packHeader(numEntries: int) -> bytes:
+    return HEADER.pack(TT_MAGIC, TT_VERSION, numEntries, keyScheme())
+
+def checkHeader(buf: Buffer) -> int:
+    """ check a table's header, returning its number of entries.
+    Raise ValueError if it's not a table we can use.
+    """
+    magic, version, numEntries, scheme = HEADER.unpack_from(buf, 0)
+    if magic != TT_MAGIC:
+        raise ValueError("not a transposition table")
+    if version != TT_VERSION:
+        raise ValueError(form("transposition table version {}, "
+                              "expected {}", version, TT_VERSION))
+    if scheme != keyScheme():
+        raise ValueError("transposition table uses different keys")
+    return numEntries
+
+#---------------------------------------------------------------------
+
+class TransTable:
+    """ a transposition table """
+
+    numEntries: int = 0 # always a power of 2
+    mask: int = 0 # numEntries-1, to get an index from a key
+    buf: Buffer = bytearray()
+
+    def __init__(self, numEntries: int, buf: Optional[Buffer] = None):
+        """ create a table of (numEntries) entries (which must be a
+        power of 2). If (buf) is given, the table lives in it,
+        otherwise a new (empty) buffer is made.
+        """
+        if numEntries < 1 or numEntries & (numEntries-1):
+            raise ValueError(form("numEntries={} not a power of 2",
+                                  numEntries))
+        self.numEntries = numEntries
+        self.mask = numEntries - 1
+        if buf is None:
+            buf = bytearray(tableBytes(numEntries))
+        elif len(buf) < tableBytes(numEntries):
+            raise ValueError(form("buffer too small for {} entries",
+                                  numEntries))
+        self.buf = buf
+
+    def clear(self):
+        """ empty the table """
+        self.buf[:tableBytes(self.numEntries)] = \
+            bytes(tableBytes(self.numEntries))
+
+    def probe(self, key: int) -> Optional[TtEntry]:
+        """ look up (key). Return None if it's not in the table """
+        check, data = ENTRY.unpack_from(self.buf,
+                                        (key & self.mask) * ENTRY.size)
+        if check ^ data != key or data == 0:
+            return None
+        return unpackData(data)
+
+    def store(self, key: int, mv: Optional[Move], score: int,
+              depth: int, flag: int):
+        """ store a result for (key), replacing what was there """
+        data = packData(mv, score, depth, flag)
+        ENTRY.pack_into(self.buf, (key & self.mask) * ENTRY.size,
+                        key ^ data, data)
+
+    def used(self) -> int:
+        """ how many entries are in use. (Slow: for statistics) """
+        n = 0
+        for i in range(self.numEntries):
+            if ENTRY.unpack_from(self.buf, i*ENTRY.size)[1] != 0:
+                n += 1
+        return n
+
+    def save(self, filename: str):
+        """ save the table to a file, which can be opened again with
+        MappedTransTable.open()
+        """
+        with open(filename, "wb") as f:
+            f.write(packHeader(self.numEntries))
+            f.write(self.buf[:tableBytes(self.numEntries)])
+
+#---------------------------------------------------------------------
+
+def _untrackedShm(name: Optional[str], size: int = 0) -> SharedMemory:
+    """ create a shared memory block of (size) bytes, or if (size) is
+    0 attach to an existing one, without the resource tracker knowing
+    about it (see SharedTransTable)
+    """
+    create = size > 0
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, create=create, size=size,
+                            track=False)
+    # Before 3.13 there's no (track), so undo the registration in the
+    # public way, which needs the name as registered (with its "/").
+    shm = SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _unlinkShm(shm: SharedMemory):
+    """ delete a block made by _untrackedShm() """
+    if sys.version_info < (3, 13):
+        # unlink() unregisters the block, so register it again first
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+class SharedTransTable(TransTable):
+    """ a transposition table in a named shared memory block. One
+    process creates it; others attach to it by name.
+
+    Only the creating process deletes the block: when it's closed, or
+    when the process exits. The resource tracker isn't told about the
+    block at all, because Pool workers share the creator's tracker, so
+    one of them attaching and detaching would cancel the creator's
+    registration, and a process with its own tracker would delete the
+    block when it exited, while others were still using it.
+    """
+
+    shm: SharedMemory
+    isCreator: bool = False
+    # deletes the block when the creating process exits, if it's not
+    # closed before then
+    finalizer: Optional[weakref.finalize] = None
+
+    def __init__(self, shm: SharedMemory, numEntries: int,
+                 isCreator: bool):
+        """ use SharedTransTable.create() or .attach() to make one """
+        self.shm = shm
+        self.isCreator = isCreator
+        if isCreator:
+            self.finalizer = weakref.finalize(self, _unlinkShm, shm)
+        super().__init__(numEntries, shm.buf[HEADER.size:])
+
+    @property
+    def name(self) -> str:
+        """ the name other processes attach to """
+        return self.shm.name
+
+    @staticmethod
+    def create(numEntries: int,
+               name: Optional[str] = None) -> 'SharedTransTable':
+        """ create a new, empty, shared table """
+        shm = _untrackedShm(name, HEADER.size + tableBytes(numEntries))
+        shm.buf[:HEADER.size] = packHeader(numEntries)
+        tt = SharedTransTable(shm, numEntries, True)
+        tt.clear()
+        return tt
+
+    @staticmethod
+    def attach(name: str) -> 'SharedTransTable':
+        """ attach to a shared table another process created """
+        shm = _untrackedShm(name)
+        try:
+            numEntries = checkHeader(shm.buf)
+        except ValueError:
+            shm.close()
+            raise
+        return SharedTransTable(shm, numEntries, False)
+
+    def close(self):
+        """ stop using the table. If this process created it, also
+        delete it.
+        """
+        self.buf.release()
+        self.shm.close()
+        if self.finalizer is not None:
+            self.finalizer() # unlinks it
+
+#---------------------------------------------------------------------
+
+class MappedTransTable(TransTable):
+    """ a transposition table in a memory-mapped file, with the same
+    header and entries as a SharedTransTable
+    """
+
+    mm: mmap.mmap
+
+    def __init__(self, mm: mmap.mmap, numEntries: int):
+        """ use MappedTransTable.open() to make one """
+        self.mm = mm
+        super().__init__(numEntries, memoryview(mm)[HEADER.size:])
+
+    @staticmethod
+    def open(filename: str, writeBack: bool = False) -> 'MappedTransTable':
+        """ open a table saved by TransTable.save(). Raise ValueError
+        if it was saved by an incompatible version, or with different
+        Zobrist keys.
+
+        If (writeBack), changes to the table are written back to the
+        file; otherwise they are private to this process.
+        """
+        with open(filename, "r+b" if writeBack else "rb") as f:
+            access = mmap.ACCESS_WRITE if writeBack else mmap.ACCESS_COPY
+            mm = mmap.mmap(f.fileno(), 0, access=access)
+        try:
+            if len(mm) < HEADER.size:
+                raise ValueError("transposition table file too short")
+            numEntries = checkHeader(mm)
+            if len(mm) != HEADER.size + tableBytes(numEntries):
+                raise ValueError(form("transposition table file is {} "
+                    "bytes, expected {}", len(mm),
+                    HEADER.size + tableBytes(numEntries)))
+        except ValueError:
+            mm.close()
+            raise
+        return MappedTransTable(mm, numEntries)
+
+    def close(self):
+        """ stop using the table (writing changes back, if opened
+        with writeBack)
+        """
+        self.buf.release()
+        self.mm.close()
+
+#end
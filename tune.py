@@ -0,0 +1,297 @@
+# tune.py = tune the evaluation weights on labelled positions
+
+"""
+Tune evalpos's weights (Texel's method) on a file of positions from
+games, each labelled with the game's result.
+
+Each line of the file is a FEN followed by the result, which is one of
+1-0, 0-1, 1/2-1/2 (or 1.0, 0.0, 0.5), optionally in [] or "" and
+followed by ; -- so EPD lines ending in c9 "1-0"; are accepted too.
+An EPD position (4 fields) gets "0 1" added. Blank lines and lines
+starting with # are ignored.
+
+The result is predicted from the static evaluation (in centipawns,
++ve for white) by sigmoid(eval) = 1/(1 + 10^(-k*eval/400)), and the
+tuner minimises the mean squared error between predictions and
+results. k is fitted first, with the weights as they are, then the
+weights are tuned by coordinate descent: each weight in turn is
+moved up or down by a step while that reduces the error, with the
+step halving from TUNE_STEPS[0] down to 1.
+
+staticEval() is linear in the weights (see evalbatch.FEATURE_NAMES),
+so each position is turned into a feature vector once. After that,
+changing a weight only changes every evaluation by (step * that
+feature), which is one array operation over all the positions.
+Working out the features is the slow part, so it's done in chunks
+by a process pool, and can be cached in a .npz file.
+
+The result is a weights file which evalpos loads at startup when
+CALICHESS_WEIGHTS names it (see evalpos.loadWeights()).
+
+Usage:
+
+    python tune.py positions.txt -o weights.json
+"""
+
+import argparse
+import os
+import time
+from multiprocessing import Pool
+from typing import List, Tuple, Dict, Optional, Iterator, Any
+
+import numpy as np
+
+from ulib.butil import form, pr, prn, dpr
+
+from board import *
+import evalpos
+import evalbatch
+from evalbatch import FEATURE_NAMES
+
+#---------------------------------------------------------------------
+
+RESULTS = {
+    "1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5,
+    "1.0": 1.0, "0.0": 0.0, "0.5": 0.5,
+}
+
+CHUNK_LINES = 4096 # lines sent to a worker at a time
+
+# weights that aren't tuned: the king is always on the board, so its
+# value makes no difference
+FIXED_WEIGHTS = ['K_VALUE']
+
+TUNE_STEPS = [16, 8, 4, 2, 1]
+
+DEFAULT_K = 1.0
+
+#---------------------------------------------------------------------
+# reading positions
+
+def parseLine(line: str) -> Optional[Tuple[str, float]]:
+    """ parse a line of the positions file into (fen, result), or
+    None if it's blank or a comment. Raise ValueError if it's bad.
+    """
+    tokens = line.split()
+    if not tokens or tokens[0].startswith("#"):
+        return None
+    resultStr = tokens[-1].strip('[]";')
+    if resultStr not in RESULTS:
+        raise ValueError(form("bad result in line {!r}", line))
+    fenTokens = tokens[:-1]
+    if fenTokens and fenTokens[-1] == "c9":
+        fenTokens = fenTokens[:-1]
+    if len(fenTokens) == 4:
+        fenTokens += ["0", "1"]
+    return " ".join(fenTokens), RESULTS[resultStr]
+
+def readChunks(filename: str,
+               chunkLines: int = CHUNK_LINES) -> Iterator[List[str]]:
+    """ the lines of (filename), (chunkLines) at a time """
+    chunk: List[str] = []
+    with open(filename) as f:
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= chunkLines:
+                yield chunk
+                chunk = []
+        #//for line
+    if chunk:
+        yield chunk
+
+def chunkFeatures(lines: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """ the features and results of the positions in (lines) """
+    boards: List[Board] = []
+    results: List[float] = []
+    for line in lines:
+        parsed = parseLine(line)
+        if parsed is None: continue
+        fen, result = parsed
+        boards.append(Board.fromFEN(fen))
+        results.append(result)
+    #//for line
+    if not boards:
+        return (np.zeros((0, len(FEATURE_NAMES)), dtype=np.int16),
+                np.zeros(0, dtype=np.float32))
+    return (evalbatch.featuresBatch(boards).astype(np.int16),
+            np.array(results, dtype=np.float32))
+
+def loadFeatures(filename: str, numWorkers: Optional[int] = None,
+                 cacheFile: Optional[str] = None
+                 ) -> Tuple[np.ndarray, np.ndarray]:
+    """ the features (N, len(FEATURE_NAMES)) and results (N,) of the
+    positions in (filename). If (cacheFile) is given, and is newer
+    than (filename), they are read from it; otherwise they are
+    calculated (and saved to it).
+    """
+    if (cacheFile and os.path.exists(cacheFile)
+        and os.path.getmtime(cacheFile) >= os.path.getmtime(filename)):
+        with np.load(cacheFile) as data:
+            return data['X'], data['y']
+    with Pool(numWorkers) as pool:
+        parts = list(pool.imap(chunkFeatures, readChunks(filename)))
+    X = np.concatenate([p[0] for p in parts])
+    y = np.concatenate([p[1] for p in parts])
+    if cacheFile:
+        # (written via a file object, so np.savez doesn't add .npz)
+        with open(cacheFile, "wb") as f:
+            np.savez(f, X=X, y=y)
+    return X, y
+
+#---------------------------------------------------------------------
+# the error
+
+def sigmoid(scores: np.ndarray, k: float) -> np.ndarray:
+    """ predicted results for evaluations (scores) """
+    return 1.0 / (1.0 + np.power(10.0, -k*scores/400.0))
+
+def meanError(scores: np.ndarray, y: np.ndarray, k: float) -> float:
+    """ mean squared error of the predictions from (scores) """
+    return float(np.mean((y - sigmoid(scores, k))**2))
+
+def fitK(scores: np.ndarray, y: np.ndarray) -> float:
+    """ the k that minimises the error for (scores) """
+    lo, hi = 0.01, 10.0
+    for _ in range(60):
+        # golden section search
+        a = hi - (hi-lo)/1.618034
+        c = lo + (hi-lo)/1.618034
+        if meanError(scores, y, a) < meanError(scores, y, c):
+            hi = c
+        else:
+            lo = a
+    #//for
+    return (lo + hi)/2
+
+#---------------------------------------------------------------------
+
+def weightsToVector(weights: Dict[str,Any]) -> np.ndarray:
+    """ weights by name (as evalpos.getWeights()) to a vector in the
+    order of FEATURE_NAMES
+    """
+    v = []
+    for name in FEATURE_NAMES:
+        if name.startswith("PASSED_ADVANCE["):
+            v.append(weights['PASSED_ADVANCE'][int(name[15:-1])])
+        else:
+            v.append(weights[name])
+    #//for name
+    return np.array(v, dtype=np.float64)
+
+def vectorToWeights(w: np.ndarray) -> Dict[str,Any]:
+    """ the reverse of weightsToVector() """
+    weights: Dict[str,Any] = {
+        'PASSED_ADVANCE': evalpos.getWeights()['PASSED_ADVANCE']}
+    for name, v in zip(FEATURE_NAMES, w):
+        if name.startswith("PASSED_ADVANCE["):
+            weights['PASSED_ADVANCE'][int(name[15:-1])] = int(round(v))
+        else:
+            weights[name] = int(round(v))
+    #//for
+    return weights
+
+class Tuner:
+    """ tunes weights on a set of positions' features and results """
+
+    X: np.ndarray # features, (N, len(FEATURE_NAMES))
+    y: np.ndarray # results, (N,)
+    w: np.ndarray # the weights
+    k: float = DEFAULT_K
+    scores: np.ndarray # X @ w
+    error: float = 0.0
+    tunable: List[int] = [] # indexes into w of the weights to tune
+
+    def __init__(self, X: np.ndarray, y: np.ndarray,
+                 weights: Optional[Dict[str,Any]] = None,
+                 k: Optional[float] = None):
+        """ start from (weights), by default evalpos's. Fit k unless
+        it is given.
+        """
+        if evalpos.FINAL_MULTIPLIER != 1:
+            raise ValueError("can only tune with FINAL_MULTIPLIER=1")
+        self.X = X.astype(np.float64)
+        self.y = y.astype(np.float64)
+        self.w = weightsToVector(weights or evalpos.getWeights())
+        self.scores = self.X @ self.w
+        self.k = fitK(self.scores, self.y) if k is None else k
+        self.error = meanError(self.scores, self.y, self.k)
+        self.tunable = [i for i, name in enumerate(FEATURE_NAMES)
+                        if name not in FIXED_WEIGHTS]
+
+    def tryStep(self, i: int, delta: float) -> bool:
+        """ change weight (i) by (delta) if that reduces the error.
+        Return whether it did.
+        """
+        scores = self.scores + delta*self.X[:, i]
+        error = meanError(scores, self.y, self.k)
+        if error >= self.error:
+            return False
+        self.w[i] += delta
+        self.scores = scores
+        self.error = error
+        return True
+
+    def tunePass(self, step: float) -> int:
+        """ move each weight by (step) as far as it helps. Return the
+        number of steps taken.
+        """
+        n = 0
+        for i in self.tunable:
+            for delta in [step, -step]:
+                moved = False
+                while self.tryStep(i, delta):
+                    moved = True
+                    n += 1
+                if moved: break
+            #//for delta
+        #//for i
+        return n
+
+    def tune(self, maxPasses: int = 100, verbose: bool = False):
+        """ coordinate descent, with smaller and smaller steps """
+        for step in TUNE_STEPS:
+            for p in range(maxPasses):
+                n = self.tunePass(step)
+                if verbose:
+                    prn("step {} pass {}: {} steps, error {:.6f}",
+                        step, p+1, n, self.error)
+                if n == 0: break
+            #//for p
+        #//for step
+
+    def weights(self) -> Dict[str,Any]:
+        """ the tuned weights, for evalpos.setWeights() """
+        return vectorToWeights(self.w)
+
+#---------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="tune evaluation weights")
+    ap.add_argument("positions", help="file of FEN and result lines")
+    ap.add_argument("-o", "--output", default="weights.json",
+                    help="weights file to write")
+    ap.add_argument("-w", "--workers", type=int, default=None,
+                    help="worker processes (default: one per CPU)")
+    ap.add_argument("-c", "--cache", default=None,
+                    help="file to cache the positions' features in")
+    ap.add_argument("-k", type=float, default=None,
+                    help="sigmoid scaling (default: fit it)")
+    ap.add_argument("-p", "--passes", type=int, default=100,
+                    help="maximum passes for each step size")
+    args = ap.parse_args()
+
+    startTime = time.time()
+    X, y = loadFeatures(args.positions, args.workers, args.cache)
+    prn("{} positions, features took {:.1f}s", len(y),
+        time.time() - startTime)
+    tuner = Tuner(X, y, k=args.k)
+    prn("k={:.4f}, error {:.6f}", tuner.k, tuner.error)
+    tuner.tune(args.passes, verbose=True)
+    evalpos.setWeights(tuner.weights())
+    evalpos.saveWeights(args.output)
+    prn("wrote {} ({:.1f}s in all)", args.output, time.time() - startTime)
+
+if __name__=='__main__':
+    main()
+
+#end